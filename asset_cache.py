@@ -0,0 +1,78 @@
+"""Baked geometry, cached on disk.
+
+Some of the scene never changes between runs: the pitch is a dozen of
+Ursina's text models (each one parsed with eval) laid out and flattened into
+one node, and the player bodies are baked from their part lists. The first
+run builds them and writes the result to CACHE_DIR as a Panda3D .bam file;
+later runs just load it.
+
+A file is named after a hash of the builder's code and everything passed to
+it, so editing the builder or changing a dimension bakes a fresh one. Delete
+the folder to clean out stale files, or set ENABLED = False to always build.
+"""
+import hashlib
+import os
+
+from panda3d.core import Filename, Loader, LoaderOptions, NodePath
+
+ENABLED = True
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+VERSION = 1 # Bump to orphan every cached file, e.g. when a builder's helpers change
+
+
+def _hash_code(code, digest):
+    # Bytecode, names and constants, but not line numbers: editing code above a builder keeps its files
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            _hash_code(const, digest) # Nested functions and comprehensions
+        else:
+            digest.update(repr(const).encode())
+
+def cache_path(name, build, args, key=()):
+    digest = hashlib.sha1(repr((VERSION, args, key)).encode())
+    _hash_code(build.__code__, digest)
+    return os.path.join(CACHE_DIR, f"{name}-{digest.hexdigest()[:16]}.bam")
+
+
+def load(path):
+    """The node stored at path, or None if it is missing or unreadable."""
+    if not os.path.exists(path):
+        return None
+    options = LoaderOptions(LoaderOptions.LF_no_cache | LoaderOptions.LF_report_errors)
+    node = Loader.getGlobalPtr().loadSync(Filename.fromOsSpecific(path), options)
+    return NodePath(node) if node else None
+
+def save(node, path):
+    """Write node to path. A read-only or full disk just means baking again next time."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    except OSError:
+        return False
+    # Write under a temporary name so another instance never reads half a file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    if not node.writeBamFile(Filename.fromOsSpecific(temporary)):
+        return False
+    try:
+        os.replace(temporary, path)
+    except OSError:
+        os.remove(temporary)
+        return False
+    return True
+
+
+def load_or_bake(name, build, *args, key=()):
+    """build(*args) as a NodePath, loaded from disk if it was baked before.
+
+    key holds anything else the result depends on, such as module constants
+    the builder reads.
+    """
+    if not ENABLED:
+        return build(*args)
+    path = cache_path(name, build, args, key)
+    node = load(path)
+    if node is None:
+        node = build(*args)
+        save(node, path)
+    return node
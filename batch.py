@@ -0,0 +1,169 @@
+"""Run batches of AI-vs-AI matches headlessly across a process pool.
+
+Each job is one match: a seed plus a set of AI parameters. Workers only
+receive those few numbers and send back a handful of counters, so nearly all
+the time goes into simulating. Results are aggregated per parameter set.
+
+    python batch.py --matches 200 --seconds 300
+    python batch.py --matches 50 --sweep shoot_distance=20,30,40 --sweep pass_forward_weight=1,2,3 --csv results.csv
+"""
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import simulation
+
+# Sweepable parameter -> simulation constant it overrides
+PARAMS = {
+    'pass_forward_weight': 'PASS_FORWARD_WEIGHT',
+    'pass_ideal_distance': 'PASS_IDEAL_DISTANCE',
+    'pass_distance_weight': 'PASS_DISTANCE_WEIGHT',
+    'pass_openness_weight': 'PASS_OPENNESS_WEIGHT',
+    'pass_marked_penalty': 'PASS_MARKED_PENALTY',
+    'pass_lane_penalty': 'PASS_LANE_PENALTY',
+    'shoot_distance': 'SHOOT_DISTANCE',
+}
+DEFAULTS = {name: getattr(simulation, constant) for name, constant in PARAMS.items()}
+
+COLUMNS = ('matches', 'goals_0', 'goals_1', 'possession_0', 'shots_0', 'shots_1',
+           'passes_0', 'passes_1', 'pass_completion_0', 'pass_completion_1', 'ticks_per_second')
+
+
+def play_match(seed, seconds, params):
+    """Simulate one AI-vs-AI match and count what happened in it."""
+    for name, value in params.items():
+        setattr(simulation, PARAMS[name], value)
+    try:
+        match = simulation.create_match(controlled_team=None, seed=seed)
+        stats = {'goals': [0, 0], 'shots': [0, 0], 'passes': [0, 0], 'completed': [0, 0], 'possession': [0, 0]}
+        pending_pass = None # Player whose pass hasn't been received yet
+        last_touch = None
+
+        ticks = int(seconds * simulation.TICK_RATE)
+        start = time.perf_counter()
+        for _ in range(ticks):
+            simulation.step(match, simulation.TICK_DT)
+
+            # A pass is complete when a teammate is the next other player to touch the ball
+            touch = match.last_touch
+            if touch is not last_touch and touch is not None and pending_pass is not None and touch is not pending_pass:
+                if touch.team == pending_pass.team:
+                    stats['completed'][touch.team] += 1
+                pending_pass = None
+            last_touch = touch
+
+            for kind, player, detail in match.events:
+                if kind == 'goal':
+                    stats['goals'][detail] += 1
+                    pending_pass = None
+                elif kind == 'kick':
+                    if detail == 'shoot':
+                        stats['shots'][player.team] += 1
+                    elif detail == 'pass':
+                        stats['passes'][player.team] += 1
+                        pending_pass = player
+
+            if touch is not None:
+                stats['possession'][touch.team] += 1
+        stats['ticks_per_second'] = ticks / (time.perf_counter() - start)
+        return stats
+    finally:
+        for name in params:
+            setattr(simulation, PARAMS[name], DEFAULTS[name])
+
+def _run_job(job):
+    key, seed, seconds, params = job
+    return key, play_match(seed, seconds, params)
+
+
+def parse_sweep(text):
+    name, _, values = text.partition('=')
+    if name not in PARAMS:
+        raise argparse.ArgumentTypeError(f"unknown parameter {name!r} (one of {', '.join(PARAMS)})")
+    return name, [float(v) for v in values.split(',') if v]
+
+def aggregate(results):
+    """Sum match stats into one row of means and rates."""
+    n = len(results)
+    total = lambda field, team: sum(r[field][team] for r in results)
+    held = total('possession', 0) + total('possession', 1)
+    row = {
+        'matches': n,
+        'goals_0': total('goals', 0) / n,
+        'goals_1': total('goals', 1) / n,
+        'possession_0': total('possession', 0) / held if held else 0.5,
+        'ticks_per_second': sum(r['ticks_per_second'] for r in results) / n,
+    }
+    for team in (0, 1):
+        passes = total('passes', team)
+        row[f'shots_{team}'] = total('shots', team) / n
+        row[f'passes_{team}'] = passes / n
+        row[f'pass_completion_{team}'] = total('completed', team) / passes if passes else 0.0
+    return row
+
+def run_batch(matches, seconds, sweeps=(), base_seed=0, workers=None):
+    """Play `matches` seeds for every combination of the swept parameters.
+
+    Returns [(params, row)] in sweep order. The same seeds are used for every
+    combination, so differences come from the parameters rather than luck.
+    """
+    names = [name for name, _ in sweeps]
+    combos = [dict(zip(names, values)) for values in itertools.product(*(values for _, values in sweeps))]
+    jobs = [(k, base_seed + i, seconds, params) for k, params in enumerate(combos) for i in range(matches)]
+
+    workers = workers or os.cpu_count() or 1
+    results = [[] for _ in combos]
+    if workers == 1:
+        for job in jobs:
+            key, stats = _run_job(job)
+            results[key].append(stats)
+    else:
+        # Several jobs per message keeps the pool's IPC out of the way
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with Pool(workers) as pool:
+            for key, stats in pool.imap_unordered(_run_job, jobs, chunksize=chunksize):
+                results[key].append(stats)
+
+    return [(params, aggregate(r)) for params, r in zip(combos, results)]
+
+def print_table(rows, file=sys.stdout):
+    names = list(rows[0][0]) if rows else []
+    header = names + list(COLUMNS)
+    print('  '.join(f'{h:>12}' for h in header), file=file)
+    for params, row in rows:
+        values = [params[n] for n in names] + [row[c] for c in COLUMNS]
+        print('  '.join(f'{v:>12.3f}' if isinstance(v, float) else f'{v:>12}' for v in values), file=file)
+
+def write_csv(rows, path):
+    names = list(rows[0][0]) if rows else []
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=names + list(COLUMNS))
+        writer.writeheader()
+        for params, row in rows:
+            writer.writerow({**params, **row})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run batches of AI-vs-AI matches')
+    parser.add_argument('--matches', type=int, default=20, help='matches (seeds) per parameter set')
+    parser.add_argument('--seconds', type=float, default=300, help='match length in simulated seconds')
+    parser.add_argument('--seed', type=int, default=0, help='first seed')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: one per core)')
+    parser.add_argument('--sweep', type=parse_sweep, action='append', default=[], metavar='NAME=V1,V2,...',
+                        help=f"try every value of a parameter ({', '.join(PARAMS)})")
+    parser.add_argument('--csv', metavar='PATH', help='also write the table as CSV')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rows = run_batch(args.matches, args.seconds, args.sweep, args.seed, args.workers)
+    print_table(rows)
+    if args.csv:
+        write_csv(rows, args.csv)
+    print(f"{sum(row['matches'] for _, row in rows)} matches in {time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""Fixed-seed benchmarks for the simulation core (and the renderer, if it can open a window).
+
+Every scenario starts from the same seed and layout, so runs on different
+commits simulate exactly the same workload. Each scenario is run twice:
+once bare for ticks/second, once with the profiler on for per-subsystem
+timings (nested sections such as sim.ball_collision inside sim.step_ball are
+also counted in their parent).
+
+    python benchmark.py                  # everything, results in bench_results.json
+    python benchmark.py --quick          # short runs, for a quick check
+    python benchmark.py --scenario scrum --no-render --out scrum.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import simulation
+from profiling import profiler
+from simulation import PLAYER_Y, TICK_DT, TICK_RATE, Vec3
+
+SEED = 1234
+
+
+def _place(match, positions, ball):
+    """Put every player (and their zone) at positions and the ball in play."""
+    a = match.arrays
+    for i, (x, z) in enumerate(positions):
+        a.positions[i] = (x, PLAYER_Y, z)
+        a.base_positions[i] = (x, PLAYER_Y, z) # Covering keeps them packed in
+    a.previous_positions[:] = a.positions
+    a.velocities[:] = 0
+    a.target_velocities[:] = 0
+    match.ball.position = Vec3(*ball)
+    match.ball.velocity = Vec3(0, 0, 0)
+    match.ball.touches += 1 # Any prediction of the old ball is stale
+    match.match_state = 'playing'
+    simulation.invalidate_grid(match)
+
+def kickoff(seed):
+    return simulation.create_match(controlled_team=None, seed=seed)
+
+def midfield_scrum(seed):
+    """All 22 players within a few metres of the ball at the centre spot."""
+    match = simulation.create_match(controlled_team=None, seed=seed)
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform(-6, 6, size=(len(match.players), 2))
+    _place(match, positions, (0.5, 0.4, 0.5))
+    return match
+
+def goalmouth_melee(seed):
+    """Both teams crowded into Barcelona's box with the ball loose on the spot."""
+    match = simulation.create_match(controlled_team=None, seed=seed)
+    rng = np.random.default_rng(seed)
+    positions = np.column_stack((rng.uniform(48, 62, len(match.players)), rng.uniform(-9, 9, len(match.players))))
+    _place(match, positions, (53, 0.4, 0))
+    return match
+
+# name: (build(seed) -> match, simulated seconds)
+SCENARIOS = {
+    'kickoff': (kickoff, 20),
+    'scrum': (midfield_scrum, 20),
+    'melee': (goalmouth_melee, 20),
+    'half': (kickoff, 45 * 60),
+}
+
+
+def run_scenario(build, seconds, seed):
+    ticks = int(seconds * TICK_RATE)
+
+    # Bare run: ticks per second
+    match = build(seed)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        simulation.step(match, TICK_DT)
+    elapsed = time.perf_counter() - start
+    result = {
+        'seed': seed,
+        'ticks': ticks,
+        'seconds': elapsed,
+        'ticks_per_second': ticks / elapsed,
+        'score': list(match.score),
+    }
+
+    # Profiled run of the same workload: where each tick goes
+    match = build(seed)
+    window = profiler.window
+    profiler.reset()
+    profiler.window = ticks # Every tick counts towards the percentiles
+    profiler.enabled = True
+    try:
+        for _ in range(ticks):
+            simulation.step(match, TICK_DT)
+            profiler.end_frame()
+        summary = profiler.summary()
+    finally:
+        profiler.enabled = False
+        profiler.window = window
+        profiler.reset()
+
+    # Per tick, in microseconds
+    result['sections'] = {
+        name: {
+            'mean_us': s['mean'] * 1000,
+            'p50_us': s['p50'] * 1000,
+            'p95_us': s['p95'] * 1000,
+            'p99_us': s['p99'] * 1000,
+            'max_us': s['max'] * 1000,
+        }
+        for name, s in sorted(summary.items())
+    }
+    return result
+
+
+def run_render(frames, seed):
+    """Frames per second and visible geoms of the real game scene, or None without a display."""
+    try:
+        from ursina import Ursina, held_keys
+        app = Ursina(window_type='offscreen', size=(1280, 720))
+        if app.win is None:
+            return None
+    except Exception as e:
+        print(f"render benchmark skipped: {e}", file=sys.stderr)
+        return None
+
+    import main
+    from ursina import scene
+    game = main.create_app(main.parse_args(['--seed', str(seed)]))
+
+    # Take the kickoff, then let the match run
+    held_keys['f'] = 1
+    for _ in range(5): app.step()
+    held_keys['f'] = 0
+    for _ in range(30): app.step() # Warm up (shader compiles, first uploads)
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        app.step()
+    elapsed = time.perf_counter() - start
+
+    # Geoms in unhidden nodes, counted before culling: not the draw calls a
+    # frame actually issues, but it moves with them when the scene is merged
+    visible_geoms = 0
+    for path in scene.findAllMatches('**/+GeomNode'):
+        if not path.isHidden():
+            visible_geoms += path.node().getNumGeoms()
+
+    return {
+        'frames': frames,
+        'seconds': elapsed,
+        'frames_per_second': frames / elapsed,
+        'visible_geoms': visible_geoms,
+        'renderer': app.win.getGsg().getDriverRenderer(),
+        'ticks': game.stepper.ticks,
+        'startup_ms': {stage: seconds * 1000 for stage, seconds in game.startup.stages.items()},
+    }
+
+
+def environment():
+    try:
+        # Ask the repo this file is in, wherever the benchmark was started from
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.platform(),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the simulation and renderer')
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help='run only these (repeatable)')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--quick', action='store_true', help='a tenth of the simulated time (at least 5 s per scenario)')
+    parser.add_argument('--frames', type=int, default=600, help='frames for the render benchmark')
+    parser.add_argument('--no-render', action='store_true', help='skip the render benchmark')
+    parser.add_argument('--out', default='bench_results.json', help='where to write the results (JSON)')
+    args = parser.parse_args(argv)
+
+    results = {'environment': environment(), 'tick_rate': TICK_RATE, 'scenarios': {}, 'render': None}
+    for name in args.scenario or SCENARIOS:
+        build, seconds = SCENARIOS[name]
+        if args.quick:
+            seconds = max(5, math.ceil(seconds / 10))
+        r = run_scenario(build, seconds, args.seed)
+        results['scenarios'][name] = r
+        print(f"{name:<10}{r['ticks']:>9} ticks {r['ticks_per_second']:>9.0f} ticks/s")
+        for section, s in r['sections'].items():
+            print(f"    {section:<22}{s['mean_us']:>8.1f} us/tick  p95 {s['p95_us']:>8.1f}")
+
+    if not args.no_render:
+        results['render'] = run_render(args.frames, args.seed)
+        if results['render']:
+            r = results['render']
+            print(f"render    {r['frames_per_second']:>9.1f} fps  {r['visible_geoms']} visible geoms  ({r['renderer']})")
+            print(f"startup   {sum(r['startup_ms'].values()):>9.0f} ms to first frame")
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.out}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""Reinforcement-learning environments over the headless match simulation.
+
+`MatchEnv` follows the Gym API (reset() -> (obs, info), step(action) ->
+(obs, reward, terminated, truncated, info)) without depending on gym. The
+agent plays team 0 through the same controls as a human: it drives the active
+player (who auto-switches to whoever is nearest the ball) and every other
+player is run by the AI.
+
+Actions are integers in range(N_ACTIONS): a move direction (nine, including
+standing still) times a kick (none, shoot, pass, cross), decoded through
+ACTIONS. Each env step holds the action for action_repeat ticks.
+
+Observations are flat float32 arrays, from team 0's point of view:
+
+    players    x, z, vx, vz for every player (team 0 first), positions over
+               half the pitch length, velocities over MAX_SPEED
+    ball       x, y, z, vx, vy, vz, scaled the same way
+    active     one-hot over the players
+    match      goal difference, fraction of the episode left, 1 at kickoff
+
+The reward is +1 for every goal scored and -1 for every goal conceded.
+
+`VecMatchEnv` runs N matches at once on `vecsim.VecMatch`, which steps them
+all with one NumPy pass per phase. It writes observations, rewards and dones
+straight into preallocated batch arrays and resets finished matches
+automatically. Each row plays out exactly like a MatchEnv given the same seed
+and actions.
+
+    python env.py --envs 256 --steps 500  # random actions, prints env steps/s
+    python env.py --check --envs 8        # compare VecMatchEnv against MatchEnvs
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+import simulation
+from simulation import FIELD_WIDTH, Inputs, TICK_DT, TICK_RATE
+from vecsim import KICKS, VecMatch
+
+EPISODE_SECONDS = 90 # Match time per episode
+ACTION_REPEAT = 4 # Ticks per env step (30 decisions per second at 120 Hz)
+MAX_SPEED = 30 # Velocity scale for observations (a shot is ~35)
+
+MOVES = [(x, z) for z in (0, 1, -1) for x in (0, 1, -1)] # (0, 0) first: standing still
+ACTIONS = tuple(Inputs(x, z, kick) for kick in KICKS for x, z in MOVES)
+N_ACTIONS = len(ACTIONS)
+
+
+def observation_size(n_players):
+    return n_players * 4 + 6 + n_players + 3
+
+def write_observation(match, out, episode_left):
+    """Fill out (a float32 row of observation_size) with match as seen by team 0."""
+    a = match.arrays
+    n = a.count
+    half = FIELD_WIDTH / 2
+    players = out[:n * 4].reshape(n, 4)
+    players[:, 0] = a.positions[:, 0] / half
+    players[:, 1] = a.positions[:, 2] / half
+    players[:, 2] = a.velocities[:, 0] / MAX_SPEED
+    players[:, 3] = a.velocities[:, 2] / MAX_SPEED
+
+    ball = match.ball
+    i = n * 4
+    out[i:i + 3] = (ball.position.x / half, ball.position.y / half, ball.position.z / half)
+    out[i + 3:i + 6] = (ball.velocity.x / MAX_SPEED, ball.velocity.y / MAX_SPEED, ball.velocity.z / MAX_SPEED)
+
+    i += 6
+    active = out[i:i + n]
+    active[:] = 0
+    if match.active_player is not None:
+        active[match.active_player.index] = 1
+
+    i += n
+    out[i] = match.score[0] - match.score[1]
+    out[i + 1] = episode_left
+    out[i + 2] = match.match_state == 'kickoff'
+
+
+class MatchEnv:
+    def __init__(self, seconds=EPISODE_SECONDS, action_repeat=ACTION_REPEAT, seed=None):
+        self.episode_ticks = int(seconds * TICK_RATE)
+        self.action_repeat = action_repeat
+        self.rng = random.Random(seed) # Draws a match seed per episode
+        self.match = None
+        self.ticks = 0
+
+        n_players = len(simulation.create_match(controlled_team=0, seed=0).players)
+        self.observation_size = observation_size(n_players)
+        self.n_actions = N_ACTIONS
+        self.observation = np.zeros(self.observation_size, dtype=np.float32)
+
+    def reset(self, seed=None):
+        """Start a new match. seed fixes this match; otherwise one is drawn from the env's seed."""
+        if seed is None:
+            seed = self.rng.randrange(2**32)
+        self.match = simulation.create_match(controlled_team=0, seed=seed)
+        self.ticks = 0
+        return self.observe(), {'seed': seed}
+
+    def observe(self, out=None):
+        if out is None: out = self.observation
+        write_observation(self.match, out, 1 - self.ticks / self.episode_ticks)
+        return out
+
+    def advance(self, action):
+        """Run one env step without building an observation. Returns (reward, truncated)."""
+        match = self.match
+        inputs = ACTIONS[action]
+        reward = 0
+        for _ in range(self.action_repeat):
+            simulation.step(match, TICK_DT, inputs)
+            self.ticks += 1
+            for kind, player, team in match.events:
+                if kind == 'goal':
+                    reward += 1 if team == 0 else -1
+            if self.ticks >= self.episode_ticks:
+                return reward, True
+        return reward, False
+
+    def step(self, action):
+        reward, truncated = self.advance(action)
+        info = {'score': tuple(self.match.score)}
+        return self.observe(), float(reward), False, truncated, info
+
+
+class VecMatchEnv:
+    """n MatchEnvs run together on one VecMatch, with their results in batch arrays.
+
+    step() returns (observations, rewards, terminated, truncated, infos) as
+    arrays of length n (infos is a list). A match that finishes is reset
+    straight away: its row of observations is the new match's first, and the
+    last observation of the old one is kept in final_observations.
+    """
+    def __init__(self, n, seconds=EPISODE_SECONDS, action_repeat=ACTION_REPEAT, seed=None):
+        self.episode_ticks = int(seconds * TICK_RATE)
+        self.action_repeat = action_repeat
+        rng = random.Random(seed)
+        self.rngs = [random.Random(rng.randrange(2**32)) for _ in range(n)] # Each row's MatchEnv.rng
+        self.sim = VecMatch(n)
+        self.n = n
+        self.ticks = 0 # Every row starts and ends its episodes together
+        self.observation_size = observation_size(self.sim.n_players)
+        self.n_actions = N_ACTIONS
+        self._moves = np.array(MOVES, dtype=np.float64)
+
+        self.observations = np.zeros((n, self.observation_size), dtype=np.float32)
+        self.final_observations = np.zeros((n, self.observation_size), dtype=np.float32)
+        self.rewards = np.zeros(n, dtype=np.float32)
+        self.terminated = np.zeros(n, dtype=np.bool_) # Matches only end on time
+        self.truncated = np.zeros(n, dtype=np.bool_)
+
+    def reset(self, seed=None):
+        infos = []
+        for i in range(self.n):
+            row_seed = self.rngs[i].randrange(2**32) if seed is None else seed + i
+            self.sim.reset(i, row_seed)
+            infos.append({'seed': row_seed})
+        self.ticks = 0
+        return self.observe(), infos
+
+    def observe(self, out=None):
+        """write_observation() for every row at once."""
+        if out is None: out = self.observations
+        sim = self.sim
+        n = sim.n_players
+        half = FIELD_WIDTH / 2
+        players = out[:, :n * 4].reshape(self.n, n, 4)
+        players[:, :, 0] = sim.positions[:, :, 0] / half
+        players[:, :, 1] = sim.positions[:, :, 2] / half
+        players[:, :, 2] = sim.velocities[:, :, 0] / MAX_SPEED
+        players[:, :, 3] = sim.velocities[:, :, 2] / MAX_SPEED
+
+        i = n * 4
+        out[:, i:i + 3] = sim.ball_position / half
+        out[:, i + 3:i + 6] = sim.ball_velocity / MAX_SPEED
+
+        i += 6
+        out[:, i:i + n] = 0
+        rows = np.flatnonzero(sim.active >= 0)
+        out[rows, i + sim.active[rows]] = 1
+
+        i += n
+        out[:, i] = sim.score[:, 0] - sim.score[:, 1]
+        out[:, i + 1] = 1 - self.ticks / self.episode_ticks
+        out[:, i + 2] = sim.kickoff
+        return out
+
+    def step(self, actions):
+        sim = self.sim
+        actions = np.asarray(actions)
+        move = self._moves[actions % len(MOVES)]
+        kick = actions // len(MOVES)
+        self.rewards[:] = 0
+        for _ in range(min(self.action_repeat, self.episode_ticks - self.ticks)):
+            sim.step(move[:, 0], move[:, 1], kick)
+            self.ticks += 1
+            self.rewards += sim.goals[:, 0] - sim.goals[:, 1]
+
+        infos = [{'score': tuple(score)} for score in sim.score.tolist()]
+        self.truncated[:] = self.ticks >= self.episode_ticks
+        if self.ticks >= self.episode_ticks:
+            self.observe(self.final_observations)
+            _, reset_infos = self.reset()
+            for info, reset_info in zip(infos, reset_infos):
+                info['seed'] = reset_info['seed']
+        self.observe()
+        return self.observations, self.rewards, self.terminated, self.truncated, infos
+
+
+def check(n, steps, seconds=EPISODE_SECONDS, seed=0):
+    """Play VecMatchEnv and n MatchEnvs with the same seeds and random actions.
+
+    Returns the first (step, row, what) where they disagree, or None.
+    """
+    vec = VecMatchEnv(n, seconds, seed=seed)
+    rng = random.Random(seed)
+    envs = [MatchEnv(seconds, seed=rng.randrange(2**32)) for _ in range(n)]
+    observations, _ = vec.reset()
+    for i, env in enumerate(envs):
+        if not np.array_equal(env.reset()[0], observations[i]): return 0, i, 'observation'
+
+    actions = np.random.default_rng(seed)
+    for t in range(1, steps + 1):
+        action = actions.integers(N_ACTIONS, size=n)
+        observations, rewards, _, truncated, _ = vec.step(action)
+        for i, env in enumerate(envs):
+            observation, reward, _, done, _ = env.step(action[i])
+            if reward != rewards[i]: return t, i, 'reward'
+            if done != truncated[i]: return t, i, 'truncated'
+            if done:
+                if not np.array_equal(observation, vec.final_observations[i]): return t, i, 'final observation'
+                observation = env.reset()[0]
+            if not np.array_equal(observation, observations[i]): return t, i, 'observation'
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure environment throughput with random actions, or check VecMatchEnv')
+    parser.add_argument('--envs', type=int, default=8)
+    parser.add_argument('--steps', type=int, default=1000, help='vector steps')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--seconds', type=float, default=EPISODE_SECONDS, help='match time per episode')
+    parser.add_argument('--check', action='store_true', help='compare VecMatchEnv against MatchEnvs instead')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        mismatch = check(args.envs, args.steps, args.seconds, args.seed)
+        if mismatch is None:
+            print(f"{args.envs} envs agree for {args.steps} steps")
+        else:
+            print("step {}, env {}: {} differs".format(*mismatch))
+        return
+
+    env = VecMatchEnv(args.envs, args.seconds, seed=args.seed)
+    env.reset()
+    rng = np.random.default_rng(args.seed)
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        env.step(rng.integers(env.n_actions, size=env.n))
+    elapsed = time.perf_counter() - start
+    steps = args.steps * args.envs
+    print(f"{steps} env steps in {elapsed:.2f}s: {steps / elapsed:.0f} steps/s, "
+          f"{steps * ACTION_REPEAT / elapsed:.0f} ticks/s")
+
+if __name__ == '__main__':
+    main()
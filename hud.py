@@ -0,0 +1,154 @@
+"""HUD text and player name tags.
+
+Ursina rebuilds a Text's glyph geometry on every assignment to .text, even
+when the string is the same, so `Label.set()` only assigns when it changes.
+
+Name tags are all drawn with one instanced call: every name is rendered once
+into a shared texture atlas, and a shader places and billboards a quad per
+visible tag, like player_model does for bodies. Which tags show comes from
+the match's proximity grid around the ball.
+"""
+import numpy as np
+from panda3d.core import OmniBoundingVolume, PTA_LVecBase4f, TransparencyAttrib
+from PIL import Image, ImageDraw, ImageFont
+from ursina import Entity, Mesh, Shader, Text, Texture, application
+
+NAME_TAG_DISTANCE = 2.0 # Players this close to the ball (XZ) show their name...
+NAME_TAG_TIME = 3.0 # ...for this long, fading out over the last second
+NAME_TAG_HEIGHT = 0.6 # World units
+NAME_TAG_OFFSET = 1.5 # Above the player's centre (clear of the head)
+
+ATLAS_ROW = 48 # Pixels per name in the atlas
+ATLAS_FONT_SIZE = 36
+MAX_TAGS = 128
+
+
+class Label(Text):
+    """A Text that only rebuilds its glyphs when the string actually changes."""
+    def __init__(self, text='', **kwargs):
+        super().__init__(text=text, **kwargs)
+        self.shown = text
+
+    def set(self, text):
+        if text == self.shown: return
+        self.shown = text
+        self.text = text
+
+
+NAME_TAG_VERTEX_SHADER = f'''#version 140
+
+uniform mat4 p3d_ModelViewMatrix;
+uniform mat4 p3d_ProjectionMatrix;
+uniform vec4 tags[{MAX_TAGS}]; // x, y, z, alpha
+uniform vec4 rects[{MAX_TAGS}]; // atlas v bottom, v top, u right, world width
+uniform float height;
+in vec4 p3d_Vertex;
+in vec2 p3d_MultiTexCoord0;
+out vec2 uv;
+out float alpha;
+
+void main() {{
+    int i = gl_InstanceID;
+    // Billboard: spread the quad out in view space, so it always faces the camera upright
+    vec4 anchor = p3d_ModelViewMatrix * vec4(tags[i].xyz, 1.0);
+    anchor.xy += p3d_Vertex.xy * vec2(rects[i].w, height);
+    gl_Position = p3d_ProjectionMatrix * anchor;
+    uv = vec2(p3d_MultiTexCoord0.x * rects[i].z, mix(rects[i].x, rects[i].y, p3d_MultiTexCoord0.y));
+    alpha = tags[i].w;
+}}
+'''
+
+NAME_TAG_FRAGMENT_SHADER = '''#version 140
+
+uniform sampler2D p3d_Texture0;
+in vec2 uv;
+in float alpha;
+out vec4 fragColor;
+
+void main() {
+    vec4 c = texture(p3d_Texture0, uv);
+    fragColor = vec4(c.rgb, c.a * alpha);
+}
+'''
+
+_shader = None
+
+def name_tag_shader():
+    # Made on first use, like player_model's body shader
+    global _shader
+    if _shader is None:
+        _shader = Shader(name='name_tag_shader', language=Shader.GLSL, vertex=NAME_TAG_VERTEX_SHADER, fragment=NAME_TAG_FRAGMENT_SHADER)
+    return _shader
+
+
+def build_atlas(names):
+    """Render names into one RGBA image, one row each. Returns (image, text widths in px)."""
+    font = ImageFont.truetype(str(application.internal_fonts_folder / Text.default_font), ATLAS_FONT_SIZE)
+    widths = [int(font.getlength(name)) + 4 for name in names]
+    width = 1
+    while width < max(widths, default=1): width *= 2
+    height = 1
+    while height < ATLAS_ROW * len(names): height *= 2
+
+    image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for row, name in enumerate(names):
+        # Dark edge so white names stay readable on the white kits and lines
+        draw.text((2, row * ATLAS_ROW + ATLAS_ROW // 2), name, font=font, anchor='lm',
+                  fill=(255, 255, 255, 255), stroke_width=2, stroke_fill=(0, 0, 0, 255))
+    return image, widths
+
+
+class NameTags:
+    """Name tags for every player, drawn as one instanced, billboarded batch."""
+    def __init__(self, players):
+        self.players = players
+        self.timers = np.zeros(len(players)) # Seconds left on screen
+
+        image, widths = build_atlas([p.name for p in players])
+        # Per player: where its name is in the atlas and how wide its quad is
+        self.rects = np.zeros((len(players), 4), dtype=np.float32)
+        for row, width in enumerate(widths):
+            self.rects[row] = (1 - (row + 1) * ATLAS_ROW / image.height, 1 - row * ATLAS_ROW / image.height,
+                               width / image.width, NAME_TAG_HEIGHT * width / ATLAS_ROW)
+
+        quad = Mesh(vertices=[(-0.5, -0.5, 0), (0.5, -0.5, 0), (0.5, 0.5, 0), (-0.5, 0.5, 0)],
+                    triangles=[(0, 1, 2), (0, 2, 3)], uvs=[(0, 0), (1, 0), (1, 1), (0, 1)])
+        self.entity = Entity(model=quad, texture=Texture(image), shader=name_tag_shader())
+        self.entity.set_shader_input('height', NAME_TAG_HEIGHT)
+        self.tags_buffer = PTA_LVecBase4f.emptyArray(MAX_TAGS)
+        self.rects_buffer = PTA_LVecBase4f.emptyArray(MAX_TAGS)
+        self.tags = np.asarray(memoryview(self.tags_buffer))
+        self.tag_rects = np.asarray(memoryview(self.rects_buffer))
+        self.entity.set_shader_input('tags', self.tags_buffer)
+        self.entity.set_shader_input('rects', self.rects_buffer)
+
+        # Drawn after the opaque scene, blended, without hiding what's behind
+        self.entity.setTransparency(TransparencyAttrib.M_alpha)
+        self.entity.setDepthWrite(False)
+        self.entity.setBin('fixed', 0)
+        self.entity.node().setBounds(OmniBoundingVolume())
+        self.entity.node().setFinal(True)
+        self.set_count(0)
+
+    def set_count(self, n):
+        self.entity.setInstanceCount(n)
+        self.entity.enabled = n > 0
+
+    def update(self, match, alpha, dt):
+        """Refresh timers from who's near the ball and write the visible tags' rows."""
+        self.timers -= dt
+        for p in match.grid.query_radius(match.ball.position, NAME_TAG_DISTANCE):
+            self.timers[p.index] = NAME_TAG_TIME
+
+        visible = np.flatnonzero(self.timers > 0)[:MAX_TAGS]
+        n = len(visible)
+        if n:
+            a = match.arrays
+            previous = a.previous_positions[visible]
+            positions = previous + (a.positions[visible] - previous) * alpha
+            self.tags[:n, :3] = positions
+            self.tags[:n, 1] += NAME_TAG_OFFSET
+            self.tags[:n, 3] = np.minimum(self.timers[visible], 1) # Fade over the last second
+            self.tag_rects[:n] = self.rects[visible]
+        self.set_count(n)
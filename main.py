@@ -1,1015 +1,502 @@
 from ursina import *
-from panda3d.core import CullFaceAttrib
-import random
-
-app = Ursina()
-
-# --- Configuration ---
-FIELD_WIDTH = 128 # Length (X-axis)
-FIELD_DEPTH = 80  # Width (Z-axis)
-
-def distance_xz(p1, p2):
-    return (Vec3(p1.x, 0, p1.z) - Vec3(p2.x, 0, p2.z)).length()
-
-def sign(x):
-    return 1 if x >= 0 else -1
+from panda3d.core import NodePath
+import argparse
+import atexit
+import os
+
+import asset_cache
+import hud
+import net
+import outline
+import player_model
+import replay
+import server
+import simulation
+import sound
+from profiling import StartupTimer, profiler
+from simulation import FIELD_WIDTH, FIELD_DEPTH
+
+# Importing this module only defines things; create_app() builds the game
+# (python main.py does both). That keeps it importable from tools and tests
+# without opening a window.
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='RealFC')
+    parser.add_argument('--seed', type=int, default=None, help='seed the match for a reproducible run')
+    parser.add_argument('--record', metavar='PATH', help='record the match to a replay file')
+    parser.add_argument('--replay', metavar='PATH', help='watch a recorded match instead of playing')
+    parser.add_argument('--warp', default='1', help="time warp: a speed-up factor such as 2 or 10, or 'max'")
+    parser.add_argument('--profile', action='store_true', help='start with the profiling overlay on (F3 toggles it)')
+    parser.add_argument('--connect', metavar='HOST:PORT', help='play online against whoever else joins the relay at HOST:PORT (see net.py)')
+    parser.add_argument('--server', metavar='HOST:PORT', help='play a match hosted on a match server (see server.py)')
+    parser.add_argument('--watch', type=int, metavar='MATCH', help='with --server: watch that match instead of playing a new one')
+    parser.add_argument('--trace', metavar='PATH', help='log every timed section and write it to PATH (.json or .csv) on exit')
+    args, _ = parser.parse_known_args(argv) # Leave anything else to Ursina
+    return args
+
+
+OUTLINES = True # Screen-space outlines (O toggles them in game)
+
+# Time warp keys: match time runs this many times faster than real time
+WARP_SPEEDS = {'1': 1, '2': 2, '3': 10, '4': simulation.FLAT_OUT}
+MAX_AUDIBLE_WARP = 2 # Kick sounds are just noise beyond this
+PROFILE_REFRESH = 0.5 # Seconds between profiling overlay redraws
+QUICKSAVE_PATH = 'quicksave.npz' # F5 saves the match here, F9 loads it back
 
 # --- Assets ---
 # Simple texture generation (optional, or use colors)
 
 # --- Classes ---
-# --- Classes ---
+def write_body_instance(view):
+    # Copy a view's transform and limb pose into its row of the instance buffers
+    i = view.instance
+    view.batch.transforms[i] = (view.x, view.y, view.z, math.radians(view.rotation_y))
+    view.batch.limbs[i] = [math.radians(a) for a in view.limb_angles]
+
+# Entities below are views: the match itself is simulated in simulation.py and
+# each update() just copies the relevant state into transforms and animations.
 class Player(Entity):
-    def __init__(self, position, team, role, control_manager, number, name):
+    def __init__(self, state, game):
         super().__init__(
-            position=position,
-            collider='box',
+            position=state.position,
             scale=(1, 1, 1) # Reset scale for container
         )
-        self.team = team # 0 = Real Madrid, 1 = Barcelona
-        self.role = role # 'gk', 'def', 'mid', 'att'
-        self.base_position = Vec3(position)
-        self.control_manager = control_manager
-        self.number = number
-        self.name = name
+        self.state = state
+        self.game = game
+        team = state.team
+        role = state.role
+        self.name = state.name
         
         # --- Visuals: Branded Uniforms ---
-        skin_color = color.rgb(255, 220, 177)
-        
-        # Default keys
-        shirt_color = color.white
-        sleeve_color = color.white
-        short_color = color.white
-        
-        if team == 0: # Real Madrid (White)
-            shirt_color = color.white
-            sleeve_color = color.white
-            short_color = color.white
-            if role == 'gk':
-                shirt_color = color.green
-                sleeve_color = color.green
-                short_color = color.green
-
-        else: # Barcelona (Blue/Red)
-            shirt_color = color.blue
-            sleeve_color = color.red # Contrast sleeves
-            short_color = color.rgb(0, 0, 100) # Dark Blue
-            if role == 'gk':
-                shirt_color = color.yellow
-                sleeve_color = color.yellow
-                short_color = color.black
-
-        # 1. Torso (The "Shirt")
-        self.torso = Entity(parent=self, model='cube', color=shirt_color, scale=(0.5, 0.7, 0.3), y=0.1)
-        self.create_outline(self.torso)
-
-        # 2. Head
-        self.head = Entity(parent=self, model='cube', color=skin_color, scale=(0.3, 0.35, 0.3), y=0.7)
-        self.create_outline(self.head)
-
-        # 3. Arms (Sleeves + Skin)
-        # Left Arm
-        self.l_arm = Entity(parent=self, model='cube', color=sleeve_color, scale=(0.15, 0.6, 0.2), position=(-0.38, 0.1, 0))
-        self.create_outline(self.l_arm)
-        # Right Arm
-        self.r_arm = Entity(parent=self, model='cube', color=sleeve_color, scale=(0.15, 0.6, 0.2), position=(0.38, 0.1, 0))
-        self.create_outline(self.r_arm)
-
-        # 4. Legs (Shorts + Skin)
-        # Left Leg
-        self.l_leg = Entity(parent=self, model='cube', color=short_color, scale=(0.2, 0.7, 0.25), position=(-0.15, -0.65, 0))
-        self.create_outline(self.l_leg)
-        # Right Leg
-        self.r_leg = Entity(parent=self, model='cube', color=short_color, scale=(0.2, 0.7, 0.25), position=(0.15, -0.65, 0))
-        self.create_outline(self.r_leg)
+        # The body is one instance in the shared player batch; update() writes its row
+        self.batch, self.instance = game.body_renderer.add(player_model.PLAYER_BODY, player_model.kit_colors(team, role))
+        self.limb_angles = [0, 0, 0, 0] # l_arm, r_arm, l_leg, r_leg (degrees)
+
+        # Torso frame for things attached to the shirt
+        self.torso = Entity(parent=self, scale=(0.5, 0.7, 0.3), y=0.1)
 
         # Number on Back
-        self.number_text = Text(parent=self.torso, text=str(number), color=color.white if team==1 else color.black, scale=8, origin=(0,0), z=-0.55)
+        self.number_text = Text(parent=self.torso, text=str(state.number), color=color.white if team==1 else color.black, scale=8, origin=(0,0), z=-0.55)
         self.number_text.rotation_y = 180 # Face backwards 
         
-        # Name Tag (Dynamic)
-        self.name_tag = Text(parent=self, text=self.name, color=color.white, scale=30, origin=(0,0), y=-1.8, billboard=True, enabled=False)
-        self.name_timer = 0
-
-        self.speed = 10 # Slightly higher top speed since acceleration takes time
-        if role == 'att': self.speed = 11
-        if role == 'def': self.speed = 9
-        
-        self.velocity = Vec3(0,0,0)
-        self.accel = 4.0 # How fast to reach max speed
-        self.friction = 5.0 # How fast to stop
-        
         # Cursor for active player
-        # Ground is at Y=0. Player feet approx Y=0. Cursor needs to be slightly above 0.
-        # Player Y=0.9, Feet Y=-0.9 relative to player center? No.
-        # Let's set it relative to parent to land on Y=0.02
+        # Ground is at Y=0. Player centre is Y=0.9, so relative to parent
+        # the cursor lands on Y=0.01
         self.cursor = Entity(parent=self, model='quad', texture='circle_outlined', color=color.yellow, scale=(2,2), rotation_x=90, y=-0.89, enabled=False)
 
-        # Animation State
-        self.anim_state = 'idle' 
-        self.anim_timer = 0
-        self.run_cycle = 0
-
-    def create_outline(self, part):
-        e = Entity(parent=part, model='cube', color=color.black, scale=1.0001, double_sided=False)
-        e.shader = None # Basic color
-
     def update(self):
-        # Physics / Ground clamp
-        self.y = 0.9 
-        
-        # Logic
-        if self.control_manager.active_player == self:
-            self.move_user()
-            self.cursor.enabled = True
-        else:
-            self.ai_logic()
-            self.cursor.enabled = False
+        with profiler.scope('Player.update'):
+            state = self.state
+            alpha = self.game.stepper.alpha
+            self.position = simulation.interpolated_position(state, alpha)
+            self.rotation_y = simulation.interpolated_rotation_y(state, alpha)
+            self.cursor.enabled = state.match.active_player is state
             
-        self.update_animations()
-        self.update_name_tag()
-        
-        # Billboard Name Tag
-        # Force name tag to face camera and stay upright
-        if self.name_tag.enabled:
-            self.name_tag.look_at(camera)
-            self.name_tag.rotation_z = 0 # Keep it upright
-            self.name_tag.rotation_x = 0 # Optional: maintain verticality or tilt? look_at handles pitch usually.
-            # Actually, just look_at(camera) usually works for billboards. 
-            # But since parent rotates Y, we might need to compensate or just set world rotation.
-            self.name_tag.rotation = camera.rotation
-
-    def update_name_tag(self):
-        dist = distance_xz(self.position, ball.position)
-        
-        # Show name if close to ball
-        if dist < 2.0:
-            self.name_tag.enabled = True
-            self.name_tag.color = color.white # Reset alpha
-            self.name_timer = 3.0 # Show for 3 seconds
-            
-        # Fade out
-        if self.name_timer > 0:
-            self.name_timer -= time.dt
-            if self.name_timer < 1.0:
-                 # Fade alpha
-                 self.name_tag.color = self.name_tag.color.tint(1) # Hack to set alpha? Ursina Colors are tricky with alpha
-                 self.name_tag.alpha = self.name_timer
-            
-            if self.name_timer <= 0:
-                self.name_tag.enabled = False
-
+            self.update_animations()
+            write_body_instance(self)
 
     def update_animations(self):
+        state = self.state
+        l_arm, r_arm, l_leg, r_leg = self.limb_angles
         # Override for actions
-        if self.anim_state == 'shoot':
-            self.anim_timer += time.dt
+        if state.anim_state == 'shoot':
             # Phase 1: Wind up (0 to 0.1s)
-            if self.anim_timer < 0.1:
-                self.r_leg.rotation_x = lerp(self.r_leg.rotation_x, -45, time.dt * 20)
-                self.l_arm.rotation_x = lerp(self.l_arm.rotation_x, 30, time.dt * 20)
+            if state.anim_timer < 0.1:
+                r_leg = lerp(r_leg, -45, time.dt * 20)
+                l_arm = lerp(l_arm, 30, time.dt * 20)
             # Phase 2: Swing (0.1s to 0.3s)
-            elif self.anim_timer < 0.3:
-                self.r_leg.rotation_x = lerp(self.r_leg.rotation_x, 45, time.dt * 30)
-            # Phase 3: Return
-            else:
-                self.anim_state = 'idle'
-                
-        # Run / Idle Cycle
-        else:
-            speed = self.velocity.length()
-            if speed > 0.5:
-                self.anim_state = 'run'
-                self.run_cycle += time.dt * speed * 2 # Faster run = faster cycle
-                
-                # Sine wave for limbs
-                # Legs: Opposite phases
-                self.l_leg.rotation_x = math.sin(self.run_cycle) * 30
-                self.r_leg.rotation_x = math.sin(self.run_cycle + math.pi) * 30
-                
-                # Arms: Opposite to legs (Left Leg fwd = Right Arm fwd)
-                self.l_arm.rotation_x = math.sin(self.run_cycle + math.pi) * 30
-                self.r_arm.rotation_x = math.sin(self.run_cycle) * 30
-            else:
-                # Idle: Return to 0
-                self.anim_state = 'idle'
-                self.run_cycle = 0
-                self.l_leg.rotation_x = lerp(self.l_leg.rotation_x, 0, time.dt * 10)
-                self.r_leg.rotation_x = lerp(self.r_leg.rotation_x, 0, time.dt * 10)
-                self.l_arm.rotation_x = lerp(self.l_arm.rotation_x, 0, time.dt * 10)
-                self.r_arm.rotation_x = lerp(self.r_arm.rotation_x, 0, time.dt * 10)
-
-    # ... move_user, kick_ball, ai_logic remain mostly same but let's ensure they are preserved ...
-    def check_collision(self, proposed_position):
-        # Simple sphere/circle collision check
-        # We check against all other players
-        min_dist = 0.5 # Minimum distance between players
-        
-        for p in self.control_manager.players:
-            if p == self: continue
-            
-            # Use distance_xz to ignore height differences if any
-            if distance_xz(proposed_position, p.position) < min_dist:
-                return True
-        return False
-
-    def move_user(self):
-        input_vec = Vec3(0,0,0)
-        
-    def move_user(self):
-        input_vec = Vec3(0,0,0)
-        
-        # KICKOFF STATE: Lock movement
-        if self.control_manager.match_state == 'kickoff':
-            self.img_idle() # Force idle anim
-            # Only allow passing
-            if held_keys['space']: self.kick_ball(mode='shoot') # Should we allow shoot immediately? Maybe not.
-            elif held_keys['f']:
-                self.kick_ball(mode='pass')
-                
-            return
-
-        if held_keys['w'] or held_keys['up arrow']: input_vec.z += 1
-        if held_keys['s'] or held_keys['down arrow']: input_vec.z -= 1
-        if held_keys['a'] or held_keys['left arrow']: input_vec.x -= 1
-        if held_keys['d'] or held_keys['right arrow']: input_vec.x += 1
-        
-        target_velocity = Vec3(0,0,0)
-        
-        if input_vec.length() > 0:
-            input_vec = input_vec.normalized()
-            target_velocity = input_vec * self.speed
-            # Look at target but keep Y same as self to avoid tilting
-            look_target = self.position + input_vec
-            look_target.y = self.y 
-            self.look_at(look_target)
-
-        # Apply Acceleration / Friction using lerp
-        # If we have input, accelerate to target. If no input, decelerate (friction)
-        lerp_speed = self.accel if input_vec.length() > 0 else self.friction
-        self.velocity = lerp(self.velocity, target_velocity, time.dt * lerp_speed)
-
-        # Apply Position
-        if self.velocity.length() > 0.01:
-            proposed_pos = self.position + self.velocity * time.dt
-            if not self.check_collision(proposed_pos):
-                self.position = proposed_pos
             else:
-                self.velocity = Vec3(0,0,0) # Stop on collision
-
-        # Kick Inputs
-        if held_keys['space']:
-            self.kick_ball(mode='shoot')
-        elif held_keys['f']:
-             self.kick_ball(mode='pass')
-        elif held_keys['g']:
-             self.kick_ball(mode='cross')
-    
-    def img_idle(self):
-        self.velocity = Vec3(0,0,0)
-        self.anim_state = 'idle'
-
-    def ai_logic(self):
-        # KICKOFF STATE: Freeze AI
-        if self.control_manager.match_state == 'kickoff':
-            self.img_idle()
-            return
-
-        dist_to_ball = distance_xz(self.position, ball.position)
-        target = self.base_position
-        
-        # Check if I am the designated presser for my team
-        is_presser = False
-        if self.team == 0 and self.control_manager.closest_to_ball_0 == self:
-            is_presser = True
-        elif self.team == 1 and self.control_manager.closest_to_ball_1 == self:
-            is_presser = True
-
-        if self.role == 'gk':
-            # Goal position (approximate end of field)
-            # Team 0 Goal: -X side (-FIELD_WIDTH/2)
-            # Team 1 Goal: +X side (FIELD_WIDTH/2)
-            goal_x = -FIELD_WIDTH/2 if self.team == 0 else FIELD_WIDTH/2
-            
-            # "Save Box" definitions
-            # Depth: How far forward from goal line do they engage?
-            box_depth_x = 18 
-            # Width: Z-axis width
-            box_width_z = 20
-            
-            ball_in_box = False
-            # Check Z range (Width)
-            if abs(ball.z) < box_width_z / 2: 
-                # Check X range (Depth relative to goal)
-                if self.team == 0:
-                    # Goal at -60. Box extends to -60 + 18 = -42.
-                    if ball.x < (goal_x + box_depth_x):
-                        ball_in_box = True
-                elif self.team == 1:
-                    # Goal at +60. Box extends to 60 - 18 = 42.
-                    if ball.x > (goal_x - box_depth_x):
-                        ball_in_box = True
-            
-            if ball_in_box:
-                # SAVE MODE: Aggressively intercept the ball
-                target = ball.position
-                # GK Clearing Logic: If close to ball, kick it away!
-                if dist_to_ball < 1.5:
-                    self.kick_ball(mode='clear')
-
-            else:
-                # GUARD MODE: Position between ball and goal
-                goal_center = Vec3(goal_x, 0, 0)
-                
-                # Direction from goal to ball
-                dir_to_ball = (ball.position - goal_center).normalized()
+                r_leg = lerp(r_leg, 45, time.dt * 30)
                 
-                # Stand a bit out from the goal line (e.g., 4 units)
-                guard_dist = 4
-                target = goal_center + dir_to_ball * guard_dist
-                
-                # Clamp to not go too far wide or forward
-                
-                # Team 0 (Left Goal) -> Keep X small negative
-                if self.team == 0:
-                     target.x = clamp(target.x, goal_x, goal_x + 6)
-                else:
-                     target.x = clamp(target.x, goal_x - 6, goal_x)
-
-                # Clamp Z to goal width
-                target.z = clamp(target.z, -6, 6)
-
-        elif is_presser:
-            # PRESS: Chase the ball anywhere
-            target = ball.position
+        # Run Cycle
+        elif state.anim_state == 'run':
+            # Sine wave for limbs
+            # Legs: Opposite phases
+            l_leg = math.sin(state.run_cycle) * 30
+            r_leg = math.sin(state.run_cycle + math.pi) * 30
             
-            # POSSESSION: If I have the ball (am very close), decide what to do
-            if dist_to_ball < 1.0:
-                 self.ai_decide_action()
-
+            # Arms: Opposite to legs (Left Leg fwd = Right Arm fwd)
+            l_arm = math.sin(state.run_cycle + math.pi) * 30
+            r_arm = math.sin(state.run_cycle) * 30
         else:
-            # COVER: Stay near base position but shift towards ball
-            # Calculate shift vector (ball position relative to 0,0)
-            # We want them to slide slightly towards the ball's side of the field
-            
-            # Simple approach: LERP between base and ball
-            # But clamp it so they don't leave their zone completely
-            target = lerp(self.base_position, ball.position, 0.3)
-            
-            # If ball is VERY far, stick closer to base
-            if dist_to_ball > 30:
-                target = lerp(self.base_position, ball.position, 0.1)
-
-        dist_to_target = distance_xz(self.position, target)
-        
-        # AI Physics Movement
-        target_velocity = Vec3(0,0,0)
-        
-        if dist_to_target > 0.5:
-            direction = (target - self.position).normalized()
-            # Pressers move fast, coverers move slightly slower
-            speed_mult = 1.0 if is_presser else 0.8
-            if self.role == 'gk': speed_mult = 1.1 # GK is fast
-            
-            target_speed = self.speed * speed_mult
-            target_velocity = direction * target_speed
-            
-            # Look at target but keep Y same as self to avoid tilting
-            look_target = Vec3(target)
-            look_target.y = self.y
-            self.look_at(look_target)
-
-        # Apply AI Acceleration
-        self.velocity = lerp(self.velocity, target_velocity, time.dt * self.accel)
-        
-        # Apply AI Position
-        if self.velocity.length() > 0.01:
-            proposed_pos = self.position + self.velocity * time.dt
-            if not self.check_collision(proposed_pos):
-                self.position = proposed_pos
-            else:
-                self.velocity = Vec3(0,0,0)
-
-    def ai_decide_action(self):
-        # Determine Goal Direction
-        enemy_goal_x = FIELD_WIDTH/2 if self.team == 0 else -FIELD_WIDTH/2
-        dist_to_goal = abs(self.x - enemy_goal_x)
-        
-        # 1. SHOOT if close enough 
-        if dist_to_goal < 30: 
-             # Shoot
-             self.kick_ball(mode='shoot')
-             return
-
-        # --- Dribble vs Pass Logic ---
-        
-        # Analyze Surroundings
-        enemies = self.control_manager.team_1_players if self.team == 0 else self.control_manager.team_0_players
-        forward_dir_sign = 1 if self.team == 0 else -1
-        
-        blocked_ahead = False
-        is_swarmed = False
-        nearby_enemies = 0
-        
-        for e in enemies:
-            d = distance_xz(self.position, e.position)
-            if d < 5:
-                nearby_enemies += 1
-                
-                # Check if blocking forward path
-                # Vector to enemy
-                to_enemy = e.position - self.position
-                # Project onto forward X axis
-                fwd_dot = to_enemy.x * forward_dir_sign
-                
-                # If enemy is in front (positive dot) and close
-                if fwd_dot > 0:
-                    blocked_ahead = True
-
-        if nearby_enemies >= 2:
-            is_swarmed = True
-
-        # DRIBBLE PRIORITY:
-        # If I have space ahead and am not swarmed, keep running!
-        if not blocked_ahead and not is_swarmed:
-            return # Continue dribbling (default movement)
-
-        # 2. PASS if blocked or swarmed
-        pass_target = self.get_best_pass_target()
-        
-        # If we are desperate (swarmed), lower the bar for a pass
-        score_threshold = 0
-        if is_swarmed: score_threshold = -10 
-        
-        if pass_target:
-             self.look_at(pass_target.position)
-             self.kick_ball(mode='pass', target_entity=pass_target)
-             return
-             
-        # 3. DRIBBLE (Default - handled by movement, but maybe small push?)
-        # If we couldn't pass even when blocked, we might just lose the ball or try to force it.
-        pass 
-
-    def get_closest_teammate(self):
-        """Finds the best teammate to pass/cross to based on distance and direction."""
-        teammates = self.control_manager.team_0_players if self.team == 0 else self.control_manager.team_1_players
-        best_target = None
-        min_dist = 999
-        
-        # Simple closest logic for user feel, or maybe directional?
-        # Let's use directional if input is pressed, otherwise closest.
-        # For now, just closest teammate that isn't me.
-        
-        for mate in teammates:
-            if mate == self: continue
-            d = distance_xz(self.position, mate.position)
-            if d < min_dist:
-                min_dist = d
-                best_target = mate
-                
-        return best_target 
-
-    def get_best_pass_target(self):
-        best_target = None
-        best_score = -999
-        
-        # Enemy Goal X
-        enemy_goal_x = FIELD_WIDTH/2 if self.team == 0 else -FIELD_WIDTH/2
-        forward_dir_sign = 1 if self.team == 0 else -1
-
-        teammates = self.control_manager.team_0_players if self.team == 0 else self.control_manager.team_1_players
-        
-        for mate in teammates:
-            if mate == self or mate.role == 'gk': continue
-            
-            dist = distance_xz(self.position, mate.position)
-            
-            # Criteria 1: Distance (Open pass: 5 to 30 units)
-            if dist < 5 or dist > 40: continue
-            
-            # Criteria 2: Forward Progress (Is mate closer to enemy goal?)
-            # Or simplified: Is mate further 'forward' in X?
-            # Team 0 checks if mate.x > self.x
-            fw_dist = (mate.x - self.x) * forward_dir_sign
-            
-            # Score
-            score = 0
-            score += fw_dist * 2 # Reward forwardness
-            score -= abs(dist - 15) * 0.5 # Reward ideal distance (~15)
-            
-            # Criteria 3: Openness (Distance to nearest enemy)
-            # Find nearest enemy to mate
-            enemies = self.control_manager.team_1_players if self.team == 0 else self.control_manager.team_0_players
-            nearest_enemy_dist = 999
-            for e in enemies:
-                d = distance_xz(mate.position, e.position)
-                if d < nearest_enemy_dist: nearest_enemy_dist = d
-            
-            if nearest_enemy_dist < 3: score -= 50 # Blocked
-            score += nearest_enemy_dist * 1.5 # Reward space
-            
-            if score > best_score:
-                best_score = score
-                best_target = mate
-                
-        return best_target
+            # Idle: Return to 0
+            l_leg = lerp(l_leg, 0, time.dt * 10)
+            r_leg = lerp(r_leg, 0, time.dt * 10)
+            l_arm = lerp(l_arm, 0, time.dt * 10)
+            r_arm = lerp(r_arm, 0, time.dt * 10)
 
-    def kick_ball(self, mode='shoot', target_entity=None):
-        # Cooldown check (handled by checking distance, or maybe a timer? simple is best)
-        # If ball is already moving fast away, don't kick
-        ball_speed_away = ball.velocity.length()
-        if ball_speed_away > 10: 
-             # Check if it's moving AWAY
-             # If dot product of velocity and dir to ball is positive, it's moving same dir? No.
-             return 
-
-        if mode == 'shoot':
-             enemy_goal_x = FIELD_WIDTH/2 if self.team == 0 else -FIELD_WIDTH/2
-             goal_pos = Vec3(enemy_goal_x, 0, 0)
-             direction = (goal_pos - self.position).normalized()
-             # Accuracy noise
-             direction.z += random.uniform(-0.1, 0.1)
-             direction = direction.normalized()
-             
-             power = 35
-             lift = 6
-             Audio('shoot', pitch=random.uniform(0.8, 1.2), loop=False, autoplay=True)
-             self.anim_state = 'shoot'
-             self.anim_timer = 0
-             
-        elif mode == 'pass':
-             # User Pass: Auto-target closest, or directional?
-             # Let's try auto-targeting closest teammate for now to make it playable
-             if not target_entity and self.control_manager.active_player == self:
-                 target_entity = self.get_closest_teammate()
-
-             if target_entity:
-                 direction = (target_entity.position - self.position).normalized()
-                 power = 25 # Fast pass
-                 lift = 0 # Ground pass
-             else:
-                 direction = self.forward
-                 power = 20
-                 lift = 0
-             
-             Audio('shoot', pitch=1.5, loop=False, autoplay=True) # Higher pitch for pass
-             self.anim_state = 'shoot'
-             self.anim_timer = 0
-             
-             Audio('shoot', pitch=1.5, loop=False, autoplay=True) # Higher pitch for pass
-             self.anim_state = 'shoot'
-             self.anim_timer = 0
-             
-             self.anim_timer = 0
-             
-             # If Kickoff, unlock game (Moved to end of function to cover all kicks)
-             
-        elif mode == 'cross':
-             # Cross: target teammate but with height
-             if not target_entity and self.control_manager.active_player == self:
-                 target_entity = self.get_closest_teammate()
-                 
-             if target_entity:
-                 direction = (target_entity.position - self.position).normalized()
-                 power = 30 
-                 lift = 12 # High arc
-             else:
-                 direction = self.forward
-                 power = 30
-                 lift = 10
-                 
-             Audio('shoot', pitch=1.0, loop=False, autoplay=True)
-             self.anim_state = 'shoot'
-             self.anim_timer = 0
-
-        elif mode == 'clear':
-             # Kick towards center / forward
-             enemy_goal_x = FIELD_WIDTH/2 if self.team == 0 else -FIELD_WIDTH/2
-             goal_pos = Vec3(enemy_goal_x, 0, 0)
-             direction = (goal_pos - self.position).normalized()
-             direction.z += random.uniform(-0.5, 0.5) # Chaotic clear
-             direction = direction.normalized()
-             power = 40
-             lift = 10
-             Audio('shoot', pitch=0.7, loop=False, autoplay=True)
-             self.anim_state = 'shoot'
-             self.anim_timer = 0
-
-        else: # Standard weak kick / Dribble push handled by collision
-             direction = self.forward
-             power = 5
-             lift = 0
-
-             lift = 0
-
-        # Unlock Kickoff State
-        if self.control_manager.match_state == 'kickoff':
-             if mode == 'pass':
-                 print(f"Kickoff -> Playing detected in kick_ball (PASS). Manager ID: {id(self.control_manager)}")
-                 self.control_manager.match_state = 'playing'
-
-        ball.velocity = direction * power 
-        ball.velocity.y = lift
+        self.limb_angles = [l_arm, r_arm, l_leg, r_leg]
 
 class Ball(Entity):
-    def __init__(self):
+    def __init__(self, state, game):
         super().__init__(
-            model='sphere',
+            # Parsing Ursina's own sphere takes longer than the rest of the scene, so keep it baked too
+            model=asset_cache.load_or_bake('ball', load_model, 'sphere', application.internal_models_compressed_folder),
             scale=0.8,
             color=color.white,
-            position=(0, 10, 0),
-            collider='sphere'
+            position=state.position,
         )
-        self.velocity = Vec3(0,0,0)
-        self.outline = Entity(parent=self, model='sphere', color=color.black, scale=1.0001, double_sided=False)
+        self.state = state
+        self.game = game
         
     def update(self):
-        # Physics
-        self.velocity.y -= 25 * time.dt # Gravity
-        self.position += self.velocity * time.dt
-        
-        # Friction
-        if self.y <= 0.5:
-             self.velocity.x *= 0.98
-             self.velocity.z *= 0.98
-        
-        # Ground Bounce
-        if self.y < 0.4:
-            self.y = 0.4
-            self.velocity.y *= -0.6
-            if abs(self.velocity.y) < 1: self.velocity.y = 0
-
-        # Field Bounds (Now X is length, Z is width)
-        if self.x > FIELD_WIDTH/2:
-            self.x = FIELD_WIDTH/2
-            self.velocity.x *= -0.8
-        if self.x < -FIELD_WIDTH/2:
-            self.x = -FIELD_WIDTH/2
-            self.velocity.x *= -0.8
-            
-        if self.z > FIELD_DEPTH/2:
-            self.z = FIELD_DEPTH/2
-            self.velocity.z *= -0.8
-        if self.z < -FIELD_DEPTH/2:
-            self.z = -FIELD_DEPTH/2
-            self.velocity.z *= -0.8
-                
-        # Collision with players (Simple push)
-        hit_info = self.intersects() 
-        if hit_info.hit:
-             if isinstance(hit_info.entity, Player):
-                 # Dribble / Push
-                 push_dir = (self.position - hit_info.entity.position).normalized()
-                 self.velocity += push_dir * 5 * time.dt
-                 self.position += push_dir * 2 * time.dt
+        with profiler.scope('Ball.update'):
+            self.position = simulation.interpolated_position(self.state, self.game.stepper.alpha)
 
 class Referee(Entity):
-    def __init__(self):
+    def __init__(self, state, game):
         super().__init__(
-            position=(0, 0.9, -15), # Start slightly off-center
+            position=state.position,
             collider=None, # No physics collision
             scale=(1, 1, 1)
         )
+        self.state = state
+        self.game = game
         
         # --- Visuals: Referee Uniform (Black) ---
-        skin_color = color.rgb(255, 220, 177)
-        kit_color = color.black
-        
-        # 1. Torso
-        self.torso = Entity(parent=self, model='cube', color=kit_color, scale=(0.4, 0.7, 0.25), y=0.1)
-        
-        # 2. Head
-        self.head = Entity(parent=self, model='cube', color=skin_color, scale=(0.3, 0.35, 0.3), y=0.7)
-        
-        # 3. Arms
-        self.l_arm = Entity(parent=self, model='cube', color=kit_color, scale=(0.12, 0.6, 0.15), position=(-0.35, 0.1, 0))
-        self.r_arm = Entity(parent=self, model='cube', color=kit_color, scale=(0.12, 0.6, 0.15), position=(0.35, 0.1, 0))
-        
-        # 4. Legs
-        self.l_leg = Entity(parent=self, model='cube', color=color.black, scale=(0.18, 0.7, 0.2), position=(-0.12, -0.65, 0))
-        self.r_leg = Entity(parent=self, model='cube', color=color.black, scale=(0.18, 0.7, 0.2), position=(0.12, -0.65, 0))
-
-        # Movement props
-        self.speed = 8.0
-        self.velocity = Vec3(0,0,0)
-        self.run_cycle = 0
+        self.batch, self.instance = game.body_renderer.add(player_model.REFEREE_BODY, player_model.REFEREE_COLORS)
+        self.limb_angles = [0, 0, 0, 0] # l_arm, r_arm, l_leg, r_leg (degrees)
 
     def update(self):
-        # Follow the ball but keep reasonable distance
-        # Ideally, stay "behind" the play or to the side, not in the scrum
-        
-        # Target: Position near ball but not ON it
-        # Try to stay 10 units away, preferably on the side (Z axis)
-        
-        # Vector from ball to referee
-        vec_to_me = self.position - ball.position
-        dist = vec_to_me.length()
-        
-        target_pos = ball.position
-        
-        # If too close, back away
-        if dist < 8:
-            # Move away from ball
-            move_dir = vec_to_me.normalized()
-            if move_dir.length() < 0.1: move_dir = Vec3(0,0,1)
-            target_pos = ball.position + move_dir * 10
-        elif dist > 15:
-            # Move closer
-             target_pos = ball.position + vec_to_me.normalized() * 12
-        else:
-            # Happy zone, maybe drift towards side?
-            pass
+        with profiler.scope('Referee.update'):
+            state = self.state
+            alpha = self.game.stepper.alpha
+            self.position = simulation.interpolated_position(state, alpha)
+            self.rotation_y = simulation.interpolated_rotation_y(state, alpha)
 
-        # Smooth movement
-        dist_to_target = distance_xz(self.position, target_pos)
-        
-        if dist_to_target > 1.0:
-            dir_to_target = (target_pos - self.position).normalized()
-            self.velocity = lerp(self.velocity, dir_to_target * self.speed, time.dt * 2)
-            
-            # Look at ball
-            look_target = ball.position
-            look_target.y = self.y
-            self.look_at(look_target)
-            
             # Animation
-            self.run_cycle += time.dt * self.velocity.length() * 2
-            self.l_leg.rotation_x = math.sin(self.run_cycle) * 30
-            self.r_leg.rotation_x = math.sin(self.run_cycle + math.pi) * 30
-            self.l_arm.rotation_x = math.sin(self.run_cycle + math.pi) * 30
-            self.r_arm.rotation_x = math.sin(self.run_cycle) * 30
-        else:
-            self.velocity = Vec3(0,0,0)
-            self.l_leg.rotation_x = lerp(self.l_leg.rotation_x, 0, time.dt * 5)
-            self.r_leg.rotation_x = lerp(self.r_leg.rotation_x, 0, time.dt * 5)
-            self.l_arm.rotation_x = lerp(self.l_arm.rotation_x, 0, time.dt * 5)
-            self.r_arm.rotation_x = lerp(self.r_arm.rotation_x, 0, time.dt * 5)
-
-        self.position += self.velocity * time.dt
-        self.y = 0.9 # Keep on ground
+            if state.velocity.length() > 0:
+                l_leg = math.sin(state.run_cycle) * 30
+                r_leg = math.sin(state.run_cycle + math.pi) * 30
+                l_arm = math.sin(state.run_cycle + math.pi) * 30
+                r_arm = math.sin(state.run_cycle) * 30
+                self.limb_angles = [l_arm, r_arm, l_leg, r_leg]
+            else:
+                self.limb_angles = [lerp(a, 0, time.dt * 5) for a in self.limb_angles]
+            write_body_instance(self)
+
+def create_stepper(args):
+    """The match, and whatever advances it, for the command line. Needs no window."""
+    if args.replay:
+        # Views are driven straight from the file; no AI or physics runs
+        reader = replay.ReplayReader(args.replay)
+        return replay.ReplayStepper(reader.create_match(), reader)
+    if args.connect:
+        # The relay hands out the team and the seed once both players have joined
+        host, port = args.connect.rsplit(':', 1)
+        client = net.Client((host, int(port)))
+        print(f"Waiting for an opponent at {args.connect}...")
+        team, seed = client.connect()
+        print(f"Playing team {team}, match seed {seed}")
+        match = simulation.create_match(controlled_team=team, seed=seed, two_player=True)
+        return net.NetStepper(match, client)
+    if args.server:
+        # The server runs the match; this end only draws it and sends inputs
+        host, port = args.server.rsplit(':', 1)
+        connection = server.Connection((host, int(port)))
+        match_id, seed, team = connection.join(args.watch)
+        print(f"{'Watching' if team is None else 'Playing'} match {match_id} on {args.server}")
+        match = simulation.create_match(controlled_team=team, seed=seed)
+        return server.RemoteStepper(match, connection)
+
+    match = simulation.create_match(controlled_team=0, seed=args.seed)
+    print(f"Match seed: {match.seed}") # Pass with --seed to replay this match
+    # Physics and AI tick at a fixed rate; views interpolate between ticks
+    stepper = simulation.FixedStepper(match)
+    if args.record:
+        stepper.recorder = replay.ReplayWriter(args.record, match)
+        atexit.register(stepper.recorder.close)
+    return stepper
 
 class GameManager(Entity):
-    def __init__(self):
+    def __init__(self, stepper, replaying=False, online=False):
         super().__init__()
         print(f"GameManager Initialized. ID: {id(self)}")
-        self.players = []
-        self.active_player = None
-        self.team_0_players = []
-        self.team_1_players = []
-        
-        self.match_state = 'kickoff' # 'kickoff', 'playing'
-        
-        self.referee = Referee()
-
+        self.stepper = stepper
+        self.match = stepper.match
+        self.replaying = replaying
+        self.online = online
+        self.body_renderer = player_model.BodyRenderer()
+        self.views = []
+        self.switch_requested = False
+        
+        self.referee = Referee(self.match.referee, self)
+        # Loaded once here so kicks never hit the disk
+        self.kick_sounds = sound.SoundPool('shoot')
+
+        self.warp_text = hud.Label(text='', position=window.top_left + Vec2(0.02, -0.02), origin=(-0.5, 0.5), scale=1, color=color.white)
+
+        self.profile_text = None # Made the first time profiling is turned on
+        self.profile_timer = 0
+
+    def set_warp(self, time_scale):
+        if self.online: return # Both ends have to keep to the same clock
+        self.stepper.time_scale = time_scale
+
+    def quick_save(self):
+        if self.replaying or self.online: return
+        self.quicksave = simulation.Snapshot(self.match)
+        with open(QUICKSAVE_PATH, 'wb') as f:
+            f.write(self.quicksave.to_bytes())
+
+    def quick_load(self):
+        if self.replaying or self.online: return
+        snapshot = getattr(self, 'quicksave', None)
+        if snapshot is None:
+            if not os.path.exists(QUICKSAVE_PATH): return
+            with open(QUICKSAVE_PATH, 'rb') as f:
+                snapshot = simulation.Snapshot.from_bytes(f.read())
+        simulation.load_state(self.match, snapshot)
+        self.stepper.accumulator = 0.0
+
+    def set_profiling(self, enabled):
+        profiler.enabled = enabled
+        if enabled and self.profile_text is None:
+            # Profiling overlay: rolling per-section frame times, redrawn a couple of times a second
+            self.profile_text = hud.Label(text='', position=window.top_right + Vec2(-0.02, -0.02), origin=(0.5, 0.5), scale=0.75,
+                                          font='VeraMono.ttf', color=color.white)
+        if self.profile_text:
+            self.profile_text.enabled = enabled
+        if enabled: profiler.reset()
+
+    def update_profile_overlay(self):
+        # Each update() starts a new profiler frame
+        profiler.end_frame()
+        self.profile_timer -= time.dt
+        if self.profile_text and self.profile_text.enabled and self.profile_timer <= 0:
+            self.profile_timer = PROFILE_REFRESH
+            self.profile_text.set(profiler.report())
+
+    @property
+    def active_player(self):
+        return self.match.active_player
+
+    def read_inputs(self):
+        move_x = 0
+        move_z = 0
+        if held_keys['w'] or held_keys['up arrow']: move_z += 1
+        if held_keys['s'] or held_keys['down arrow']: move_z -= 1
+        if held_keys['a'] or held_keys['left arrow']: move_x -= 1
+        if held_keys['d'] or held_keys['right arrow']: move_x += 1
+
+        kick = None
+        if held_keys['space']: kick = 'shoot'
+        elif held_keys['f']: kick = 'pass'
+        elif held_keys['g']: kick = 'cross'
+
+        return simulation.Inputs(move_x, move_z, kick, self.switch_requested)
 
     def update(self):
-        # State Management: Unlock only on pass (handled in Player.kick_ball)
-        pass
-
-        # Auto-switch to player with ball (Team 0)
-        # If closest player is close enough to be considered "getting the ball"
-        if self.closest_to_ball_0 and self.closest_to_ball_0 != self.active_player:
-            dist = distance_xz(self.closest_to_ball_0.position, ball.position)
-            if dist < 5.0: # Auto-switch threshold
-                self.active_player = self.closest_to_ball_0
-
-        # Determine closest player to ball for each team (Tactical AI)
-        if not self.team_0_players or not self.team_1_players: return
-
-        # Team 0
-        self.closest_to_ball_0 = min(self.team_0_players, key=lambda p: distance_xz(p.position, ball.position))
-        # Remove old state init here, it is in reset_positions/init
-        # self.state = 'kickoff' 
-        # self.kickoff_team = 0 
-
-        # Team 0
-        self.closest_to_ball_0 = min(self.team_0_players, key=lambda p: distance_xz(p.position, ball.position))
-        # Team 1
-        self.closest_to_ball_1 = min(self.team_1_players, key=lambda p: distance_xz(p.position, ball.position))
-        
-        # Update UI
-        if hasattr(self, 'p1_bar'):
-             p1_name = self.active_player.name if self.active_player else self.closest_to_ball_0.name
-             self.p1_bar.text = f"Real Madrid: {p1_name} ({self.closest_to_ball_0.role.upper()})"
-             
-             p2_name = self.closest_to_ball_1.name
-             self.p2_bar.text = f"Barcelona: {p2_name} ({self.closest_to_ball_1.role.upper()})"
-
+        self.update_profile_overlay()
+        with profiler.scope('GameManager.update'):
+            # Keep a TAB press pending until a tick has actually consumed it
+            with profiler.scope('stepper.advance'):
+                ran = self.stepper.advance(time.dt, self.read_inputs())
+            profiler.count('ticks', ran)
+            if ran:
+                self.switch_requested = False
+
+            if self.stepper.time_scale <= MAX_AUDIBLE_WARP:
+                for kind, player, mode in self.stepper.events:
+                    if kind == 'kick':
+                        self.play_kick_sound(mode)
+
+            # Update UI (labels only rebuild their glyphs when the text changes)
+            with profiler.scope('hud.text'):
+                scale = self.stepper.time_scale
+                warp = 'MAX' if scale == simulation.FLAT_OUT else f"x{scale:g}"
+                self.warp_text.set(f"{warp}  {self.stepper.ticks_per_second:.0f} ticks/s")
+
+                if hasattr(self, 'p1_bar'):
+                    closest_0 = self.match.closest_to_ball_0
+                    closest_1 = self.match.closest_to_ball_1
+                    humans = {team: getattr(self.match, slot) for team, slot in simulation.human_teams(self.match)}
+                    p1 = humans.get(0) or closest_0
+                    p2 = humans.get(1) or closest_1
+                    self.p1_bar.set(f"Real Madrid: {p1.name} ({p1.role.upper()})")
+                    self.p2_bar.set(f"Barcelona: {p2.name} ({p2.role.upper()})")
+
+            if hasattr(self, 'name_tags'):
+                with profiler.scope('hud.name_tags'):
+                    self.name_tags.update(self.match, self.stepper.alpha, time.dt)
+
+            self.follow_camera()
+
+    def follow_camera(self):
+        # Camera Smooth Follow
+        if self.active_player:
+            target = self.active_player.position
+        
+            # TV Camera: Follow X and Z (Up/Down), Keep relative offset
+            # Offset: Y=50 (Height), Z=-60 (Depth relative to player)
+            desired_pos = Vec3(target.x, 50, target.z - 60)
+        
+            camera.position = lerp(camera.position, desired_pos, time.dt * 2)
+
+    def play_kick_sound(self, mode):
+        if mode == 'shoot':
+            self.kick_sounds.play(variation=0.2)
+        elif mode == 'pass':
+            self.kick_sounds.play(pitch=1.5, volume=2) # Higher pitch for pass
+        elif mode == 'cross':
+            self.kick_sounds.play(pitch=1.0)
+        elif mode == 'clear':
+            self.kick_sounds.play(pitch=0.7)
 
     def setup_teams(self):
-        # Names
-        # real_madrid = ["Courtois", "Carvajal", "Militao", "Alaba", "Mendy", "Modric", "Kroos", "Vini Jr", "Rodrygo", "Benzema"]
-        barcelona = ["Ter Stegen", "Araujo", "Kounde", "Christensen", "Balde", "Pedri", "Gavi", "De Jong", "Raphinha", "Lewandowski"]
-        
-        # Team 0: Real Madrid (Left Side)
-        # GK
-        self.create_player((-60, 0), 0, 'gk', 1, "Casilas")
-        # Def x 4
-        self.create_player((-45, -20), 0, 'def', 3, "Roberto Carlos") # LB
-        self.create_player((-42, -7), 0, 'def', 4, "Ramos")     # CB
-        self.create_player((-42, 7), 0, 'def', 5, "Vandijk")    # CB
-        self.create_player((-45, 20), 0, 'def', 2, "Dani Alvies")     # RB
-        # Mid x 3
-        self.create_player((-25, -12), 0, 'mid', 8, "Kroos")      # LCM
-        self.create_player((-20, 0), 0, 'mid', 10, "Messi")      # CAM
-        self.create_player((-25, 12), 0, 'mid', 5, "Bellingham") # RCM
-        # Att x 3
-        self.create_player((-10, -20), 0, 'att', 11, "Neymar Jr") # LW
-        self.create_player((-5, 0), 0, 'att', 7, "Ronaldo")      # ST
-        self.create_player((-10, 20), 0, 'att', 9, "Ali Jr")      # RW
-
-        # Team 1: Barcelona (Right Side)
-        # GK
-        self.create_player((60, 0), 1, 'gk', 1, barcelona[0])
-        # Def x 4
-        self.create_player((45, -15), 1, 'def', 2, barcelona[1])
-        self.create_player((45, 15), 1, 'def', 3, barcelona[2])
-        self.create_player((40, -5), 1, 'def', 4, barcelona[3])
-        self.create_player((40, 5), 1, 'def', 5, barcelona[4])
-        # Mid x 3
-        self.create_player((20, -10), 1, 'mid', 8, barcelona[5])
-        self.create_player((20, 10), 1, 'mid', 6, barcelona[6])
-        self.create_player((15, 0), 1, 'mid', 21, barcelona[7])
-        # Att x 3
-        self.create_player((5, -15), 1, 'att', 22, barcelona[8])
-        self.create_player((5, 15), 1, 'att', 11, "Dembele") # Extra att
-        self.create_player((2, 0), 1, 'att', 9, barcelona[9])
-
-        self.active_player = self.team_0_players[9] # Start with Ronaldo (Index 9: 1gk+4def+3mid+1lw = 9th is ST?)
-        # Let's check indices: 0:GK, 1:LB, 2:CB, 3:CB, 4:RB, 5:LCM, 6:CAM, 7:RCM, 8:LW, 9:ST, 10:RW
-        
-        # Initialize trackers
-        self.closest_to_ball_0 = self.active_player
-        self.closest_to_ball_1 = self.team_1_players[0]
+        # Players are created by the simulation; build one view per player
+        for state in self.match.players:
+            self.views.append(Player(state, self))
 
         # --- UI Player Bars ---
-        # Adjusted positions for visibility (origin top-left for left bar, top-right for right bar?)
-        # Let's use cleaner alignment.
-        self.p1_bar = Text(text="Real Madrid: ", position=(-0.5 * window.aspect_ratio + 0.1, -0.45), origin=(-0.5, 0), scale=1.5, color=color.white)
-        self.p2_bar = Text(text="Barcelona: ", position=(0.5 * window.aspect_ratio - 0.6, -0.45), origin=(-0.5, 0), scale=1.5, color=color.white)
-        
-        self.reset_positions(0)
-
-    def reset_positions(self, team_index):
-        print(f"Reset Positions Called. Manager ID: {id(self)}")
-        self.match_state = 'kickoff'
-        self.kickoff_team = team_index
-        
-        # Reset Ball
-        ball.position = Vec3(0, 0.5, 0)
-        ball.velocity = Vec3(0, 0, 0)
-
-        # Team 0 (Left Side, -X)
-        t0_players = self.team_0_players
-        # Team 1 (Right Side, +X)
-        t1_players = self.team_1_players
-        
-        if team_index == 0:
-            # TEAM 0 KICK OFF
-            # 1. Striker (Active) at center
-            t0_players[9].position = Vec3(-0.5, 0.9, 0) # Ronaldo
-            self.active_player = t0_players[9]
-            
-            # 2. Teammate (Midfielder) close by for pass
-            t0_players[6].position = Vec3(-2, 0.9, 2)   # Messi (CAM)
-            
-            # 3. Rest of team 0 in own half
-            # GK
-            t0_players[0].position = Vec3(-60, 0.9, 0)
-            # Defenders
-            t0_players[1].position = Vec3(-45, 0.9, -20)
-            t0_players[2].position = Vec3(-42, 0.9, -7)
-            t0_players[3].position = Vec3(-42, 0.9, 7)
-            t0_players[4].position = Vec3(-45, 0.9, 20)
-            # Mids (excluding messi)
-            t0_players[5].position = Vec3(-25, 0.9, -12)
-            t0_players[7].position = Vec3(-25, 0.9, 12)
-            # Att (excluding ronaldo)
-            t0_players[8].position = Vec3(-10, 0.9, -20)
-            t0_players[10].position = Vec3(-10, 0.9, 20)      
-
-            # TEAM 1 (Defending) - Safely in own half
-            for p in t1_players:
-                 # Map their original "formation" positions but ensure X > 10
-                 # Simple shift: if they were too forward, pull back
-                 p.position = p.base_position
-                 if p.position.x < 10: p.position.x = 10 + random.uniform(0, 5)
+        self.p1_bar = hud.Label(text="Real Madrid: ", position=(-0.5 * window.aspect_ratio + 0.1, -0.45), origin=(-0.5, 0), scale=1.5, color=color.white)
+        self.p2_bar = hud.Label(text="Barcelona: ", position=(0.5 * window.aspect_ratio - 0.6, -0.45), origin=(-0.5, 0), scale=1.5, color=color.white)
 
-        else:
-            # TEAM 1 KICK OFF
-            # 1. Striker at center
-            t1_players[9].position = Vec3(0.5, 0.9, 0)
-            self.active_player = t1_players[9]
-            
-            # 2. Teammate close by
-            t1_players[6].position = Vec3(2, 0.9, 2)
-
-            # 3. Rest of team 1
-            # GK
-            t1_players[0].position = Vec3(60, 0.9, 0)
-            # Defs
-            t1_players[1].position = Vec3(45, 0.9, -15)
-            t1_players[2].position = Vec3(45, 0.9, 15)
-            t1_players[3].position = Vec3(40, 0.9, -5)
-            t1_players[4].position = Vec3(40, 0.9, 5)
-            # Mids
-            t1_players[5].position = Vec3(20, 0.9, -10)
-            t1_players[7].position = Vec3(15, 0.9, 0)
-            # Atts
-            t1_players[8].position = Vec3(5, 0.9, -15)
-            t1_players[10].position = Vec3(2, 0.9, 0) # Another att
-
-            # TEAM 0 (Defending)
-            for p in t0_players:
-                 p.position = p.base_position
-                 if p.position.x > -10: p.position.x = -10 - random.uniform(0, 5)
-
-
-
-    def create_player(self, pos_2d, team, role, number, name):
-        # We need to map 2D pos (X,Z) carefully.
-        # Arguments are passed as (X, Z) pairs in field logic
-        p = Player(position=(pos_2d[0], 1, pos_2d[1]), team=team, role=role, control_manager=self, number=number, name=name)
-        self.players.append(p)
-        if team == 0: self.team_0_players.append(p)
-        else: self.team_1_players.append(p)
+    def setup_name_tags(self):
+        # Renders every name into the tag atlas; left until after the first frame
+        self.name_tags = hud.NameTags(self.match.players)
 
     def input(self, key):
+        if self.replaying:
+            stepper = self.stepper
+            if key == 'space': stepper.paused = not stepper.paused
+            if key == 'left arrow': stepper.seek(stepper.ticks - 5 * simulation.TICK_RATE)
+            if key == 'right arrow': stepper.seek(stepper.ticks + 5 * simulation.TICK_RATE)
+            if key == 'home': stepper.seek(0)
         if key == 'tab':
-            self.switch_player()
-            
-    def switch_player(self):
-        team = self.team_0_players
-        closest_p = min(team, key=lambda p: distance_xz(p.position, ball.position))
-        self.active_player = closest_p
+            self.switch_requested = True
+        if key in WARP_SPEEDS:
+            self.set_warp(WARP_SPEEDS[key])
+        if key == 'f3':
+            self.set_profiling(not profiler.enabled)
+        if key == 'f5':
+            self.quick_save()
+        if key == 'f9':
+            self.quick_load()
+        if key == 'o':
+            global OUTLINES
+            OUTLINES = not OUTLINES
+            outline.set_outlines(OUTLINES)
+        if key == 'escape':
+            application.quit()
 
 
 
 # --- Scene Setup ---
-# Ground: Bright Green, Horizontal Orientation
-# Ground: Dark Green Base
-ground = Entity(model='plane', scale=(FIELD_WIDTH, 1, FIELD_DEPTH), color=color.rgb(0, 150, 0), collider='box')
-
-# Pitch Pattern (Alternating Stripes)
-stripe_width = 8
-for i in range(int(-FIELD_WIDTH/2), int(FIELD_WIDTH/2), stripe_width * 2):
-    Entity(parent=ground, model='quad', scale=(stripe_width/FIELD_WIDTH, 1), x=(i + stripe_width/2)/FIELD_WIDTH, 
-           color=color.rgba(0, 255, 0, 20), y=0.001, rotation_x=90) # Translucent overlay
-
-# Center Spot
-Entity(parent=ground, model='circle', scale=(0.015, 0.02), color=color.white, y=0.002, rotation_x=90) 
-
-
-# Lines
-# Center Line (Thinner, Z-axis)
-Entity(parent=ground, model='quad', scale=(0.005, 1), z=0, color=color.white, y=0.01, rotation_x=90) 
-# Center Circle
-Entity(parent=ground, model='circle', scale=(0.15, 1, 0.25), color=color.white, y=0.01, rotation_x=90, alpha=0.5) 
-
-# Touch lines (Top/Bottom Z)
-Entity(parent=ground, model='quad', scale=(1, 0.01), z=0.49, color=color.white, y=0.01, rotation_x=90) 
-Entity(parent=ground, model='quad', scale=(1, 0.01), z=-0.49, color=color.white, y=0.01, rotation_x=90)
-# End lines (Left/Right X)
-Entity(parent=ground, model='quad', scale=(0.01, 1), x=0.49, color=color.white, y=0.01, rotation_x=90)
-Entity(parent=ground, model='quad', scale=(0.01, 1), x=-0.49, color=color.white, y=0.01, rotation_x=90)
-
-# Goals (Oriented on X axis)
-# Left Goal (Team 0 Net)
-goal_blue = Entity(model='cube', scale=(1, 4, 14), position=(-FIELD_WIDTH/2, 2, 0), color=color.white, alpha=0.5)
-# Right Goal (Team 1 Net)
-goal_red = Entity(model='cube', scale=(1, 4, 14), position=(FIELD_WIDTH/2, 2, 0), color=color.white, alpha=0.5)
-
-ball = Ball()
-game_manager = GameManager()
-game_manager.setup_teams()
-
-# Lighting
-pivot = Entity()
-DirectionalLight(parent=pivot, y=10, z=-10, shadows=True)
-AmbientLight(color=color.rgba(100, 100, 100, 100))
-
-# Camera (TV View - Side)
-# Positioned at negative Z (Side line), looking at center
-camera.position = (0, 50, -75)
-camera.rotation_x = 45
-
-# UI
-
-msg = Text(text='WASD to Move, SPACE to Shoot, F to Pass, G to Cross, TAB to Switch Player', y=0.45, origin=(0,0))
-
-def update():
-    # Camera Smooth Follow
-    if game_manager.active_player:
-        target = game_manager.active_player.position
-        
-        # TV Camera: Follow X and Z (Up/Down), Keep relative offset
-        # Offset: Y=50 (Height), Z=-60 (Depth relative to player)
-        desired_pos = Vec3(target.x, 50, target.z - 60)
-        
-        camera.position = lerp(camera.position, desired_pos, time.dt * 2)
-
-    if held_keys['escape']:
-        application.quit()
+def build_pitch():
+    """Lay the pitch out with entities, then flatten it into one plain node for asset_cache."""
+    pitch = Entity()
+
+    # Ground: Bright Green, Horizontal Orientation
+    # Ground: Dark Green Base
+    ground = Entity(parent=pitch, model='plane', scale=(FIELD_WIDTH, 1, FIELD_DEPTH), color=color.rgb(0, 150, 0))
+
+    # Pitch Pattern (Alternating Stripes)
+    stripe_width = 8
+    for i in range(int(-FIELD_WIDTH/2), int(FIELD_WIDTH/2), stripe_width * 2):
+        Entity(parent=ground, model='quad', scale=(stripe_width/FIELD_WIDTH, 1), x=(i + stripe_width/2)/FIELD_WIDTH, 
+               color=color.rgba(0, 255, 0, 20), y=0.001, rotation_x=90) # Translucent overlay
+
+    # Center Spot
+    Entity(parent=ground, model='circle', scale=(0.015, 0.02), color=color.white, y=0.002, rotation_x=90) 
+
+
+    # Lines
+    # Center Line (Thinner, Z-axis)
+    Entity(parent=ground, model='quad', scale=(0.005, 1), z=0, color=color.white, y=0.01, rotation_x=90) 
+    # Center Circle
+    Entity(parent=ground, model='circle', scale=(0.15, 1, 0.25), color=color.white, y=0.01, rotation_x=90, alpha=0.5) 
+
+    # Touch lines (Top/Bottom Z)
+    Entity(parent=ground, model='quad', scale=(1, 0.01), z=0.49, color=color.white, y=0.01, rotation_x=90) 
+    Entity(parent=ground, model='quad', scale=(1, 0.01), z=-0.49, color=color.white, y=0.01, rotation_x=90)
+    # End lines (Left/Right X)
+    Entity(parent=ground, model='quad', scale=(0.01, 1), x=0.49, color=color.white, y=0.01, rotation_x=90)
+    Entity(parent=ground, model='quad', scale=(0.01, 1), x=-0.49, color=color.white, y=0.01, rotation_x=90)
+
+    # Goals (Oriented on X axis)
+    # Left Goal (Team 0 Net)
+    goal_blue = Entity(parent=pitch, model='cube', scale=(1, 4, 14), position=(-FIELD_WIDTH/2, 2, 0), color=color.white, alpha=0.5)
+    # Right Goal (Team 1 Net)
+    goal_red = Entity(parent=pitch, model='cube', scale=(1, 4, 14), position=(FIELD_WIDTH/2, 2, 0), color=color.white, alpha=0.5)
+
+    baked = pitch.copyTo(NodePath('pitch'))
+    destroy(pitch)
+    for node in baked.findAllMatches('**'):
+        node.clearPythonTag('Entity') # Copied along with the nodes, and a .bam file can't hold Python objects
+    # Transforms and colours go into the vertices: a few geoms in one node instead of a dozen entities
+    baked.flattenStrong()
+    return baked
+
+
+def create_app(args, **window_options):
+    """Build the game in stages and return its GameManager; game.app.run() plays it.
+
+    window_options go to Ursina(), unless the caller has made the app already
+    (benchmarks and headless tools do, to pick the window type).
+    """
+    startup = StartupTimer()
+
+    # Simulation first: it needs no window, and online play waits for an opponent before one opens
+    stepper = create_stepper(args)
+    startup.mark('simulation')
+
+    app = application.base or Ursina(**window_options)
+    # No window means nobody is listening (headless runs, benchmarks)
+    if application.window_type == 'none':
+        sound.ENABLED = False
+    startup.mark('window')
+
+    # The pitch never changes, so after the first run it is loaded baked from disk
+    pitch = Entity(model=asset_cache.load_or_bake('pitch', build_pitch, key=(FIELD_WIDTH, FIELD_DEPTH)))
+
+    # Lighting
+    pivot = Entity()
+    DirectionalLight(parent=pivot, y=10, z=-10, shadows=True)
+    AmbientLight(color=color.rgba(100, 100, 100, 100))
+
+    # Camera (TV View - Side)
+    # Positioned at negative Z (Side line), looking at center
+    camera.position = (0, 50, -75)
+    camera.rotation_x = 45
+    outline.set_outlines(OUTLINES)
+    startup.mark('scene')
+
+    game = GameManager(stepper, replaying=args.replay is not None, online=args.connect is not None or args.server is not None)
+    game.app = app
+    game.pitch = pitch
+    game.startup = startup
+    game.set_warp(simulation.FLAT_OUT if args.warp == 'max' else float(args.warp))
+    if args.profile or args.trace:
+        game.set_profiling(True)
+    if args.trace:
+        profiler.tracing = True
+        atexit.register(profiler.export, args.trace)
+    game.ball = Ball(game.match.ball, game)
+    game.setup_teams()
+
+    # UI
+
+    game.msg = Text(text='WASD to Move, SPACE to Shoot, F to Pass, G to Cross, TAB to Switch Player, 1-4 for Time Warp, F3 for Profiler, F5/F9 to Quick Save/Load', y=0.45, origin=(0,0))
+    if game.replaying:
+        game.msg.text = 'REPLAY: SPACE to Pause, LEFT/RIGHT to Skip 5s, HOME to Restart, 1-4 for Speed'
+    startup.mark('views')
+
+    def first_frame(task):
+        startup.mark('first frame')
+        print(f"Time to first frame: {startup.report()}")
+        # Nothing on screen needed these yet
+        game.setup_name_tags()
+        return task.done
+
+    # Sorted after igLoop (50), so it runs once the first frame has been rendered
+    app.taskMgr.add(first_frame, 'first_frame', sort=51)
+    return game
+
+
+def main(argv=None):
+    game = create_app(parse_args(argv))
+    game.app.run()
 
 if __name__ == '__main__':
-    app.run()
+    main()
@@ -0,0 +1,559 @@
+"""Two-player online matches: deterministic lockstep with input delay and rollback.
+
+Both players run the whole match locally from the same seed and only swap
+their inputs, one byte per tick (move bits, kick, switch). Local inputs are
+scheduled INPUT_DELAY ticks ahead, which hides that much latency outright.
+When the other player's input for a tick hasn't arrived yet it is predicted
+(same as their last one); if the real one turns out different, the match is
+rolled back to a snapshot from before that tick and re-simulated. Neither side
+may run more than MAX_ROLLBACK ticks past the last tick it has the other's
+input for.
+
+Every CHECK_INTERVAL ticks both sides swap a checksum of a tick they both
+have all inputs for. If they differ, the side playing team 0 sends the other
+a snapshot to resync from.
+
+A relay server pairs the two players and forwards their packets, optionally
+adding latency, jitter and loss, so the whole thing can be tried on one
+machine:
+
+    python net.py server --port 7777 --latency 0.06 --loss 0.05
+    python main.py --connect 127.0.0.1:7777       # twice
+    python net.py test --latency 0.06 --loss 0.05 # both players headless, prints stats
+"""
+import argparse
+import asyncio
+import random
+import socket
+import struct
+import threading
+import time
+
+import simulation
+from simulation import Inputs, NO_INPUT, Snapshot, TICK_RATE
+
+INPUT_DELAY = 3 # Ticks between pressing a key and it taking effect (25 ms at 120 Hz)
+MAX_ROLLBACK = 36 # Ticks a player may run ahead of the other's confirmed inputs
+SEND_INTERVAL = 2 # Ticks between input packets (60 a second)
+MAX_INPUTS_PER_PACKET = 64 # Unacknowledged inputs are resent until acked, up to this many
+CHECK_INTERVAL = TICK_RATE # Ticks between desync checks
+SYNC_INTERVAL = 10 # At most one tick in this many is spent waiting for a player who's behind
+HELLO_INTERVAL = 0.5 # Seconds between join attempts
+SNAPSHOT_CHUNK = 1024 # Bytes of snapshot per packet
+SNAPSHOT_RESEND = 0.25 # Seconds between resending an unacknowledged snapshot
+
+KICKS = (None, 'shoot', 'pass', 'cross')
+
+# Packets: a one-byte type, then
+_HELLO = struct.Struct('<cI') # H, client nonce
+_WELCOME = struct.Struct('<cBI') # W, team, match seed
+_INPUTS = struct.Struct('<cIiIB') # I, first tick, ack (last contiguous tick received, -1 for none), sender's tick, count; then count input bytes
+_CHECK = struct.Struct('<cII') # C, tick, checksum
+_SNAPSHOT = struct.Struct('<cIHH') # S, tick, chunk index, chunk count; then chunk bytes
+_SNAPSHOT_ACK = struct.Struct('<cI') # A, tick
+
+
+def encode_inputs(inputs):
+    return ((inputs.move_x + 1) | (inputs.move_z + 1) << 2 | KICKS.index(inputs.kick) << 4
+            | (1 << 6 if inputs.switch else 0))
+
+def decode_inputs(byte):
+    return Inputs((byte & 3) - 1, (byte >> 2 & 3) - 1, KICKS[byte >> 4 & 3], bool(byte & 64))
+
+
+class Session:
+    """Rollback lockstep for one side of a two-player match. Knows nothing about sockets.
+
+    Feed the other player's inputs in with receive_inputs() and call tick()
+    once per local tick; it returns False while waiting for them to catch up.
+    """
+    def __init__(self, match, input_delay=INPUT_DELAY, max_rollback=MAX_ROLLBACK):
+        self.match = match
+        self.team = match.controlled_team
+        self.input_delay = input_delay
+        self.max_rollback = max_rollback
+
+        self.tick_count = 0 # Ticks simulated so far; the next one to run is this
+        self.local = {} # tick -> Inputs
+        self.remote = {} # tick -> Inputs, as received
+        self.predicted = {} # tick -> Inputs the remote side was assumed to use
+        self.remote_confirmed = -1 # Every remote input up to here has arrived
+        self.remote_tick = 0 # The other side's tick_count as of their last packet
+        self.remote_ack = -1 # They have every local input up to here (as of the same packet)
+        self.snapshots = {} # tick -> Snapshot from just before that tick ran
+        self.spare = [] # Snapshots no longer needed, to capture into again
+        self.checksums = {} # tick -> checksum right after it ran (every CHECK_INTERVAL)
+        self.rollback_from = None # Earliest tick that ran on a wrong prediction
+
+        self.rollbacks = 0
+        self.rolled_back_ticks = 0
+        self.stalls = 0
+        self.events = []
+
+    # --- Inputs ---
+    def add_local(self, inputs):
+        """Schedule this tick's local inputs INPUT_DELAY ticks ahead."""
+        tick = self.tick_count + self.input_delay
+        if tick not in self.local:
+            self.local[tick] = inputs
+
+    def local_inputs(self, tick):
+        return self.local.get(tick, NO_INPUT)
+
+    def remote_inputs(self, tick):
+        if tick in self.remote: return self.remote[tick]
+        if tick < self.input_delay: return NO_INPUT # Nobody can have pressed anything yet
+        # Prediction: they keep doing what they last did, minus one-shot switches
+        last = self.remote.get(self.remote_confirmed, NO_INPUT)
+        return Inputs(last.move_x, last.move_z, last.kick)
+
+    def receive_inputs(self, first_tick, inputs, ack, remote_tick):
+        if remote_tick >= self.remote_tick: # Packets can arrive out of order
+            self.remote_tick = remote_tick
+            self.remote_ack = max(self.remote_ack, ack)
+        for tick, received in enumerate(inputs, first_tick):
+            if tick in self.remote or tick <= self.remote_confirmed: continue
+            self.remote[tick] = received
+            if tick in self.predicted and encode_inputs(self.predicted[tick]) != encode_inputs(received):
+                # That tick ran on a wrong guess: redo it, and everything after
+                if self.rollback_from is None or tick < self.rollback_from:
+                    self.rollback_from = tick
+        while self.remote_confirmed + 1 in self.remote:
+            self.remote_confirmed += 1
+
+    def pending_local(self, limit=MAX_INPUTS_PER_PACKET):
+        """(first tick, [inputs]) the other side hasn't acknowledged yet."""
+        first = self.remote_ack + 1
+        last = min(self.tick_count + self.input_delay - 1, first + limit - 1) # The next tick's input isn't in yet
+        return first, [self.local_inputs(t) for t in range(first, last + 1)]
+
+    # --- Ticking ---
+    def tick(self, local_inputs):
+        """Run the next tick if the other side is close enough behind. Returns whether it ran."""
+        self.events.clear()
+        if self.tick_count - self.remote_confirmed > self.max_rollback:
+            self.stalls += 1
+            return False
+        # Give a player who's fallen behind the chance to catch up. Each side's
+        # lead over the inputs it has from the other includes the same latency,
+        # so the difference between the two is how far ahead this side runs.
+        if self.tick_count % SYNC_INTERVAL == 0 and self.advantage() >= 2:
+            self.stalls += 1
+            return False
+
+        self.add_local(local_inputs)
+        self.settle()
+        self._run(self.tick_count)
+        self.events.extend(self.match.events)
+        self._prune()
+        return True
+
+    def advantage(self):
+        """Roughly how many ticks this side is ahead of the other."""
+        local = self.tick_count - self.remote_confirmed
+        remote = self.remote_tick - self.remote_ack
+        return (local - remote) / 2
+
+    def settle(self):
+        """Re-run anything simulated on a wrong guess, without moving on a tick."""
+        if self.rollback_from is not None:
+            self._rollback()
+
+    def _run(self, tick):
+        match = self.match
+        snapshot = self.snapshots.get(tick) or (self.spare.pop() if self.spare else Snapshot())
+        self.snapshots[tick] = snapshot.capture(match)
+        remote = self.remote_inputs(tick)
+        if tick not in self.remote:
+            self.predicted[tick] = remote
+        else:
+            self.predicted.pop(tick, None)
+        simulation.store_previous(match)
+        simulation.step(match, 1 / TICK_RATE, self.local_inputs(tick), remote)
+        if tick % CHECK_INTERVAL == 0:
+            self.checksums[tick] = simulation.state_checksum(match)
+        self.tick_count = tick + 1
+
+    def _rollback(self):
+        start = self.rollback_from
+        self.rollback_from = None
+        if start >= self.tick_count: return
+        self.rollbacks += 1
+        self.rolled_back_ticks += self.tick_count - start
+        end = self.tick_count
+        self.snapshots[start].restore(self.match)
+        for tick in range(start, end):
+            self._run(tick)
+
+    def _prune(self):
+        # Nothing before the last confirmed tick can be rolled back to again;
+        # the checksum before that may still be waiting to be compared
+        confirmed = min(self.remote_confirmed, self.remote_ack)
+        for tick in [t for t in self.snapshots if t <= confirmed]:
+            self.spare.append(self.snapshots.pop(tick))
+        oldest = confirmed - 2 * CHECK_INTERVAL
+        for book in (self.predicted, self.local, self.remote, self.checksums):
+            for tick in [t for t in book if t < oldest]:
+                del book[tick]
+
+    # --- Desync checks ---
+    def confirmed_check(self):
+        """(tick, checksum) of the latest checked tick both sides have every input for, or None."""
+        tick = min(self.remote_confirmed, self.remote_ack, self.tick_count - 1)
+        tick -= tick % CHECK_INTERVAL
+        if tick < 0 or tick not in self.checksums: return None
+        return tick, self.checksums[tick]
+
+    def resync_point(self):
+        """(tick, Snapshot) to send the other side: the state before the first tick they may not have run like us."""
+        tick = min(self.remote_confirmed, self.remote_ack) + 1
+        if tick >= self.tick_count or tick not in self.snapshots: return None
+        return tick, self.snapshots[tick]
+
+    def resync(self, tick, snapshot):
+        """Start over from the other side's snapshot from before tick, then catch back up."""
+        end = max(self.tick_count, tick)
+        snapshot.restore(self.match)
+        self.tick_count = tick
+        for t in range(tick, end):
+            self._run(t)
+        self.rollback_from = None
+
+
+class Client:
+    """A Session talking UDP to a relay server. Never blocks after connect()."""
+    def __init__(self, address, nonce=None):
+        self.address = address
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.nonce = random.getrandbits(32) if nonce is None else nonce
+        self.session = None
+        self.team = None
+        self.seed = None
+
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.started = None
+        self.desyncs = 0
+        self.resyncs = 0
+        self._last_send_tick = -SEND_INTERVAL
+        self._last_check_sent = -1
+        self._outgoing_snapshot = None # (tick, chunks, next resend time)
+        self._incoming_snapshot = {} # tick -> {index: chunk}
+
+    def _send(self, data):
+        try:
+            self.socket.sendto(data, self.address)
+            self.bytes_sent += len(data)
+        except (BlockingIOError, ConnectionRefusedError):
+            pass # Same as a lost packet
+
+    def connect(self, timeout=30.0):
+        """Wait for the server to pair us up. Returns (team, seed)."""
+        deadline = time.monotonic() + timeout
+        next_hello = 0
+        while time.monotonic() < deadline:
+            if time.monotonic() >= next_hello:
+                self._send(_HELLO.pack(b'H', self.nonce))
+                next_hello = time.monotonic() + HELLO_INTERVAL
+            welcome = self.poll()
+            if welcome: return welcome
+            time.sleep(0.01)
+        raise TimeoutError(f"no opponent joined {self.address[0]}:{self.address[1]} within {timeout:g}s")
+
+    def start(self, match):
+        self.session = Session(match)
+        self.started = time.monotonic()
+
+    # --- Receiving ---
+    def poll(self):
+        """Handle every packet waiting. Returns (team, seed) when a welcome arrives before start()."""
+        welcome = None
+        checks = []
+        while True:
+            try:
+                data, _ = self.socket.recvfrom(65536)
+            except (BlockingIOError, ConnectionResetError):
+                break
+            self.bytes_received += len(data)
+            kind = data[:1]
+            if kind == b'W':
+                _, team, seed = _WELCOME.unpack(data)
+                if self.team is None:
+                    self.team, self.seed = team, seed
+                    welcome = (team, seed)
+            elif self.session is None:
+                continue
+            elif kind == b'I':
+                _, first, ack, remote_tick, count = _INPUTS.unpack_from(data)
+                inputs = [decode_inputs(b) for b in data[_INPUTS.size:_INPUTS.size + count]]
+                self.session.receive_inputs(first, inputs, ack, remote_tick)
+            elif kind == b'C':
+                checks.append(_CHECK.unpack(data)[1:])
+            elif kind == b'S':
+                _, tick, index, count = _SNAPSHOT.unpack_from(data)
+                self._snapshot_chunk(tick, index, count, data[_SNAPSHOT.size:])
+            elif kind == b'A':
+                _, tick = _SNAPSHOT_ACK.unpack(data)
+                if self._outgoing_snapshot and self._outgoing_snapshot[0] == tick:
+                    self._outgoing_snapshot = None
+        if checks:
+            # Compare against ticks re-run with whatever inputs just came in
+            self.session.settle()
+            for tick, checksum in checks:
+                self._check(tick, checksum)
+        return welcome
+
+    def _check(self, tick, checksum):
+        mine = self.session.checksums.get(tick)
+        if mine is None or mine == checksum: return
+        self.desyncs += 1
+        # Team 0's copy of the match wins
+        if self.team == 0 and self._outgoing_snapshot is None:
+            point = self.session.resync_point()
+            if point:
+                tick, snapshot = point
+                data = snapshot.to_bytes()
+                chunks = [data[i:i + SNAPSHOT_CHUNK] for i in range(0, len(data), SNAPSHOT_CHUNK)]
+                self._outgoing_snapshot = (tick, chunks, 0.0)
+
+    def _snapshot_chunk(self, tick, index, count, chunk):
+        if tick in self._incoming_snapshot and self._incoming_snapshot[tick] is None:
+            self._send(_SNAPSHOT_ACK.pack(b'A', tick)) # Already loaded; our ack was lost
+            return
+        chunks = self._incoming_snapshot.setdefault(tick, {})
+        chunks[index] = chunk
+        if len(chunks) < count: return
+        snapshot = Snapshot.from_bytes(b''.join(chunks[i] for i in range(count)))
+        self.session.resync(tick, snapshot)
+        self.resyncs += 1
+        self._incoming_snapshot = {tick: None}
+        self._send(_SNAPSHOT_ACK.pack(b'A', tick))
+
+    # --- Sending ---
+    def flush(self, force=False):
+        """Send whatever is due: inputs, checksums, snapshot chunks."""
+        session = self.session
+        if force or session.tick_count - self._last_send_tick >= SEND_INTERVAL:
+            self._last_send_tick = session.tick_count
+            first, inputs = session.pending_local()
+            self._send(_INPUTS.pack(b'I', first, session.remote_confirmed, session.tick_count, len(inputs))
+                       + bytes(encode_inputs(i) for i in inputs))
+
+        check = session.confirmed_check()
+        if check and check[0] > self._last_check_sent:
+            self._last_check_sent = check[0]
+            self._send(_CHECK.pack(b'C', *check))
+
+        if self._outgoing_snapshot:
+            tick, chunks, resend = self._outgoing_snapshot
+            now = time.monotonic()
+            if now >= resend:
+                for index, chunk in enumerate(chunks):
+                    self._send(_SNAPSHOT.pack(b'S', tick, index, len(chunks)) + chunk)
+                self._outgoing_snapshot = (tick, chunks, now + SNAPSHOT_RESEND)
+
+    def tick(self, inputs):
+        """poll(), run a tick, flush(). Returns whether the tick ran."""
+        self.poll()
+        ran = self.session.tick(inputs)
+        self.flush()
+        return ran
+
+    def bandwidth(self):
+        """(bytes sent, bytes received) per second since start()."""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return self.bytes_sent / elapsed, self.bytes_received / elapsed
+
+    def close(self):
+        self.socket.close()
+
+
+class NetStepper(simulation.FixedStepper):
+    """FixedStepper whose ticks go through a networked Client.
+
+    Recording isn't supported: ticks can be re-run by rollbacks after the
+    recorder has seen them.
+    """
+    def __init__(self, match, client):
+        super().__init__(match)
+        self.client = client
+        client.start(match)
+
+    def _tick(self, inputs):
+        return self.client.tick(inputs)
+
+    def advance(self, frame_dt, inputs=None):
+        ran = super().advance(frame_dt, inputs)
+        if not ran:
+            self.client.poll()
+            self.client.flush()
+        return ran
+
+
+# --- Relay server ---
+class Relay(asyncio.DatagramProtocol):
+    """Pairs the first two clients to say hello and forwards everything between them."""
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, seed=None):
+        self.latency = latency # One way, seconds
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.match_seed = self.rng.randrange(2**32)
+        self.clients = [] # (address, nonce) in join order = team
+        self.transport = None
+        self.forwarded = 0
+        self.dropped = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        kind = data[:1]
+        if kind == b'H':
+            _, nonce = _HELLO.unpack(data)
+            known = [a for a, n in self.clients]
+            if address not in known and len(self.clients) < 2:
+                self.clients.append((address, nonce))
+            if len(self.clients) == 2:
+                for team, (client, _) in enumerate(self.clients):
+                    self.transport.sendto(_WELCOME.pack(b'W', team, self.match_seed), client)
+            return
+
+        addresses = [a for a, n in self.clients]
+        if len(addresses) < 2 or address not in addresses: return
+        other = addresses[1 - addresses.index(address)]
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+        self.forwarded += 1
+        if delay:
+            asyncio.get_running_loop().call_later(delay, self.transport.sendto, data, other)
+        else:
+            self.transport.sendto(data, other)
+
+async def serve(host='127.0.0.1', port=7777, latency=0.0, jitter=0.0, loss=0.0, seed=None, stop=None):
+    """Run a Relay until stop (an asyncio.Event) is set, or forever."""
+    loop = asyncio.get_running_loop()
+    transport, relay = await loop.create_datagram_endpoint(
+        lambda: Relay(latency, jitter, loss, seed), local_addr=(host, port))
+    print(f"relay on {host}:{transport.get_extra_info('sockname')[1]}  latency {latency * 1000:.0f} ms"
+          f" +- {jitter * 1000:.0f} ms, loss {loss:.0%}")
+    try:
+        if stop is None:
+            await asyncio.Event().wait()
+        else:
+            await stop.wait()
+    finally:
+        transport.close()
+    return relay
+
+def serve_in_thread(**kwargs):
+    """Start serve() on a background thread. Returns a function that stops it."""
+    ready = threading.Event()
+    state = {}
+
+    def run():
+        async def main():
+            state['loop'] = asyncio.get_running_loop()
+            state['stop'] = asyncio.Event()
+            ready.set()
+            state['relay'] = await serve(stop=state['stop'], **kwargs)
+        asyncio.run(main())
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait()
+    time.sleep(0.05) # Let the endpoint bind
+
+    def stop():
+        state['loop'].call_soon_threadsafe(state['stop'].set)
+        thread.join()
+        return state.get('relay')
+    return stop
+
+
+def loopback_test(seconds=20.0, latency=0.05, jitter=0.01, loss=0.05, port=7777, seed=0, desync_at=None):
+    """Play two headless clients against each other through a local relay and report how it went."""
+    stop = serve_in_thread(port=port, latency=latency, jitter=jitter, loss=loss, seed=seed)
+    clients = [Client(('127.0.0.1', port), nonce=n) for n in (1, 2)]
+    # Both say hello before either waits for the welcome
+    for client in clients:
+        client._send(_HELLO.pack(b'H', client.nonce))
+    for client in clients:
+        team, match_seed = client.connect()
+        client.start(simulation.create_match(controlled_team=team, seed=match_seed, two_player=True))
+
+    rng = random.Random(seed)
+    held = [NO_INPUT, NO_INPUT]
+    ticks = int(seconds * TICK_RATE)
+    start = time.perf_counter()
+    for n in range(ticks):
+        for i, client in enumerate(clients):
+            # Mash buttons, changing what's held every ~quarter second
+            if rng.random() < 4 / TICK_RATE:
+                held[i] = Inputs(rng.choice((-1, 0, 1)), rng.choice((-1, 0, 1)), rng.choice(KICKS), rng.random() < 0.1)
+            client.tick(held[i])
+        if desync_at is not None and n == desync_at:
+            clients[1].session.match.ball.position.x += 1 # Simulate a desync
+        ahead = start + (n + 1) / TICK_RATE - time.perf_counter()
+        if ahead > 0: time.sleep(ahead)
+
+    # Let a stalled player finish its ticks and the last inputs arrive, then both catch up
+    end = time.monotonic() + max(0.5, 4 * latency)
+    give_up = end + 10
+    while time.monotonic() < end or (any(c.session.tick_count < ticks for c in clients) and time.monotonic() < give_up):
+        for client in clients:
+            if client.session.tick_count < ticks:
+                client.tick(NO_INPUT)
+            else:
+                client.poll()
+                client.flush(force=True)
+                client.session.settle()
+        time.sleep(1 / TICK_RATE)
+    relay = stop()
+
+    sessions = [c.session for c in clients]
+    common = min(s.confirmed_check()[0] for s in sessions)
+    agree = [s.checksums.get(common) for s in sessions]
+    for i, (client, session) in enumerate(zip(clients, sessions)):
+        sent, received = client.bandwidth()
+        print(f"player {i + 1} (team {client.team}): {session.tick_count} ticks, {session.rollbacks} rollbacks"
+              f" ({session.rolled_back_ticks} ticks re-run), {session.stalls} stalls, {client.desyncs} desyncs,"
+              f" {client.resyncs} resyncs, {sent / 1024:.2f} KB/s up, {received / 1024:.2f} KB/s down")
+    print(f"relay forwarded {relay.forwarded} packets, dropped {relay.dropped}")
+    print(f"tick {common}: checksums {'match' if agree[0] is not None and agree[0] == agree[1] else 'DIFFER'}"
+          f" ({agree[0]}, {agree[1]}), score {sessions[0].match.score}")
+    for client in clients:
+        client.close()
+    return agree[0] is not None and agree[0] == agree[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='RealFC online play')
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name, help in (('server', 'run a relay for two players'), ('test', 'play two bots through a local relay')):
+        p = sub.add_parser(name, help=help)
+        p.add_argument('--port', type=int, default=7777)
+        p.add_argument('--latency', type=float, default=0.0, help='added one-way latency in seconds')
+        p.add_argument('--jitter', type=float, default=0.0, help='random +- on the latency, seconds')
+        p.add_argument('--loss', type=float, default=0.0, help='fraction of packets dropped')
+        p.add_argument('--seed', type=int, default=None)
+    sub.choices['server'].add_argument('--host', default='0.0.0.0')
+    test = sub.choices['test']
+    test.add_argument('--seconds', type=float, default=20)
+    test.add_argument('--desync-at', type=int, default=None, help='nudge the ball on one side at this tick')
+    args = parser.parse_args(argv)
+
+    if args.command == 'server':
+        try:
+            asyncio.run(serve(args.host, args.port, args.latency, args.jitter, args.loss, args.seed))
+        except KeyboardInterrupt:
+            pass
+    else:
+        ok = loopback_test(args.seconds, args.latency, args.jitter, args.loss, args.port, args.seed or 0, args.desync_at)
+        raise SystemExit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Screen-space outlines, drawn as one post-process pass over the whole frame.
+
+Instead of a black shell around every body part (and the ball), the frame is
+rendered once and the outline pass looks at the depth buffer:
+
+    silhouettes  a neighbour pixel is much farther away (player against grass)
+    creases      the depth slope changes sharply (box edges, i.e. the surface
+                 normal flips), found with the depth's second derivative
+
+Both tests are relative to the pixel's own depth so the ink does not thin out
+or flood as the camera moves. Turning outlines off removes the pass entirely.
+"""
+from ursina import Shader, application, camera, color, window
+
+SILHOUETTE_THRESHOLD = 0.01 # Depth jump, as a fraction of the pixel's depth
+CREASE_THRESHOLD = 0.0005 # Depth second derivative, as a fraction of depth
+
+OUTLINE_VERTEX_SHADER = '''#version 140
+
+uniform mat4 p3d_ModelViewProjectionMatrix;
+in vec4 p3d_Vertex;
+in vec2 p3d_MultiTexCoord0;
+out vec2 uv;
+
+void main() {
+    gl_Position = p3d_ModelViewProjectionMatrix * p3d_Vertex;
+    uv = p3d_MultiTexCoord0;
+}
+'''
+
+OUTLINE_FRAGMENT_SHADER = '''#version 140
+
+uniform sampler2D tex;
+uniform sampler2D dtex;
+uniform vec2 window_size;
+uniform float near;
+uniform float far;
+uniform vec4 outline_color;
+uniform float silhouette_threshold;
+uniform float crease_threshold;
+in vec2 uv;
+out vec4 fragColor;
+
+float eye_depth(vec2 p) {
+    return far * near / ((near - far) * texture(dtex, p).r + far);
+}
+
+void main() {
+    vec2 px = 1.0 / window_size;
+    float d = eye_depth(uv);
+    float n = eye_depth(uv + vec2(0.0, px.y));
+    float s = eye_depth(uv - vec2(0.0, px.y));
+    float e = eye_depth(uv + vec2(px.x, 0.0));
+    float w = eye_depth(uv - vec2(px.x, 0.0));
+
+    // Only the nearer side of a silhouette gets ink, so outlines hug the player
+    float jump = max(max(n, s), max(e, w)) - d;
+    float crease = abs(n + s + e + w - 4.0 * d);
+
+    if (jump > silhouette_threshold * d || crease > crease_threshold * d)
+        fragColor = outline_color;
+    else
+        fragColor = texture(tex, uv);
+}
+'''
+
+_shader = None
+
+def outline_shader():
+    # Made on first use, like player_model's body shader
+    global _shader
+    if _shader is None:
+        _shader = Shader(name='outline_shader', language=Shader.GLSL, vertex=OUTLINE_VERTEX_SHADER, fragment=OUTLINE_FRAGMENT_SHADER)
+    return _shader
+
+
+def set_outlines(enabled):
+    """Turn the outline pass on or off. Does nothing without a window to draw in."""
+    if application.window_type == 'none':
+        return
+    if not enabled:
+        if camera.shader:
+            camera.shader = None
+        return
+
+    camera.shader = outline_shader() # Sets up the render-to-texture pass (and near = 1) the first time
+    camera.set_shader_input('window_size', window.size)
+    camera.set_shader_input('near', camera.clip_plane_near)
+    camera.set_shader_input('far', camera.clip_plane_far)
+    camera.set_shader_input('outline_color', color.black)
+    camera.set_shader_input('silhouette_threshold', SILHOUETTE_THRESHOLD)
+    camera.set_shader_input('crease_threshold', CREASE_THRESHOLD)
@@ -0,0 +1,118 @@
+"""Pitch control: which team would reach each part of the pitch first.
+
+The pitch is split into a coarse grid (COLS along X, ROWS along Z). For every
+cell and team, `update()` stores the time the team's fastest player would take
+to get there from where they are now, carrying on with their current velocity
+for REACTION_TIME before turning towards the cell. The gap between the two
+teams' times is squashed into the probability that team 0 controls the cell.
+
+Everything is computed for all players and cells at once, and only every
+UPDATE_PERIOD seconds, so questions like "is there space ahead of me?" or
+"where is the open space near my zone?" are grid lookups rather than loops
+over the players.
+"""
+import math
+
+import numpy as np
+
+COLS = 64 # Cells along X (pitch length)
+ROWS = 40 # Cells along Z (pitch width)
+REACTION_TIME = 0.3 # Seconds a player keeps going their current way before turning
+CONTROL_SPREAD = 0.45 # Seconds of arrival advantage worth ~90% control
+UPDATE_PERIOD = 0.1 # Seconds between refreshes (12 ticks at 120 Hz)
+
+
+def control_from(time_to_arrive):
+    """Probability team 0 controls each cell, from both teams' arrival times."""
+    # Logistic in the arrival gap: a team CONTROL_SPREAD seconds ahead holds ~90%
+    gap = time_to_arrive[1] - time_to_arrive[0]
+    return 1 / (1 + np.exp(np.clip(-gap * (math.log(9) / CONTROL_SPREAD), -50, 50)))
+
+
+class PitchControl:
+    def __init__(self, width, depth, cols=COLS, rows=ROWS):
+        self.width = width
+        self.depth = depth
+        self.cols = cols
+        self.rows = rows
+        self.cell_width = width / cols
+        self.cell_depth = depth / rows
+        # Cell centres
+        self.xs = -width / 2 + (np.arange(cols) + 0.5) * self.cell_width
+        self.zs = -depth / 2 + (np.arange(rows) + 0.5) * self.cell_depth
+
+        self.time_to_arrive = np.zeros((2, rows, cols)) # Per team, seconds
+        self.control = np.full((rows, cols), 0.5) # Probability team 0 gets there first
+        self.updated_at = -math.inf
+        self._times = None
+
+    def due(self, time):
+        return time - self.updated_at >= UPDATE_PERIOD - 1e-9
+
+    def update(self, arrays, time):
+        """Recompute both teams' arrival times from the players' positions and velocities."""
+        n = arrays.count
+        if self._times is None or len(self._times) != n:
+            # players x rows x cols, reused between updates. float32 halves the
+            # memory traffic, which is what this is bound by.
+            self._times = np.empty((n, self.rows, self.cols), dtype=np.float32)
+        times = self._times
+
+        # Where everyone will be once they've reacted
+        start = arrays.positions + arrays.velocities * REACTION_TIME
+        # Distances separate into X and Z parts: (players, cols) and (players, rows)
+        dx = (self.xs[None, :] - start[:, 0:1]).astype(np.float32)
+        dz = (self.zs[None, :] - start[:, 2:3]).astype(np.float32)
+        np.add((dz * dz)[:, :, None], (dx * dx)[:, None, :], out=times)
+        np.sqrt(times, out=times)
+        times *= (1 / arrays.speed).astype(np.float32)[:, None, None]
+
+        # A new array rather than overwriting the old one, which snapshots may share
+        time_to_arrive = np.empty((2, self.rows, self.cols))
+        for team in (0, 1):
+            mine = (arrays.team == team)[:, None, None]
+            np.min(times, axis=0, where=mine, initial=math.inf, out=time_to_arrive[team])
+        time_to_arrive += REACTION_TIME
+        self.time_to_arrive = time_to_arrive
+        self.control = control_from(time_to_arrive)
+        self.updated_at = time
+
+    # --- Lookups ---
+    def cell(self, x, z):
+        col = int((x + self.width / 2) // self.cell_width)
+        row = int((z + self.depth / 2) // self.cell_depth)
+        return min(max(row, 0), self.rows - 1), min(max(col, 0), self.cols - 1)
+
+    def control_at(self, team, x, z):
+        """Probability team wins a race to (x, z)."""
+        c = self.control[self.cell(x, z)].item()
+        return c if team == 0 else 1 - c
+
+    def find_space(self, team, points, radius, distance_weight=0.02):
+        """For each (x, z) in points, the best controlled cell centre within radius.
+
+        Cells are scored on team's control minus distance_weight per unit away
+        from the point, so ties go to the nearest space. Returns an array of
+        (x, z), one row per point.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        control = self.control if team == 0 else 1 - self.control
+
+        # A square window of cells around each point
+        reach_x = int(math.ceil(radius / self.cell_width))
+        reach_z = int(math.ceil(radius / self.cell_depth))
+        centre_col = ((points[:, 0] + self.width / 2) // self.cell_width).astype(np.int64)
+        centre_row = ((points[:, 1] + self.depth / 2) // self.cell_depth).astype(np.int64)
+        cols = np.clip(centre_col[:, None] + np.arange(-reach_x, reach_x + 1), 0, self.cols - 1) # points x window
+        rows = np.clip(centre_row[:, None] + np.arange(-reach_z, reach_z + 1), 0, self.rows - 1)
+
+        cx = self.xs[cols]
+        cz = self.zs[rows]
+        dist = np.sqrt((cz - points[:, 1:2])[:, :, None] ** 2 + (cx - points[:, 0:1])[:, None, :] ** 2)
+        score = control[rows[:, :, None], cols[:, None, :]] - dist * distance_weight
+        score[dist > radius] = -math.inf
+
+        best = score.reshape(len(points), -1).argmax(axis=1)
+        best_row, best_col = np.divmod(best, cols.shape[1])
+        n = np.arange(len(points))
+        return np.column_stack((cx[n, best_col], cz[n, best_row]))
@@ -0,0 +1,244 @@
+"""Baked, hardware-instanced player and referee models.
+
+Every body layout (players, referee) is baked once into a single mesh, and
+kept on disk by asset_cache so later runs skip the baking. Each vertex stores
+which colour slot of the kit it uses in its vertex colour, and which limb it
+belongs to (plus the limb's pivot height) in its UVs.
+
+A `BodyBatch` draws up to MAX_INSTANCES bodies of one layout with a single
+instanced draw call; outlines come from the post-process pass in outline.py.
+Per-instance data lives in shader input arrays that are exposed as NumPy
+views:
+
+    transforms  x, y, z, heading (radians)
+    limbs       l_arm, r_arm, l_leg, r_leg swing angles (radians)
+    shirts, sleeves, shorts   kit colours
+
+so a view only has to write its row; nothing is re-uploaded per entity.
+"""
+import numpy as np
+from panda3d.core import OmniBoundingVolume, PTA_LVecBase4f
+from ursina import Color, Entity, Mesh, Shader, Vec3, color
+
+import asset_cache
+
+MAX_INSTANCES = 128 # Per batch; keeps the uniform arrays well inside GL limits
+
+# Limb slots in the limbs array (0 = static part)
+LIMBS = ('l_arm', 'r_arm', 'l_leg', 'r_leg')
+
+# Colour slots, decoded by the shader from the vertex colour's red channel
+COLOR_SLOTS = ('shirt', 'sleeve', 'shorts', 'skin')
+
+# (part, colour slot, scale, position)
+PLAYER_BODY = (
+    ('torso', 'shirt', (0.5, 0.7, 0.3), (0, 0.1, 0)),
+    ('head', 'skin', (0.3, 0.35, 0.3), (0, 0.7, 0)),
+    ('l_arm', 'sleeve', (0.15, 0.6, 0.2), (-0.38, 0.1, 0)),
+    ('r_arm', 'sleeve', (0.15, 0.6, 0.2), (0.38, 0.1, 0)),
+    ('l_leg', 'shorts', (0.2, 0.7, 0.25), (-0.15, -0.65, 0)),
+    ('r_leg', 'shorts', (0.2, 0.7, 0.25), (0.15, -0.65, 0)),
+)
+
+REFEREE_BODY = (
+    ('torso', 'shirt', (0.4, 0.7, 0.25), (0, 0.1, 0)),
+    ('head', 'skin', (0.3, 0.35, 0.3), (0, 0.7, 0)),
+    ('l_arm', 'sleeve', (0.12, 0.6, 0.15), (-0.35, 0.1, 0)),
+    ('r_arm', 'sleeve', (0.12, 0.6, 0.15), (0.35, 0.1, 0)),
+    ('l_leg', 'shorts', (0.18, 0.7, 0.2), (-0.12, -0.65, 0)),
+    ('r_leg', 'shorts', (0.18, 0.7, 0.2), (0.12, -0.65, 0)),
+)
+
+SKIN_COLOR = color.rgb(255, 220, 177)
+
+# Unit cube faces: (normal, four corners in the same winding as Ursina's cube)
+_CUBE_FACES = (
+    ((0, 0, -1), ((-1, -1, -1), (1, -1, -1), (1, 1, -1), (-1, 1, -1))),
+    ((0, 0, 1), ((1, -1, 1), (-1, -1, 1), (-1, 1, 1), (1, 1, 1))),
+    ((-1, 0, 0), ((-1, -1, 1), (-1, -1, -1), (-1, 1, -1), (-1, 1, 1))),
+    ((1, 0, 0), ((1, -1, -1), (1, -1, 1), (1, 1, 1), (1, 1, -1))),
+    ((0, 1, 0), ((-1, 1, -1), (1, 1, -1), (1, 1, 1), (-1, 1, 1))),
+    ((0, -1, 0), ((-1, -1, 1), (1, -1, 1), (1, -1, -1), (-1, -1, -1))),
+)
+
+
+def kit_colors(team, role):
+    """Colour for each slot of a player's kit."""
+    if team == 0: # Real Madrid (White)
+        shirt = sleeve = shorts = color.white
+        if role == 'gk':
+            shirt = sleeve = shorts = color.green
+    else: # Barcelona (Blue/Red)
+        shirt = color.blue
+        sleeve = color.red # Contrast sleeves
+        shorts = color.rgb(0, 0, 100) # Dark Blue
+        if role == 'gk':
+            shirt = sleeve = color.yellow
+            shorts = color.black
+    return {'shirt': shirt, 'sleeve': sleeve, 'shorts': shorts}
+
+REFEREE_COLORS = {'shirt': color.black, 'sleeve': color.black, 'shorts': color.black}
+
+
+def build_body_mesh(parts):
+    """Bake parts into one mesh."""
+    vertices, triangles, vertex_colors, uvs, normals = [], [], [], [], []
+
+    for part, slot, scale, position in parts:
+        limb = LIMBS.index(part) + 1 if part in LIMBS else 0
+        half = Vec3(*scale) * 0.5
+        slot_color = Color(COLOR_SLOTS.index(slot) / (len(COLOR_SLOTS) - 1), 0, 0, 1)
+
+        for normal, corners in _CUBE_FACES:
+            start = len(vertices)
+            for cx, cy, cz in corners:
+                vertices.append(Vec3(position[0] + cx * half.x, position[1] + cy * half.y, position[2] + cz * half.z))
+                vertex_colors.append(slot_color)
+                uvs.append((limb, position[1])) # Limb slot and the height it swings around
+                normals.append(normal)
+            triangles.extend((start, start + 1, start + 2, start, start + 2, start + 3))
+
+    return Mesh(vertices=vertices, triangles=triangles, colors=vertex_colors, uvs=uvs, normals=normals)
+
+
+_mesh_cache = {}
+
+def body_mesh(parts):
+    # Kept on disk between runs too; the vertex encoding depends on the slot orders
+    if parts not in _mesh_cache:
+        _mesh_cache[parts] = asset_cache.load_or_bake('body', build_body_mesh, parts, key=(LIMBS, COLOR_SLOTS, _CUBE_FACES))
+    return _mesh_cache[parts]
+
+
+BODY_VERTEX_SHADER = f'''#version 140
+
+uniform mat4 p3d_ModelViewProjectionMatrix;
+uniform vec4 transforms[{MAX_INSTANCES}];
+uniform vec4 limbs[{MAX_INSTANCES}];
+uniform vec4 shirts[{MAX_INSTANCES}];
+uniform vec4 sleeves[{MAX_INSTANCES}];
+uniform vec4 shorts[{MAX_INSTANCES}];
+uniform vec4 skin_color;
+in vec4 p3d_Vertex;
+in vec3 p3d_Normal;
+in vec4 p3d_Color;
+in vec2 p3d_MultiTexCoord0;
+out vec4 vertex_color;
+out vec3 world_normal;
+
+void main() {{
+    int i = gl_InstanceID;
+    vec3 v = p3d_Vertex.xyz;
+    vec3 n = p3d_Normal;
+
+    int limb = int(p3d_MultiTexCoord0.x + 0.5);
+    if (limb > 0) {{
+        // Swing around the X axis through the limb's centre, like rotation_x on a child entity
+        float a = limbs[i][limb - 1];
+        float c = cos(a);
+        float s = sin(a);
+        float y = v.y - p3d_MultiTexCoord0.y;
+        v.yz = vec2(y * c - v.z * s, y * s + v.z * c);
+        v.y += p3d_MultiTexCoord0.y;
+        n.yz = vec2(n.y * c - n.z * s, n.y * s + n.z * c);
+    }}
+
+    // Heading, like rotation_y on the body's entity, then move into place
+    float c = cos(transforms[i].w);
+    float s = sin(transforms[i].w);
+    v.xz = vec2(v.x * c + v.z * s, -v.x * s + v.z * c);
+    n.xz = vec2(n.x * c + n.z * s, -n.x * s + n.z * c);
+    gl_Position = p3d_ModelViewProjectionMatrix * vec4(v + transforms[i].xyz, 1.0);
+    world_normal = n;
+
+    int slot = int(p3d_Color.r * 3.0 + 0.5);
+    if (slot == 0) vertex_color = shirts[i];
+    else if (slot == 1) vertex_color = sleeves[i];
+    else if (slot == 2) vertex_color = shorts[i];
+    else vertex_color = skin_color;
+}}
+'''
+
+BODY_FRAGMENT_SHADER = '''#version 140
+
+uniform vec4 p3d_ColorScale;
+uniform vec3 light_direction;
+uniform float ambient;
+in vec4 vertex_color;
+in vec3 world_normal;
+out vec4 fragColor;
+
+void main() {
+    float diffuse = max(dot(normalize(world_normal), -light_direction), 0.0);
+    vec4 c = vertex_color * p3d_ColorScale;
+    fragColor = vec4(c.rgb * (ambient + (1.0 - ambient) * diffuse), c.a);
+}
+'''
+
+_shader = None
+
+def instanced_body_shader():
+    # Made on first use: Ursina inspects the call stack for every Shader, which is slow during imports
+    global _shader
+    if _shader is None:
+        _shader = Shader(name='instanced_body_shader', language=Shader.GLSL, vertex=BODY_VERTEX_SHADER, fragment=BODY_FRAGMENT_SHADER,
+                         default_input={
+                             'skin_color': SKIN_COLOR,
+                             'light_direction': Vec3(0, -1, 1).normalized(),
+                             'ambient': 0.5,
+                         })
+    return _shader
+
+
+class BodyBatch:
+    """Up to MAX_INSTANCES bodies of one layout, drawn with one instanced call."""
+    ARRAYS = ('transforms', 'limbs', 'shirts', 'sleeves', 'shorts')
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.count = 0
+
+        self.body = Entity(model=body_mesh(parts), shader=instanced_body_shader())
+
+        for name in self.ARRAYS:
+            buffer = PTA_LVecBase4f.emptyArray(MAX_INSTANCES)
+            # The NumPy view shares memory with the shader input, so writing a row is all it takes
+            setattr(self, name, np.asarray(memoryview(buffer)))
+            self.body.set_shader_input(name, buffer)
+
+        # Instances are placed by the shader, so the mesh's own bounds mean nothing
+        self.body.node().setBounds(OmniBoundingVolume())
+        self.body.node().setFinal(True)
+        self._set_instance_count()
+
+    def _set_instance_count(self):
+        self.body.setInstanceCount(self.count)
+        # Nothing to draw yet: hide rather than draw the mesh once at the origin
+        self.body.enabled = self.count > 0
+
+    @property
+    def full(self):
+        return self.count >= MAX_INSTANCES
+
+    def add(self, colors):
+        i = self.count
+        self.count += 1
+        self.shirts[i] = colors['shirt']
+        self.sleeves[i] = colors['sleeve']
+        self.shorts[i] = colors['shorts']
+        self._set_instance_count()
+        return i
+
+
+class BodyRenderer:
+    """Hands out instance slots, opening a new batch when one fills up."""
+    def __init__(self):
+        self.batches = {}
+
+    def add(self, parts, colors):
+        """Returns (batch, index) for a new body; write its rows every frame."""
+        batches = self.batches.setdefault(parts, [])
+        if not batches or batches[-1].full:
+            batches.append(BodyBatch(parts))
+        batch = batches[-1]
+        return batch, batch.add(colors)
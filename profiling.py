@@ -0,0 +1,184 @@
+"""Scoped timers and counters for finding where frame time goes.
+
+    with profiler.scope('Player.update'):
+        ...
+    profiler.count('ticks', ran)
+    profiler.end_frame() # once per frame
+
+Time spent in each section is summed per frame, and the last WINDOW frames
+are kept for rolling p50/p95/p99. With `tracing` on, every scope is also
+logged and can be written out as a Chrome trace (JSON, opens in
+chrome://tracing or Perfetto) or CSV.
+
+While disabled, scope() hands back one shared do-nothing context manager and
+count() returns straight away, so instrumented code costs a method call.
+
+StartupTimer is separate: it splits one stretch of time, such as the game's
+time to first frame, into named stages.
+"""
+import csv
+import json
+import time
+
+import numpy as np
+
+WINDOW = 300 # Frames kept for the rolling percentiles
+MAX_TRACE_EVENTS = 2_000_000 # Stop logging rather than eat all the memory on a long run
+
+
+class _NullScope:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SCOPE = _NullScope()
+
+
+class _Scope:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.profiler._add(self.name, self.start, end - self.start)
+        return False
+
+
+class Profiler:
+    def __init__(self, window=WINDOW):
+        self.enabled = False
+        self.tracing = False
+        self.window = window
+        self.frames = 0
+        self.sections = {} # name -> [seconds, calls] this frame
+        self.counters = {} # name -> total this frame
+        self.counter_names = set()
+        self.history = {} # name -> ring buffer of per-frame ms (or counts)
+        self.trace = [] # (name, start, duration) in seconds
+        self.origin = time.perf_counter()
+
+    def scope(self, name):
+        if not self.enabled: return _NULL_SCOPE
+        return _Scope(self, name)
+
+    def count(self, name, n=1):
+        if not self.enabled: return
+        self.counters[name] = self.counters.get(name, 0) + n
+        self.counter_names.add(name)
+
+    def _add(self, name, start, duration):
+        entry = self.sections.get(name)
+        if entry is None:
+            self.sections[name] = [duration, 1]
+        else:
+            entry[0] += duration
+            entry[1] += 1
+        if self.tracing and len(self.trace) < MAX_TRACE_EVENTS:
+            self.trace.append((name, start, duration))
+
+    def end_frame(self):
+        """Close the current frame: push its totals into the rolling windows."""
+        if not self.enabled: return
+        slot = self.frames % self.window
+        for name, (seconds, calls) in self.sections.items():
+            self._history(name)[slot] = seconds * 1000
+        for name, total in self.counters.items():
+            self._history(name)[slot] = total
+        # Sections that didn't run this frame took no time
+        for name, values in self.history.items():
+            if name not in self.sections and name not in self.counters:
+                values[slot] = 0
+        self.sections.clear()
+        self.counters.clear()
+        self.frames += 1
+
+    def _history(self, name):
+        values = self.history.get(name)
+        if values is None:
+            values = self.history[name] = np.full(self.window, np.nan)
+        return values
+
+    def reset(self):
+        self.frames = 0
+        self.sections.clear()
+        self.counters.clear()
+        self.counter_names.clear()
+        self.history.clear()
+        self.trace.clear()
+
+    def summary(self):
+        """{name: {'mean', 'p50', 'p95', 'p99', 'max'}} over the frames in the window."""
+        filled = min(self.frames, self.window)
+        result = {}
+        for name, values in self.history.items():
+            recent = values[:filled]
+            recent = recent[~np.isnan(recent)]
+            if not len(recent): continue
+            p50, p95, p99 = np.percentile(recent, (50, 95, 99))
+            result[name] = {'mean': recent.mean(), 'p50': p50, 'p95': p95, 'p99': p99, 'max': recent.max()}
+        return result
+
+    def report(self):
+        """The summary as a text table: ms per frame, slowest p95 first, then counters (#)."""
+        rows = sorted(self.summary().items(), key=lambda item: (item[0] in self.counter_names, -item[1]['p95']))
+        lines = [f"{'ms / frame':<24}{'p50':>8}{'p95':>8}{'p99':>8}"]
+        for name, s in rows:
+            if name in self.counter_names: name = '#' + name
+            lines.append(f"{name:<24}{s['p50']:>8.2f}{s['p95']:>8.2f}{s['p99']:>8.2f}")
+        return '\n'.join(lines)
+
+    def export(self, path):
+        """Write the trace (and summary) to path; .csv for CSV, anything else JSON."""
+        if str(path).endswith('.csv'):
+            self.export_csv(path)
+        else:
+            self.export_json(path)
+
+    def export_json(self, path):
+        events = [{'name': name, 'ph': 'X', 'pid': 0, 'tid': 0,
+                   'ts': (start - self.origin) * 1e6, 'dur': duration * 1e6}
+                  for name, start, duration in self.trace]
+        summary = {name: {k: float(v) for k, v in s.items()} for name, s in self.summary().items()}
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'summary': summary}, f)
+
+    def export_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('section', 'start_ms', 'duration_ms'))
+            for name, start, duration in self.trace:
+                writer.writerow((name, f'{(start - self.origin) * 1000:.4f}', f'{duration * 1000:.4f}'))
+
+
+class StartupTimer:
+    """Wall time of each loading stage, e.g. up to the first rendered frame."""
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.stages = {} # name -> seconds, in the order they ran
+
+    def mark(self, stage):
+        """End the stage that has been running since the previous mark."""
+        now = time.perf_counter()
+        self.stages[stage] = now - self.last
+        self.last = now
+
+    @property
+    def total(self):
+        return self.last - self.start
+
+    def report(self):
+        stages = ', '.join(f"{name} {seconds * 1000:.0f}" for name, seconds in self.stages.items())
+        return f"{self.total * 1000:.0f} ms ({stages})"
+
+
+# Shared instance used by the game and the simulation
+profiler = Profiler()
@@ -0,0 +1,352 @@
+"""Compact binary match replays.
+
+A replay stores, for every tick, the ball, the referee, every player's
+position, heading and animation state, and the inputs of that tick. Ticks are
+grouped in blocks of up to KEYFRAME_INTERVAL:
+
+    keyframe   positions as float32
+    deltas     positions as int16 offsets from the block's keyframe
+               (1 / DELTA_SCALE units), headings and run cycles as int16
+               angles, anim timers as float16
+
+A block ends early, and the next starts with a fresh keyframe, when the
+kickoff after a goal moves everyone or when a position has got too far from
+the keyframe for an int16 delta (loading a saved state, say). Every block in
+a file has the same size and every delta refers to its own keyframe, and the
+file ends with the first tick of every block. So tick t is decoded from one
+block and at most one delta, whatever t. Playback memory-maps the file, so
+only the pages actually visited are read.
+
+    writer = ReplayWriter('match.rfc', match)   # or stepper.recorder = ...
+    writer.record(match, inputs)                # after every tick
+    writer.close()
+
+    reader = ReplayReader('match.rfc')
+    match = reader.create_match()
+    stepper = ReplayStepper(match, reader)      # drop-in for FixedStepper
+"""
+import json
+import math
+import struct
+
+import numpy as np
+
+import simulation
+from simulation import Inputs, MATCH_STATES, NO_INPUT, TICK_RATE, Vec3
+
+MAGIC = b'RFCR'
+VERSION = 2
+KEYFRAME_INTERVAL = 60 # Ticks per block (0.5 s at 120 Hz)
+DELTA_SCALE = 512 # int16 position steps per unit: ~2 mm, up to 64 units from the keyframe
+DELTA_LIMIT = 32767
+ANGLE_SCALE = 32767 / math.pi
+
+KICK_MODES = (None, 'shoot', 'pass', 'cross', 'clear')
+
+# magic, version, ticks recorded and blocks written (-1 until closed), metadata length
+_HEADER = struct.Struct('<4sHxxqqI')
+_TICKS_OFFSET = 8
+
+
+def frame_dtype(n_players, position_type):
+    """One tick. Keyframes store positions as float32, deltas as int16."""
+    return np.dtype([
+        ('ball', position_type, (3,)),
+        ('referee', position_type, (3,)),
+        ('referee_yaw', np.int16),
+        ('referee_cycle', np.int16),
+        ('positions', position_type, (n_players, 3)),
+        ('yaw', np.int16, (n_players,)),
+        ('cycle', np.int16, (n_players,)),
+        ('anim_timer', np.float16, (n_players,)),
+        ('flags', np.uint8, (n_players,)), # bit 0 shooting, bit 1 running
+        ('active', np.int8), # -1 = nobody
+        ('closest', np.int8, (2,)),
+        ('state', np.int8), # Index into MATCH_STATES
+        ('kick', np.int8, (2,)), # Kicker (-1 = none) and index into KICK_MODES
+        ('inputs', np.int8, (4,)), # move_x, move_z, kick mode, switch
+    ])
+
+def block_dtype(n_players, keyframe_interval):
+    return np.dtype([
+        ('start', np.int64), # First tick
+        ('length', np.int64), # Ticks it holds
+        ('key', frame_dtype(n_players, np.float32)),
+        ('deltas', frame_dtype(n_players, np.int16), (keyframe_interval - 1,)),
+    ])
+
+
+def _angle(degrees):
+    # Wrap to [-pi, pi) and quantize
+    radians = (np.radians(degrees) + math.pi) % (2 * math.pi) - math.pi
+    return np.rint(radians * ANGLE_SCALE).astype(np.int16)
+
+def _degrees(angle):
+    return np.degrees(np.asarray(angle, dtype=np.float64) / ANGLE_SCALE)
+
+def _cycle(radians):
+    return _angle(np.degrees(radians))
+
+def _radians(angle):
+    return np.asarray(angle, dtype=np.float64) / ANGLE_SCALE
+
+def _index(player):
+    return -1 if player is None else player.index
+
+def _delta(value, key):
+    return np.rint((value - key) * DELTA_SCALE)
+
+def kicked_off(match):
+    """Whether reset_positions() moved everyone to their kickoff spots in match's last tick."""
+    return any(kind == 'goal' for kind, _, _ in match.events)
+
+
+def write_frame(frame, match, key=None, inputs=None, kick=None):
+    """Fill frame with match as it is now.
+
+    With key (a filled keyframe) positions are written as deltas from it and
+    frame must be of the int16 frame_dtype; without, frame is a keyframe.
+    kick is the (player, mode) to record, by default the first of this tick's.
+    Returns False, leaving frame untouched, if a position is too far from
+    key for a delta.
+    """
+    if inputs is None: inputs = NO_INPUT
+    a = match.arrays
+    ball = np.array(tuple(match.ball.position))
+    referee = np.array(tuple(match.referee.position))
+    if key is None:
+        frame['ball'] = ball
+        frame['referee'] = referee
+        frame['positions'] = a.positions
+    else:
+        deltas = [_delta(ball, key['ball']), _delta(referee, key['referee']), _delta(a.positions, key['positions'])]
+        if any(np.abs(delta).max() > DELTA_LIMIT for delta in deltas):
+            return False
+        frame['ball'], frame['referee'], frame['positions'] = deltas
+
+    frame['referee_yaw'] = _angle(match.referee.rotation_y)
+    frame['referee_cycle'] = _cycle(match.referee.run_cycle)
+    frame['yaw'] = _angle(a.rotation_y)
+    frame['cycle'] = _cycle(a.run_cycle)
+    frame['anim_timer'] = a.anim_timer
+    frame['flags'] = a.shooting.astype(np.uint8) | (a.running.astype(np.uint8) << 1)
+    frame['active'] = _index(match.active_player)
+    frame['closest'] = (_index(match.closest_to_ball_0), _index(match.closest_to_ball_1))
+    frame['state'] = MATCH_STATES.index(match.match_state)
+
+    if kick is None:
+        kick = next(((player, mode) for kind, player, mode in match.events if kind == 'kick'), None)
+    frame['kick'] = (-1, 0) if kick is None else (kick[0].index, KICK_MODES.index(kick[1]))
+    frame['inputs'] = (inputs.move_x, inputs.move_z, KICK_MODES.index(inputs.kick), inputs.switch)
+    return True
+
+
+class ReplayWriter:
+    def __init__(self, path, match, keyframe_interval=KEYFRAME_INTERVAL):
+        self.file = open(path, 'wb')
+        self.keyframe_interval = keyframe_interval
+        self.ticks = 0
+
+        meta = {
+            'tick_rate': TICK_RATE,
+            'keyframe_interval': keyframe_interval,
+            'seed': match.seed,
+            'controlled_team': match.controlled_team,
+            'players': [[p.team, p.role, p.number, p.name] for p in match.players],
+        }
+        meta = json.dumps(meta).encode('utf-8')
+        self.file.write(_HEADER.pack(MAGIC, VERSION, -1, -1, len(meta)) + meta)
+        # Pad so the blocks start 16-byte aligned
+        self.file.write(b'\0' * (-self.file.tell() % 16))
+
+        self.block = np.zeros((), dtype=block_dtype(len(match.players), keyframe_interval))
+        self.starts = [] # First tick of every block written
+
+    def record(self, match, inputs=None):
+        """Append the state of match after a tick, along with the tick's inputs."""
+        j = self.block['length'].item()
+        if j and (kicked_off(match) or not write_frame(self.block['deltas'][j - 1], match, self.block['key'], inputs)):
+            self._flush() # Start again from a keyframe of this tick
+            j = 0
+        if j == 0:
+            self.block['start'] = self.ticks
+            write_frame(self.block['key'], match, inputs=inputs)
+
+        self.block['length'] = j + 1
+        self.ticks += 1
+        if j == self.keyframe_interval - 1:
+            self._flush()
+
+    def _flush(self):
+        self.file.write(self.block.tobytes())
+        self.starts.append(self.block['start'].item())
+        self.block[...] = 0
+
+    def close(self):
+        if self.file.closed: return
+        if self.block['length']:
+            self._flush() # Partial last block
+        self.file.write(np.array(self.starts, dtype=np.int64).tobytes())
+        self.file.seek(_TICKS_OFFSET)
+        self.file.write(struct.pack('<qq', self.ticks, len(self.starts)))
+        self.file.close()
+
+
+class Frame:
+    """One decoded tick."""
+    def __init__(self, key, delta):
+        self.raw = key if delta is None else delta
+
+        if delta is None:
+            self.ball = key['ball'].astype(np.float64)
+            self.referee = key['referee'].astype(np.float64)
+            self.positions = key['positions'].astype(np.float64)
+        else:
+            self.ball = key['ball'] + delta['ball'] / DELTA_SCALE
+            self.referee = key['referee'] + delta['referee'] / DELTA_SCALE
+            self.positions = key['positions'] + delta['positions'] / DELTA_SCALE
+
+        raw = self.raw
+        self.referee_yaw = _degrees(raw['referee_yaw']).item()
+        self.referee_cycle = _radians(raw['referee_cycle']).item()
+        self.yaw = _degrees(raw['yaw'])
+        self.run_cycle = _radians(raw['cycle'])
+        self.anim_timer = raw['anim_timer'].astype(np.float64)
+        self.shooting = (raw['flags'] & 1).astype(np.bool_)
+        self.running = (raw['flags'] & 2).astype(np.bool_)
+
+    @property
+    def inputs(self):
+        move_x, move_z, kick, switch = self.raw['inputs'].tolist()
+        return Inputs(move_x, move_z, KICK_MODES[kick], bool(switch))
+
+
+class ReplayReader:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            magic, version, ticks, blocks, meta_length = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a replay")
+            if version != VERSION:
+                raise ValueError(f"{path} is replay version {version}, expected {VERSION}")
+            self.meta = json.loads(f.read(meta_length).decode('utf-8'))
+
+        offset = _HEADER.size + meta_length
+        offset += -offset % 16
+        self.keyframe_interval = self.meta['keyframe_interval']
+        self.tick_rate = self.meta['tick_rate']
+        n_players = len(self.meta['players'])
+        dtype = block_dtype(n_players, self.keyframe_interval)
+        if blocks >= 0:
+            self.blocks = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(blocks,))
+            self.starts = np.fromfile(path, dtype=np.int64, count=blocks, offset=offset + blocks * dtype.itemsize)
+            self.ticks = ticks
+        else:
+            # A recording that was never closed still has every block it flushed, but no index
+            self.blocks = np.memmap(path, dtype=dtype, mode='r', offset=offset)
+            self.starts = np.array(self.blocks['start'])
+            self.ticks = (self.blocks[-1]['start'] + self.blocks[-1]['length']).item() if len(self.blocks) else 0
+
+    def __len__(self):
+        return self.ticks
+
+    def frame(self, tick):
+        if not 0 <= tick < self.ticks:
+            raise IndexError(f"tick {tick} outside replay of {self.ticks} ticks")
+        b = np.searchsorted(self.starts, tick, side='right') - 1
+        block = self.blocks[b]
+        j = tick - self.starts[b]
+        return Frame(block['key'], None if j == 0 else block['deltas'][j - 1])
+
+    def create_match(self):
+        """A match with the recorded teams, ready to have frames applied."""
+        match = simulation.create_match(self.meta['controlled_team'], self.meta['seed'])
+        recorded = [tuple(p) for p in self.meta['players']]
+        if recorded != [(p.team, p.role, p.number, p.name) for p in match.players]:
+            raise ValueError("replay was recorded with different teams")
+        return match
+
+    def apply(self, tick, match):
+        """Set match to how it was after tick. No AI or physics runs."""
+        apply_frame(self.frame(tick), match, tick, self.tick_rate)
+
+
+def apply_frame(frame, match, tick, tick_rate=TICK_RATE, dt=None):
+    """Set match to a decoded Frame of tick. dt is the time since the frame applied before it."""
+    rate = tick_rate if dt is None else 1 / dt
+    raw = frame.raw
+    players = match.players
+
+    ball = match.ball
+    new_ball = Vec3(*frame.ball.tolist())
+    ball.velocity = (new_ball - ball.position) * rate
+    ball.position = new_ball
+
+    ref = match.referee
+    new_ref = Vec3(*frame.referee.tolist())
+    ref.velocity = (new_ref - ref.position) * rate # Drives the referee's run animation
+    ref.position = new_ref
+    ref.rotation_y = frame.referee_yaw
+    ref.run_cycle = frame.referee_cycle
+
+    a = match.arrays
+    a.positions[:] = frame.positions
+    a.rotation_y[:] = frame.yaw
+    a.run_cycle[:] = frame.run_cycle
+    a.anim_timer[:] = frame.anim_timer
+    a.shooting[:] = frame.shooting
+    a.running[:] = frame.running
+    simulation.invalidate_grid(match) # Proximity queries (name tags) see the replayed positions
+
+    active = int(raw['active'])
+    match.active_player = players[active] if active >= 0 else None
+    closest_0, closest_1 = raw['closest'].tolist()
+    match.closest_to_ball_0 = players[closest_0] if closest_0 >= 0 else None
+    match.closest_to_ball_1 = players[closest_1] if closest_1 >= 0 else None
+    match.match_state = MATCH_STATES[int(raw['state'])]
+    match.ticks = tick + 1
+    match.time = match.ticks / tick_rate
+
+    match.events.clear()
+    kicker, mode = raw['kick'].tolist()
+    if kicker >= 0:
+        match.events.append(('kick', players[kicker], KICK_MODES[mode]))
+
+
+class ReplayStepper(simulation.FixedStepper):
+    """Plays a replay back at tick rate (times time_scale), like FixedStepper plays a match."""
+    def __init__(self, match, reader):
+        super().__init__(match, reader.tick_rate)
+        self.reader = reader
+        self.paused = False
+        self.seek(0)
+
+    @property
+    def finished(self):
+        return self.ticks >= len(self.reader)
+
+    def seek(self, tick):
+        """Jump straight to tick; costs the same wherever it is."""
+        tick = int(min(max(tick, 0), len(self.reader) - 1))
+        if tick < 0: return # Empty replay
+        # Apply the tick before as well so interpolation starts from the right place
+        self.reader.apply(max(tick - 1, 0), self.match)
+        simulation.store_previous(self.match)
+        self.reader.apply(tick, self.match)
+        self.ticks = tick + 1
+        self.accumulator = 0.0
+
+    def _tick(self, inputs):
+        # Recorded inputs are already baked into the recorded state
+        if self.finished: return False
+        simulation.store_previous(self.match)
+        self.reader.apply(self.ticks, self.match)
+        return True
+
+    def advance(self, frame_dt, inputs=None):
+        """Apply as many recorded ticks as frame_dt covers. inputs are ignored."""
+        if self.paused:
+            self.events.clear()
+            self.accumulator = 0.0
+            return 0
+        return super().advance(frame_dt, inputs)
@@ -0,0 +1,630 @@
+"""Dedicated match server: many headless matches, streamed to remote viewers.
+
+The server is a lobby process plus one worker process ("shard") per core.
+Each shard runs an asyncio loop that steps all of its matches at TICK_RATE
+and streams them to their viewers over its own UDP port. The lobby only
+hands out matches: a viewer says hello to the lobby, is given a match on
+the least loaded shard, and from then on talks to that shard directly.
+
+Viewers get a frame every STREAM_INTERVAL ticks in the replay format (see
+replay.py): a float32 keyframe every STREAM_KEYFRAME ticks and after every
+kickoff, and in between int16 deltas from the newest keyframe the viewer has
+acknowledged, or a keyframe when something has moved too far from it for a
+delta. They send back their inputs and acks. main.py --server HOST:PORT is such a
+viewer: it renders what arrives and runs no simulation of its own.
+
+Every shard times every tick of every match and reports to the lobby each
+REPORT_INTERVAL: how busy the shard was and, per match, tick cost (mean,
+99th percentile, worst) and ticks run. The lobby admits a new match only
+to a shard whose measured load plus one more match's stays under
+max_utilization, and turns the viewer away otherwise, so a full core never
+takes on a match that would drag the others on it below tick rate.
+
+    python server.py --port 7900 --bots 20           # 20 AI matches to watch or load-test with
+    python main.py --server 127.0.0.1:7900           # play a new match on the server
+    python main.py --server 127.0.0.1:7900 --watch 3 # watch match 3
+"""
+import argparse
+import asyncio
+import collections
+import multiprocessing
+import os
+import queue
+import socket
+import struct
+import time
+
+import numpy as np
+
+import replay
+import simulation
+from net import decode_inputs, encode_inputs
+from simulation import Inputs, NO_INPUT, TICK_DT, TICK_RATE
+
+STREAM_INTERVAL = 4 # Ticks between frames sent to viewers (30 a second)
+STREAM_KEYFRAME = 60 # Ticks between keyframes; deltas reach back up to twice this
+VIEWER_TIMEOUT = 10.0 # Seconds of silence before a viewer is dropped (and an abandoned match closed)
+INPUT_INTERVAL = 1 / 60 # Seconds between a viewer's input packets
+REPORT_INTERVAL = 1.0 # Seconds between shard load reports
+MAX_UTILIZATION = 0.75 # Fraction of a shard's time that may go on ticking matches
+MAX_CATCH_UP = simulation.MAX_TICKS_PER_FRAME # Ticks a late shard runs back to back before dropping time
+DEFAULT_TICK_COST = 0.0005 # Seconds per match tick assumed before any are measured
+METRICS_WINDOW = 5 * TICK_RATE # Ticks of history behind each match's tick-time percentiles
+JOIN_INTERVAL = 0.5 # Seconds between a viewer's join attempts
+PLAYOUT_FRAMES = 2 # Frames a viewer holds back to ride out jitter...
+MAX_BUFFERED_FRAMES = 6 # ...and how many it lets pile up before skipping ahead
+
+WATCH = 0xFF # Team byte for a viewer that only watches
+
+# Packets: a one-byte type, then
+_JOIN = struct.Struct('<ci') # J, match to watch (-1 = host a new one to play)
+_WELCOME = struct.Struct('<cIHIB') # W, match id, shard port, seed, team (WATCH to watch)
+_REJECT = struct.Struct('<c') # R; then the reason as utf-8
+_INPUT = struct.Struct('<cIiBB') # I, match id, newest keyframe tick received (-1 for none), move and kick, switch count
+_FRAME = struct.Struct('<cIIiBB') # F, match id, tick, keyframe it's a delta from (-1 = this is a keyframe), score; then the frame
+
+
+class TickStats:
+    """Per-match tick times over the last METRICS_WINDOW ticks."""
+    def __init__(self, window=METRICS_WINDOW):
+        self.times = np.zeros(window)
+        self.count = 0 # Ticks ever recorded
+        self.reported = 0 # count at the last report
+
+    def add(self, seconds):
+        self.times[self.count % len(self.times)] = seconds
+        self.count += 1
+
+    def report(self, elapsed):
+        recent = self.times[:min(self.count, len(self.times))]
+        ticks = self.count - self.reported
+        self.reported = self.count
+        if not len(recent):
+            return {'ticks_per_second': 0.0, 'mean_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+        return {
+            'ticks_per_second': ticks / elapsed,
+            'mean_ms': recent.mean() * 1000,
+            'p99_ms': np.percentile(recent, 99) * 1000,
+            'max_ms': recent.max() * 1000,
+        }
+
+
+# --- Shards ---
+class Viewer:
+    def __init__(self, address, plays):
+        self.address = address
+        self.plays = plays # Its inputs drive the match
+        self.keyframe = -1 # Newest keyframe it has acknowledged
+        self.switches = None # Switch count last seen, so a resent packet doesn't switch twice
+        self.last_seen = time.monotonic()
+
+
+class HostedMatch:
+    def __init__(self, match_id, seed, team):
+        self.id = match_id
+        self.match = simulation.create_match(controlled_team=team, seed=seed)
+        self.viewers = {} # address -> Viewer
+        self.inputs = NO_INPUT
+        self.switch = False # Apply a switch on the next tick
+        self.kick = None # Latest (player, mode) since the last frame sent
+        self.kicked_off = False # Everyone was moved to the kickoff since the last frame sent
+        self.keyframes = {} # tick -> float32 frame, the ones viewers may still hold
+        self.stats = TickStats()
+        self.bytes_sent = 0
+        self.bot = team is None
+
+        n = len(self.match.players)
+        self.key_type = replay.frame_dtype(n, np.float32)
+        self.delta_type = replay.frame_dtype(n, np.int16)
+
+    def tick(self):
+        inputs = self.inputs
+        if self.switch:
+            inputs = Inputs(inputs.move_x, inputs.move_z, inputs.kick, True)
+            self.switch = False
+        simulation.step(self.match, TICK_DT, inputs)
+        for kind, player, mode in self.match.events:
+            if kind == 'kick':
+                self.kick = (player, mode)
+        if replay.kicked_off(self.match):
+            self.kicked_off = True
+
+    def frames(self):
+        """(viewer address, packet) for every viewer, for the frame of this tick."""
+        match = self.match
+        tick = match.ticks - 1
+        if self.kicked_off:
+            # Deltas from before the kickoff would have to reach across the pitch
+            self.keyframes.clear()
+            self.kicked_off = False
+        if tick % STREAM_KEYFRAME == 0:
+            self._keyframe(tick)
+        packets = []
+        built = {} # Keyframe it's based on -> packet, shared by viewers with the same one
+        for viewer in self.viewers.values():
+            base = viewer.keyframe
+            if base not in self.keyframes or tick - base >= 2 * STREAM_KEYFRAME:
+                base = tick if tick in self.keyframes else -1
+            if base not in built:
+                if base == tick:
+                    frame, base_field = self.keyframes[tick], -1
+                elif base == -1:
+                    frame, base_field = self._keyframe(tick), -1
+                    base = tick
+                else:
+                    frame = np.zeros((), dtype=self.delta_type)
+                    if replay.write_frame(frame, match, self.keyframes[base], kick=self.kick):
+                        base_field = base
+                    else: # Too far from that keyframe for a delta
+                        frame = self.keyframes[tick] if tick in self.keyframes else self._keyframe(tick)
+                        base_field = -1
+                built[base] = _FRAME.pack(b'F', self.id, tick, base_field, *match.score) + frame.tobytes()
+            packets.append((viewer.address, built[base]))
+        self.kick = None
+        # Nobody can still be waiting on keyframes older than a delta can reach
+        for old in [t for t in self.keyframes if tick - t >= 2 * STREAM_KEYFRAME]:
+            del self.keyframes[old]
+        return packets
+
+    def _keyframe(self, tick):
+        frame = np.zeros((), dtype=self.key_type)
+        replay.write_frame(frame, self.match, kick=self.kick)
+        self.keyframes[tick] = frame
+        return frame
+
+
+class Shard(asyncio.DatagramProtocol):
+    """One worker process: steps its matches at tick rate and streams them."""
+    def __init__(self, index, commands, reports):
+        self.index = index
+        self.commands = commands
+        self.reports = reports
+        self.matches = {} # id -> HostedMatch
+        self.transport = None
+        self.running = True
+
+        self.busy = 0.0 # Seconds spent ticking since the last report
+        self.late_ticks = 0 # Ticks dropped since the last report because the shard fell behind
+        self.reported_at = time.perf_counter()
+
+    # --- Network ---
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        if data[:1] != b'I' or len(data) < _INPUT.size: return
+        _, match_id, keyframe, move, switches = _INPUT.unpack(data)
+        hosted = self.matches.get(match_id)
+        viewer = hosted and hosted.viewers.get(address)
+        if viewer is None: return
+        viewer.last_seen = time.monotonic()
+        viewer.keyframe = max(viewer.keyframe, keyframe)
+        if viewer.plays:
+            hosted.inputs = decode_inputs(move)
+            if viewer.switches is not None and switches != viewer.switches:
+                hosted.switch = True
+            viewer.switches = switches
+
+    def send(self, address, packet, hosted):
+        self.transport.sendto(packet, address)
+        hosted.bytes_sent += len(packet)
+
+    # --- Commands from the lobby ---
+    def handle_commands(self):
+        while True:
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            kind = command[0]
+            if kind == 'host':
+                _, match_id, seed, team, address = command
+                hosted = HostedMatch(match_id, seed, team)
+                if address is not None:
+                    hosted.viewers[address] = Viewer(address, plays=True)
+                self.matches[match_id] = hosted
+            elif kind == 'watch':
+                _, match_id, address = command
+                if match_id in self.matches:
+                    self.matches[match_id].viewers.setdefault(address, Viewer(address, plays=False))
+            elif kind == 'stop':
+                self.running = False
+
+    def expire_viewers(self):
+        now = time.monotonic()
+        for match_id, hosted in list(self.matches.items()):
+            for address in [a for a, v in hosted.viewers.items() if now - v.last_seen > VIEWER_TIMEOUT]:
+                del hosted.viewers[address]
+            # A played match whose player has gone is over; bot matches run until the server stops
+            if not hosted.bot and not any(v.plays for v in hosted.viewers.values()):
+                del self.matches[match_id]
+
+    def report(self):
+        now = time.perf_counter()
+        elapsed = now - self.reported_at
+        self.reports.put(('load', self.index, {
+            'utilization': self.busy / elapsed,
+            'late_ticks': self.late_ticks,
+            'matches': {match_id: dict(hosted.stats.report(elapsed), viewers=len(hosted.viewers),
+                                       kb_per_second=hosted.bytes_sent / elapsed / 1024, score=tuple(hosted.match.score))
+                        for match_id, hosted in self.matches.items()},
+        }))
+        for hosted in self.matches.values():
+            hosted.bytes_sent = 0
+        self.busy = 0.0
+        self.late_ticks = 0
+        self.reported_at = now
+
+    # --- Ticking ---
+    def tick(self):
+        for hosted in self.matches.values():
+            start = time.perf_counter()
+            hosted.tick()
+            if hosted.viewers and (hosted.match.ticks - 1) % STREAM_INTERVAL == 0:
+                for address, packet in hosted.frames():
+                    self.send(address, packet, hosted)
+            elapsed = time.perf_counter() - start
+            hosted.stats.add(elapsed)
+            self.busy += elapsed
+
+    async def run(self, host):
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=(host, 0))
+        self.reports.put(('ready', self.index, transport.get_extra_info('sockname')[1]))
+
+        next_tick = time.perf_counter()
+        next_housekeeping = 0.0
+        while self.running:
+            now = time.perf_counter()
+            if now < next_tick:
+                await asyncio.sleep(next_tick - now)
+                continue
+            due = int((now - next_tick) / TICK_DT) + 1
+            if due > MAX_CATCH_UP:
+                # Too far behind to catch up: every match loses the same time rather than spiralling
+                self.late_ticks += due - MAX_CATCH_UP
+                next_tick += (due - MAX_CATCH_UP) * TICK_DT
+                due = MAX_CATCH_UP
+            for _ in range(due):
+                self.tick()
+                next_tick += TICK_DT
+
+            if now >= next_housekeeping:
+                next_housekeeping = now + 0.05
+                self.handle_commands()
+                self.expire_viewers()
+            if now - self.reported_at >= REPORT_INTERVAL:
+                self.report()
+            await asyncio.sleep(0) # Let waiting packets in
+        transport.close()
+
+def run_shard(index, host, commands, reports):
+    try:
+        asyncio.run(Shard(index, commands, reports).run(host))
+    except KeyboardInterrupt:
+        pass
+
+
+# --- Lobby ---
+class ShardHandle:
+    """The lobby's view of a shard."""
+    def __init__(self, index, process, commands):
+        self.index = index
+        self.process = process
+        self.commands = commands
+        self.port = None
+        self.utilization = 0.0
+        self.matches = {} # id -> latest metrics
+        self.starting = {} # id -> when it was admitted, until a report includes it
+        self.late_ticks = 0
+
+    def load(self, tick_cost):
+        return self.utilization + len(self.starting) * tick_cost * TICK_RATE
+
+
+class Lobby(asyncio.DatagramProtocol):
+    def __init__(self, shards, max_utilization=MAX_UTILIZATION, seed=None):
+        self.shards = shards
+        self.max_utilization = max_utilization
+        self.rng = np.random.default_rng(seed)
+        self.transport = None
+        self.next_id = 0
+        self.hosts = {} # match id -> (ShardHandle, seed)
+        self.welcomes = {} # (address, watched match or -1) -> WELCOME, resent if a join is repeated
+        self.rejected = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def tick_cost(self):
+        """Measured seconds per match tick, averaged over every match running."""
+        costs = [m['mean_ms'] / 1000 for s in self.shards for m in s.matches.values() if m['ticks_per_second']]
+        return sum(costs) / len(costs) if costs else DEFAULT_TICK_COST
+
+    def admit(self, team, address=None):
+        """Host a new match on the least loaded shard with room. Returns (id, shard, seed) or None."""
+        cost = self.tick_cost()
+        shard = min(self.shards, key=lambda s: s.load(cost))
+        if shard.load(cost) + cost * TICK_RATE > self.max_utilization:
+            self.rejected += 1
+            return None
+        match_id = self.next_id
+        self.next_id += 1
+        seed = int(self.rng.integers(2**32))
+        shard.commands.put(('host', match_id, seed, team, address))
+        shard.starting[match_id] = time.monotonic()
+        self.hosts[match_id] = (shard, seed)
+        return match_id, shard, seed
+
+    def datagram_received(self, data, address):
+        if data[:1] != b'J' or len(data) != _JOIN.size: return
+        _, watch = _JOIN.unpack(data)
+        key = (address, watch)
+        if key not in self.welcomes:
+            if watch >= 0:
+                if watch not in self.hosts:
+                    self.transport.sendto(_REJECT.pack(b'R') + f"no match {watch}".encode('utf-8'), address)
+                    return
+                shard, seed = self.hosts[watch]
+                shard.commands.put(('watch', watch, address))
+                self.welcomes[key] = _WELCOME.pack(b'W', watch, shard.port, seed, WATCH)
+            else:
+                admitted = self.admit(0, address)
+                if admitted is None:
+                    self.transport.sendto(_REJECT.pack(b'R') + b"server full", address)
+                    return
+                match_id, shard, seed = admitted
+                self.welcomes[key] = _WELCOME.pack(b'W', match_id, shard.port, seed, 0)
+        self.transport.sendto(self.welcomes[key], address)
+
+    def handle_report(self, report):
+        kind, index, body = report
+        shard = self.shards[index]
+        if kind == 'ready':
+            shard.port = body
+        elif kind == 'load':
+            shard.utilization = body['utilization']
+            shard.late_ticks += body['late_ticks']
+            shard.matches = body['matches']
+            # The shard may not have got to a match admitted just before it reported
+            now = time.monotonic()
+            for match_id in [m for m, t in shard.starting.items() if m in shard.matches or now - t > 2 * REPORT_INTERVAL]:
+                del shard.starting[match_id]
+            for match_id in [m for m, (s, _) in self.hosts.items()
+                             if s is shard and m not in shard.matches and m not in shard.starting]:
+                del self.hosts[match_id] # Finished
+                for key in [k for k, w in self.welcomes.items() if _WELCOME.unpack(w)[1] == match_id]:
+                    del self.welcomes[key]
+
+    def status(self):
+        lines = []
+        for shard in self.shards:
+            matches = shard.matches.values()
+            worst = max((m['p99_ms'] for m in matches), default=0.0)
+            slow = sum(1 for m in matches if m['ticks_per_second'] < TICK_RATE * 0.95)
+            lines.append(f"shard {shard.index}: {len(shard.matches):3} matches, {shard.utilization:4.0%} busy,"
+                         f" worst p99 {worst:5.2f} ms, {slow} below tick rate, {shard.late_ticks} late ticks")
+        lines.append(f"{sum(len(s.matches) for s in self.shards)} matches, {self.rejected} turned away,"
+                     f" {self.tick_cost() * 1000:.2f} ms per match tick")
+        return '\n'.join(lines)
+
+
+async def serve(host='0.0.0.0', port=7900, workers=None, bots=0, max_utilization=MAX_UTILIZATION,
+                status_interval=5.0, seconds=None, seed=None):
+    """Run the lobby and its shards. Returns the lobby once seconds (if given) have passed."""
+    workers = workers or os.cpu_count() or 1
+    context = multiprocessing.get_context('spawn')
+    reports = context.Queue()
+    shards = []
+    for index in range(workers):
+        commands = context.Queue()
+        process = context.Process(target=run_shard, args=(index, host, commands, reports), daemon=True)
+        process.start()
+        shards.append(ShardHandle(index, process, commands))
+
+    lobby = Lobby(shards, max_utilization, seed)
+    while any(s.port is None for s in shards):
+        lobby.handle_report(await asyncio.to_thread(reports.get))
+
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(lambda: lobby, local_addr=(host, port))
+    print(f"lobby on {host}:{port}, {workers} shards on ports {', '.join(str(s.port) for s in shards)}")
+
+    started = time.monotonic()
+    next_status = started + status_interval
+    pending_bots = bots
+    try:
+        while seconds is None or time.monotonic() - started < seconds:
+            while True:
+                try:
+                    lobby.handle_report(reports.get_nowait())
+                except queue.Empty:
+                    break
+            # Bots are admitted one per report, so each is measured before the next is placed
+            if pending_bots and not any(s.starting for s in shards):
+                if lobby.admit(None) is None:
+                    print(f"admitted {bots - pending_bots} of {bots} bot matches; the server is full")
+                    pending_bots = 0
+                else:
+                    pending_bots -= 1
+            if status_interval and time.monotonic() >= next_status:
+                next_status += status_interval
+                print(lobby.status(), flush=True)
+            await asyncio.sleep(0.05)
+    finally:
+        transport.close()
+        for shard in shards:
+            shard.commands.put(('stop',))
+        for shard in shards:
+            shard.process.join(timeout=2)
+            if shard.process.is_alive():
+                shard.process.terminate()
+    return lobby
+
+
+# --- Viewers ---
+class Connection:
+    """A viewer's socket: joins a match through the lobby, then talks to its shard."""
+    def __init__(self, address):
+        self.lobby = address
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.shard = None
+        self.match_id = None
+        self.bytes_received = 0
+
+    def join(self, watch=None, timeout=10.0):
+        """Ask the lobby for a match. Returns (match id, seed, team or None to watch)."""
+        deadline = time.monotonic() + timeout
+        next_join = 0
+        while time.monotonic() < deadline:
+            if time.monotonic() >= next_join:
+                self.socket.sendto(_JOIN.pack(b'J', -1 if watch is None else watch), self.lobby)
+                next_join = time.monotonic() + JOIN_INTERVAL
+            try:
+                data, _ = self.socket.recvfrom(65536)
+            except (BlockingIOError, ConnectionResetError):
+                time.sleep(0.01)
+                continue
+            if data[:1] == b'R':
+                raise ConnectionRefusedError(data[1:].decode('utf-8'))
+            if data[:1] == b'W':
+                _, self.match_id, port, seed, team = _WELCOME.unpack(data)
+                self.shard = (self.lobby[0], port)
+                return self.match_id, seed, None if team == WATCH else team
+        raise TimeoutError(f"no answer from {self.lobby[0]}:{self.lobby[1]}")
+
+    def receive(self):
+        """Every packet waiting, as bytes."""
+        packets = []
+        while True:
+            try:
+                data, _ = self.socket.recvfrom(65536)
+            except (BlockingIOError, ConnectionResetError):
+                return packets
+            self.bytes_received += len(data)
+            packets.append(data)
+
+    def send_input(self, keyframe, inputs, switches):
+        move = encode_inputs(Inputs(inputs.move_x, inputs.move_z, inputs.kick))
+        try:
+            self.socket.sendto(_INPUT.pack(b'I', self.match_id, keyframe, move, switches & 0xFF), self.shard)
+        except (BlockingIOError, ConnectionRefusedError):
+            pass
+
+    def close(self):
+        self.socket.close()
+
+
+class RemoteStepper(simulation.FixedStepper):
+    """Plays a match streamed from a server, like ReplayStepper plays a file.
+
+    Frames are applied at the rate they're sent, PLAYOUT_FRAMES behind the
+    newest, so views interpolate between frames exactly as they do between
+    ticks. No AI or physics runs here; inputs go back to the server.
+    """
+    def __init__(self, match, connection):
+        super().__init__(match, TICK_RATE / STREAM_INTERVAL)
+        self.connection = connection
+        self.keyframes = {} # tick -> float32 frame
+        self.frames = collections.deque() # (tick, Frame, score), oldest first
+        self.last_tick = -1 # Newest tick queued or shown
+        self.switches = 0
+        self.switch_sent = False
+        self.next_input = 0.0
+        n = len(match.players)
+        self.key_type = replay.frame_dtype(n, np.float32)
+        self.delta_type = replay.frame_dtype(n, np.int16)
+
+    def receive(self):
+        for data in self.connection.receive():
+            if data[:1] != b'F' or len(data) < _FRAME.size: continue
+            _, match_id, tick, base, score_0, score_1 = _FRAME.unpack_from(data)
+            if match_id != self.connection.match_id or tick <= self.last_tick: continue # Stale or out of order
+            if base < 0:
+                key = np.frombuffer(data, dtype=self.key_type, count=1, offset=_FRAME.size)[0]
+                self.keyframes[tick] = key
+                frame = replay.Frame(key, None)
+            elif base in self.keyframes:
+                delta = np.frombuffer(data, dtype=self.delta_type, count=1, offset=_FRAME.size)[0]
+                frame = replay.Frame(self.keyframes[base], delta)
+            else:
+                continue # Its keyframe was lost; the server sends a fresh one once we stop acking
+            self.frames.append((tick, frame, [score_0, score_1]))
+            self.last_tick = tick
+        for old in [t for t in self.keyframes if self.last_tick - t >= 2 * STREAM_KEYFRAME]:
+            del self.keyframes[old]
+        # Fallen behind (a stall, a burst of packets): skip to just behind the newest
+        while len(self.frames) > MAX_BUFFERED_FRAMES:
+            self.frames.popleft()
+
+    def _tick(self, inputs):
+        if not self.frames or (self.ticks == 0 and len(self.frames) < PLAYOUT_FRAMES):
+            return False
+        tick, frame, score = self.frames.popleft()
+        simulation.store_previous(self.match)
+        replay.apply_frame(frame, self.match, tick, TICK_RATE, dt=STREAM_INTERVAL / TICK_RATE)
+        self.match.score = score
+        return True
+
+    def advance(self, frame_dt, inputs=None):
+        if inputs is None: inputs = NO_INPUT
+        self.receive()
+        # Switch is a one-shot: count presses rather than sending the flag
+        if inputs.switch and not self.switch_sent:
+            self.switches += 1
+        self.switch_sent = inputs.switch
+        now = time.monotonic()
+        if now >= self.next_input:
+            self.next_input = now + INPUT_INTERVAL
+            self.connection.send_input(max(self.keyframes, default=-1), inputs, self.switches)
+        return super().advance(frame_dt, inputs)
+
+
+def watch(address, match_id=None, seconds=10.0):
+    """Follow a match headlessly for a while and print what arrived. For testing a server."""
+    connection = Connection(address)
+    match_id, seed, team = connection.join(match_id)
+    match = simulation.create_match(controlled_team=team, seed=seed)
+    stepper = RemoteStepper(match, connection)
+    start = time.monotonic()
+    applied = 0
+    while time.monotonic() - start < seconds:
+        applied += stepper.advance(1 / 60, NO_INPUT)
+        time.sleep(1 / 60)
+    elapsed = time.monotonic() - start
+    print(f"match {match_id}: {applied} frames in {elapsed:.1f}s ({applied / elapsed:.1f}/s),"
+          f" {connection.bytes_received / elapsed / 1024:.2f} KB/s, tick {match.ticks}, score {match.score},"
+          f" ball at {tuple(round(v, 1) for v in match.ball.position)}")
+    connection.close()
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='RealFC dedicated match server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=7900)
+    parser.add_argument('--workers', type=int, default=None, help='shard processes (default: one per core)')
+    parser.add_argument('--bots', type=int, default=0, help='AI-vs-AI matches to start with')
+    parser.add_argument('--max-utilization', type=float, default=MAX_UTILIZATION,
+                        help='fraction of each shard that may be spent ticking before new matches are refused')
+    parser.add_argument('--status', type=float, default=5.0, help='seconds between status lines (0 for none)')
+    parser.add_argument('--seconds', type=float, default=None, help='stop after this long')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--watch', metavar='HOST:PORT', help="instead of serving, follow a match on a server for --seconds")
+    parser.add_argument('--match', type=int, default=None, help='with --watch: the match to follow (default: host a new one)')
+    args = parser.parse_args(argv)
+
+    if args.watch:
+        host, port = args.watch.rsplit(':', 1)
+        watch((host, int(port)), args.match, args.seconds or 10.0)
+        return
+    try:
+        lobby = asyncio.run(serve(args.host, args.port, args.workers, args.bots, args.max_utilization,
+                                  args.status, args.seconds, args.seed))
+        print(lobby.status())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1606 @@
+"""Headless match simulation.
+
+Everything that decides what happens on the pitch lives here as plain Python
+state objects, with no dependency on Ursina or Panda3D. `main.py` builds a
+`MatchState` with `create_match()`, advances it in fixed ticks through a
+`FixedStepper` and copies the (interpolated) state into its entities for
+drawing.
+"""
+import io
+import math
+import random
+import time
+import zlib
+
+import numpy as np
+
+from pitch_control import REACTION_TIME, PitchControl, control_from
+from profiling import profiler
+from spatial import SpatialHash
+
+# --- Configuration ---
+FIELD_WIDTH = 128 # Length (X-axis)
+FIELD_DEPTH = 80  # Width (Z-axis)
+
+PLAYER_Y = 0.9 # Player centre height (feet on the ground)
+BALL_RADIUS = 0.4
+BALL_GROUND_Y = 0.4
+BALL_RESTITUTION = 0.2 # Bounce off a player: 0 = dead stop, 1 = fully elastic
+PLAYER_RADIUS = 0.4 # Players collide with the ball as capsules of this radius
+PLAYER_HEIGHT = 1.8
+GRAVITY = 25
+MIN_SEPARATION = 0.5 # Minimum distance between players
+GOAL_WIDTH = 14 # Goal mouth (Z), matching the goals drawn in main.py
+GOAL_HEIGHT = 4
+KICKOFF_DELAY = 1.0 # Seconds an AI kicker waits before taking the kickoff
+
+# Pass scoring (see rank_pass_targets)
+PASS_MIN_DISTANCE = 5
+PASS_MAX_DISTANCE = 40
+PASS_FORWARD_WEIGHT = 2 # Reward forwardness
+PASS_IDEAL_DISTANCE = 15
+PASS_DISTANCE_WEIGHT = 0.5 # Penalty per unit away from the ideal distance
+PASS_OPENNESS_WEIGHT = 1.5 # Reward space around the receiver
+PASS_MARKED_DISTANCE = 3
+PASS_MARKED_PENALTY = 50 # Receiver has an enemy closer than PASS_MARKED_DISTANCE
+PASS_LANE_WIDTH = 1.5 # Enemies this close to the ball's path can cut the pass out
+PASS_LANE_PENALTY = 40
+SHOOT_DISTANCE = 30 # AI shoots when this close to the enemy goal line (X)
+DRIBBLE_LOOKAHEAD = 5 # How far ahead the carrier checks for space
+DRIBBLE_MIN_CONTROL = 0.5 # Keep dribbling while the team would win the race to that spot
+SUPPORT_RADIUS = 8 # Attackers look this far around their zone for open space
+PREDICTION_HORIZON = 4.0 # Seconds of ball flight predicted after each touch
+PREDICTION_STRIDE = 4 # Keep every 4th tick of the predicted path (30 Hz at 120 Hz)
+TOUCH_PUSH = 0.01 # A contact that pushes the ball out less than this, without slowing it, doesn't count as a touch
+INTERCEPT_REACH = 1.0 # A player this close (XZ) to the ball can play it
+INTERCEPT_REAIM = 0.1 # Seconds between re-picking interception points on an unchanged path
+AI_THINK_RATE = 10 # Tactical decisions per second for each AI player
+AI_URGENT_DISTANCE = 3 # Pressers and keepers this close to the ball think every tick
+BALL_GROUND_FRICTION = 0.98 ** 60 # Fraction of rolling speed kept per second (was 0.98 per frame at 60 FPS)
+
+TICK_RATE = 120 # Physics / AI ticks per second
+TICK_DT = 1 / TICK_RATE
+MAX_TICKS_PER_FRAME = 12 # Drop time rather than spiral when a frame takes too long
+FLAT_OUT = math.inf # time_scale for "as fast as possible"
+FLAT_OUT_FRAME_BUDGET = 1 / 30 # Wall-clock seconds simulated between drawn frames when flat out
+
+
+# --- Math helpers ---
+class Vec3:
+    """Minimal stand-in for Ursina's Vec3 so the core runs without Panda3D."""
+    __slots__ = ('x', 'y', 'z')
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        if not isinstance(x, (int, float)):
+            x, y, z = x[0], x[1], x[2] if len(x) > 2 else 0.0
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    def __getitem__(self, i):
+        return (self.x, self.y, self.z)[i]
+
+    def __len__(self):
+        return 3
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+        yield self.z
+
+    def __add__(self, other):
+        return Vec3(self.x + other[0], self.y + other[1], self.z + other[2])
+
+    def __sub__(self, other):
+        return Vec3(self.x - other[0], self.y - other[1], self.z - other[2])
+
+    def __mul__(self, k):
+        return Vec3(self.x * k, self.y * k, self.z * k)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Vec3(-self.x, -self.y, -self.z)
+
+    def __eq__(self, other):
+        return isinstance(other, Vec3) and self.x == other.x and self.y == other.y and self.z == other.z
+
+    def __repr__(self):
+        return f'Vec3({self.x}, {self.y}, {self.z})'
+
+    def length(self):
+        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+
+    def normalized(self):
+        l = self.length()
+        if l == 0: return Vec3(0, 0, 0)
+        return Vec3(self.x / l, self.y / l, self.z / l)
+
+
+def distance_xz(p1, p2):
+    dx = p1[0] - p2[0]
+    dz = p1[2] - p2[2]
+    return math.sqrt(dx * dx + dz * dz)
+
+def lerp(a, b, t):
+    return a + (b - a) * t
+
+def clamp(value, floor, ceiling):
+    return max(min(value, ceiling), floor)
+
+def lerp_angle(a, b, t):
+    # Interpolate degrees along the shortest arc
+    d = (b - a + 180) % 360 - 180
+    return a + d * t
+
+def yaw_towards(origin, target, default=0.0):
+    # Ursina's look_at convention: rotation_y = 0 faces +Z, 90 faces +X
+    dx = target[0] - origin[0]
+    dz = target[2] - origin[2]
+    if dx == 0 and dz == 0: return default
+    return math.degrees(math.atan2(dx, dz))
+
+
+# --- Inputs ---
+class Inputs:
+    """One frame of user input for the controlled player."""
+    def __init__(self, move_x=0, move_z=0, kick=None, switch=False):
+        self.move_x = move_x # -1, 0 or 1
+        self.move_z = move_z # -1, 0 or 1
+        self.kick = kick # None, 'shoot', 'pass' or 'cross'
+        self.switch = switch # Switch to the teammate closest to the ball
+
+NO_INPUT = Inputs()
+
+
+# --- State ---
+class BallState:
+    def __init__(self):
+        self.position = Vec3(0, 10, 0)
+        self.velocity = Vec3(0, 0, 0)
+        self.previous_position = Vec3(self.position)
+        # Bumped whenever anything but free flight moves the ball (kicks,
+        # contact with a player, resets), which is what makes a prediction stale
+        self.touches = 0
+
+
+class RefereeState:
+    def __init__(self):
+        self.position = Vec3(0, PLAYER_Y, -15) # Start slightly off-center
+        self.velocity = Vec3(0, 0, 0)
+        self.rotation_y = 0
+        self.previous_position = Vec3(self.position)
+        self.previous_rotation_y = 0
+        self.speed = 8.0
+        self.run_cycle = 0
+
+
+ROLES = ('gk', 'def', 'mid', 'att')
+AI_MODES = ('frozen', 'user', 'cover', 'press', 'keep') # What a player was last doing (PlayerArrays.ai_mode)
+
+class PlayerArrays:
+    """Struct-of-arrays store for the per-tick state of every player.
+
+    Row i belongs to the player with index i. Movement, separation and
+    animation phases are integrated for all rows at once in
+    `integrate_players()`; `PlayerState` objects are handles onto one row.
+
+    Every field is a view into one contiguous byte buffer, `block`, so the
+    whole store can be copied in one go (see Snapshot).
+    """
+    # name: (shape of one row, dtype)
+    FIELDS = {
+        'positions': ((3,), np.float64),
+        'previous_positions': ((3,), np.float64),
+        'base_positions': ((3,), np.float64),
+        'velocities': ((3,), np.float64),
+        'targets': ((3,), np.float64), # Where the AI wants to go
+        'support_offsets': ((2,), np.float64), # XZ from the covering spot to open space
+        'ai_mode': ((), np.int8), # Index into AI_MODES
+        'speed_mult': ((), np.float64), # Fraction of top speed used to get there
+        'steering': ((), np.bool_), # Steered towards targets this tick (AI players)
+        'target_velocities': ((3,), np.float64), # What the player is trying to reach this tick
+        'lerp_rates': ((), np.float64), # accel when driving, friction when coasting
+        'team': ((), np.int8),
+        'role': ((), np.int8), # Index into ROLES
+        'speed': ((), np.float64),
+        'accel': ((), np.float64),
+        'friction': ((), np.float64),
+        'rotation_y': ((), np.float64),
+        'previous_rotation_y': ((), np.float64),
+        'shooting': ((), np.bool_),
+        'running': ((), np.bool_),
+        'anim_timer': ((), np.float64),
+        'run_cycle': ((), np.float64),
+    }
+
+    def __init__(self):
+        self.count = 0
+        self._allocate(0)
+
+    def _allocate(self, count):
+        """Lay every field out in a new block of count rows, keeping the rows there are."""
+        layout = []
+        size = 0
+        for name, (shape, dtype) in self.FIELDS.items():
+            size += -size % 8 # Keep every field 8-byte aligned
+            nbytes = count * int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+            layout.append((name, shape, dtype, size, nbytes))
+            size += nbytes
+        block = np.zeros(size, dtype=np.uint8)
+        for name, shape, dtype, offset, nbytes in layout:
+            field = block[offset:offset + nbytes].view(dtype).reshape((count,) + shape)
+            old = getattr(self, name, None)
+            if old is not None: field[:len(old)] = old
+            setattr(self, name, field)
+        self.block = block
+
+    def add(self, position, team, role, speed, accel, friction):
+        # Only called while setting up teams, so growing by one row is fine
+        self._allocate(self.count + 1)
+        i = self.count
+        self.count += 1
+        self.positions[i] = position
+        self.previous_positions[i] = position
+        self.base_positions[i] = position
+        self.team[i] = team
+        self.role[i] = ROLES.index(role)
+        self.speed[i] = speed
+        self.accel[i] = accel
+        self.friction[i] = friction
+        self.lerp_rates[i] = accel
+        return i
+
+
+class _Row:
+    """Exposes one PlayerArrays field as an attribute of PlayerState."""
+    def __init__(self, field, vector=False):
+        self.field = field
+        self.vector = vector
+
+    def __get__(self, player, owner):
+        if player is None: return self
+        value = getattr(player.arrays, self.field)[player.index]
+        return Vec3(*value.tolist()) if self.vector else value.item()
+
+    def __set__(self, player, value):
+        getattr(player.arrays, self.field)[player.index] = tuple(value) if self.vector else value
+
+
+class PlayerState:
+    position = _Row('positions', vector=True)
+    previous_position = _Row('previous_positions', vector=True)
+    base_position = _Row('base_positions', vector=True)
+    velocity = _Row('velocities', vector=True)
+    target = _Row('targets', vector=True)
+    speed_mult = _Row('speed_mult')
+    target_velocity = _Row('target_velocities', vector=True)
+    lerp_rate = _Row('lerp_rates')
+    speed = _Row('speed')
+    accel = _Row('accel')
+    friction = _Row('friction')
+    rotation_y = _Row('rotation_y')
+    previous_rotation_y = _Row('previous_rotation_y')
+    anim_timer = _Row('anim_timer')
+    run_cycle = _Row('run_cycle')
+
+    def __init__(self, match, position, team, role, number, name):
+        self.match = match
+        self.arrays = match.arrays
+        self.team = team # 0 = Real Madrid, 1 = Barcelona
+        self.role = role # 'gk', 'def', 'mid', 'att'
+        self.number = number
+        self.name = name
+
+        speed = 10 # Slightly higher top speed since acceleration takes time
+        if role == 'att': speed = 11
+        if role == 'def': speed = 9
+
+        # accel: how fast to reach max speed, friction: how fast to stop
+        self.index = self.arrays.add(position, team, role, speed, accel=4.0, friction=5.0)
+
+    def __repr__(self):
+        return f'PlayerState({self.name!r}, team={self.team}, role={self.role!r})'
+
+    # Animation State (limb poses are derived from this by the renderer)
+    @property
+    def anim_state(self):
+        if self.arrays.shooting[self.index]: return 'shoot'
+        return 'run' if self.arrays.running[self.index] else 'idle'
+
+    @anim_state.setter
+    def anim_state(self, value):
+        self.arrays.shooting[self.index] = value == 'shoot'
+        self.arrays.running[self.index] = value == 'run'
+
+    @property
+    def forward(self):
+        r = math.radians(self.rotation_y)
+        return Vec3(math.sin(r), 0, math.cos(r))
+
+    def look_at(self, target):
+        self.rotation_y = yaw_towards(self.position, target, self.rotation_y)
+
+    def is_teammate(self, other):
+        return other.team == self.team
+
+    def is_enemy(self, other):
+        return other.team != self.team
+
+    def drive(self, target_velocity, lerp_rate):
+        self.target_velocity = target_velocity
+        self.lerp_rate = lerp_rate
+
+    def move_user(self, inputs):
+        # KICKOFF STATE: Lock movement
+        if self.match.match_state == 'kickoff':
+            self.img_idle() # Force idle anim
+            # Only allow shooting or passing
+            if inputs.kick in ('shoot', 'pass'):
+                self.kick_ball(mode=inputs.kick)
+            return
+
+        input_vec = Vec3(inputs.move_x, 0, inputs.move_z)
+        target_velocity = Vec3(0,0,0)
+
+        if input_vec.length() > 0:
+            input_vec = input_vec.normalized()
+            target_velocity = input_vec * self.speed
+            self.look_at(self.position + input_vec)
+
+        # Acceleration / Friction
+        # If we have input, accelerate to target. If no input, decelerate (friction)
+        self.drive(target_velocity, self.accel if input_vec.length() > 0 else self.friction)
+
+        # Kick Inputs
+        if inputs.kick:
+            self.kick_ball(mode=inputs.kick)
+
+    def img_idle(self):
+        self.velocity = Vec3(0,0,0)
+        self.target_velocity = Vec3(0,0,0)
+        self.anim_state = 'idle'
+
+    def ai_logic(self):
+        """Pick a target for the keeper or the presser (and act on the ball).
+
+        Everyone else covers their zone; those targets, and the steering
+        towards every target, are worked out in bulk by plan_players() and
+        steer_players().
+        """
+        match = self.match
+        ball = match.ball
+        dist_to_ball = distance_xz(self.position, ball.position)
+        speed_mult = 1.0 # Pressers move fast
+
+        if self.role == 'gk':
+            speed_mult = 1.1 # GK is fast
+            # Team 0 Goal: -X side (-FIELD_WIDTH/2)
+            # Team 1 Goal: +X side (FIELD_WIDTH/2)
+            goal_x = -FIELD_WIDTH/2 if self.team == 0 else FIELD_WIDTH/2
+
+            # "Save Box": how far forward from the goal line (X) and how wide (Z) they engage
+            box_depth_x = 18
+            box_width_z = 20
+
+            ball_in_box = False
+            if abs(ball.position.z) < box_width_z / 2:
+                if self.team == 0:
+                    if ball.position.x < (goal_x + box_depth_x):
+                        ball_in_box = True
+                elif self.team == 1:
+                    if ball.position.x > (goal_x - box_depth_x):
+                        ball_in_box = True
+
+            if ball_in_box:
+                # SAVE MODE: Aggressively intercept the ball where it's going to be
+                target = match.ball_prediction.intercept(self)
+                # GK Clearing Logic: If close to ball, kick it away!
+                if dist_to_ball < 1.5:
+                    self.kick_ball(mode='clear')
+
+            else:
+                # GUARD MODE: Position between ball and goal
+                goal_center = Vec3(goal_x, 0, 0)
+                dir_to_ball = (ball.position - goal_center).normalized()
+
+                # Stand a bit out from the goal line
+                guard_dist = 4
+                target = goal_center + dir_to_ball * guard_dist
+
+                # Clamp to not go too far forward or wide of the goal
+                if self.team == 0:
+                    target.x = clamp(target.x, goal_x, goal_x + 6)
+                else:
+                    target.x = clamp(target.x, goal_x - 6, goal_x)
+                target.z = clamp(target.z, -6, 6)
+
+        else:
+            # PRESS: Chase the ball anywhere, cutting it off rather than following it
+            target = match.ball_prediction.intercept(self)
+
+            # POSSESSION: If I have the ball (am very close), decide what to do
+            if dist_to_ball < 1.0:
+                self.ai_decide_action()
+
+        self.target = target
+        self.speed_mult = speed_mult
+
+    def ai_decide_action(self):
+        # Determine Goal Direction
+        enemy_goal_x = FIELD_WIDTH/2 if self.team == 0 else -FIELD_WIDTH/2
+        dist_to_goal = abs(self.position.x - enemy_goal_x)
+
+        # 1. SHOOT if close enough
+        if dist_to_goal < SHOOT_DISTANCE:
+            self.kick_ball(mode='shoot')
+            return
+
+        # --- Dribble vs Pass Logic ---
+        forward_dir_sign = 1 if self.team == 0 else -1
+
+        # Blocked if the other team would get to the spot ahead of me first
+        position = self.position
+        ahead_x = position.x + forward_dir_sign * DRIBBLE_LOOKAHEAD
+        blocked_ahead = self.match.pitch_control.control_at(self.team, ahead_x, position.z) < DRIBBLE_MIN_CONTROL
+
+        is_swarmed = len(self.match.grid.query_radius(position, 5, predicate=self.is_enemy)) >= 2
+
+        # DRIBBLE PRIORITY: If I have space ahead and am not swarmed, keep running!
+        if not blocked_ahead and not is_swarmed:
+            return
+
+        # 2. PASS if blocked or swarmed
+        pass_target = self.get_best_pass_target()
+        if pass_target:
+            self.look_at(pass_target.position)
+            self.kick_ball(mode='pass', target_entity=pass_target)
+
+        # 3. DRIBBLE (Default - handled by movement)
+
+    def get_closest_teammate(self):
+        """Finds the closest teammate to pass/cross to."""
+        best_target, _ = self.match.grid.nearest(self.position, exclude=self, predicate=self.is_teammate)
+        return best_target
+
+    def get_best_pass_target(self):
+        ranked = rank_pass_targets(self)
+        return ranked[0][0] if ranked else None
+
+    def kick_ball(self, mode='shoot', target_entity=None):
+        match = self.match
+        ball = match.ball
+
+        # If ball is already moving fast away, don't kick
+        if ball.velocity.length() > 10:
+            return
+
+        if mode in ('shoot', 'clear'):
+            enemy_goal_x = FIELD_WIDTH/2 if self.team == 0 else -FIELD_WIDTH/2
+            direction = (Vec3(enemy_goal_x, 0, 0) - self.position).normalized()
+            if mode == 'shoot':
+                direction.z += match.rng.uniform(-0.1, 0.1) # Accuracy noise
+                power = 35
+                lift = 6
+            else:
+                direction.z += match.rng.uniform(-0.5, 0.5) # Chaotic clear
+                power = 40
+                lift = 10
+            direction = direction.normalized()
+
+        elif mode in ('pass', 'cross'):
+            # User Pass: Auto-target closest teammate to make it playable
+            if not target_entity and self in (match.active_player, match.opponent_player):
+                target_entity = self.get_closest_teammate()
+
+            if target_entity:
+                direction = (target_entity.position - self.position).normalized()
+                if mode == 'pass':
+                    power = 25 # Fast pass
+                    lift = 0 # Ground pass
+                else:
+                    power = 30
+                    lift = 12 # High arc
+            else:
+                direction = self.forward
+                power = 20 if mode == 'pass' else 30
+                lift = 0 if mode == 'pass' else 10
+
+        else: # Standard weak kick / Dribble push handled by collision
+            direction = self.forward
+            power = 5
+            lift = 0
+
+        if mode in ('shoot', 'pass', 'cross', 'clear'):
+            self.anim_state = 'shoot'
+            self.anim_timer = 0
+            match.events.append(('kick', self, mode))
+
+        # Unlock Kickoff State
+        if match.match_state == 'kickoff' and mode == 'pass':
+            match.match_state = 'playing'
+
+        ball.velocity = direction * power
+        ball.velocity.y = lift
+        ball.touches += 1
+        match.last_touch = self
+
+
+class MatchRandom(random.Random):
+    """random.Random that hands out the same getstate() tuple until something is drawn.
+
+    Draws are rare (kick noise, kickoff spots) while snapshots are taken every
+    tick, so this makes capturing and restoring the generator nearly free.
+    """
+    def __init__(self, seed=None):
+        self._state = None
+        super().__init__(seed)
+
+    def seed(self, *args, **kwargs):
+        self._state = None
+        super().seed(*args, **kwargs)
+
+    def random(self):
+        self._state = None
+        return super().random()
+
+    def getrandbits(self, k):
+        self._state = None
+        return super().getrandbits(k)
+
+    def getstate(self):
+        if self._state is None:
+            self._state = super().getstate()
+        return self._state
+
+    def setstate(self, state):
+        if state is self._state: return # Nothing drawn since
+        super().setstate(state)
+        self._state = state
+
+
+class MatchState:
+    def __init__(self, controlled_team=0, seed=None, two_player=False):
+        self.ball = BallState()
+        self.referee = RefereeState()
+        self.players = []
+        self.team_0_players = []
+        self.team_1_players = []
+        self.arrays = PlayerArrays()
+
+        # Proximity index over the players, rebuilt every tick
+        self.grid = SpatialHash(FIELD_WIDTH, FIELD_DEPTH)
+        # Who would win the race to each part of the pitch, refreshed a few times a second
+        self.pitch_control = PitchControl(FIELD_WIDTH, FIELD_DEPTH)
+
+        self.controlled_team = controlled_team # None = AI vs AI
+        self.active_player = None
+        # Two humans: the other team is controlled too, through opponent_player
+        self.two_player = two_player and controlled_team is not None
+        self.opponent_player = None
+        self.closest_to_ball_0 = None
+        self.closest_to_ball_1 = None
+
+        self.match_state = 'kickoff' # 'kickoff', 'playing'
+        self.kickoff_team = 0
+        self.kicker = None # Player taking the kickoff
+        self.kickoff_time = 0.0
+        self.time = 0.0
+        self.ticks = 0 # Steps taken
+        self.score = [0, 0] # Goals by team
+        self.last_touch = None # Player who last kicked or pushed the ball
+        self.support_team = None # Team whose support_offsets are current
+        self.ball_prediction = BallPrediction()
+
+        # Every random choice in the match draws from this, so a seed (plus the
+        # same fixed-step inputs) replays the match exactly. No seed picks one,
+        # which is kept so the run can still be reproduced.
+        if seed is None:
+            seed = random.randrange(2**32)
+        self.seed = seed
+        self.rng = MatchRandom(seed)
+
+        # Things that happened this step which the renderer may want to react to
+        # (sounds, effects). Tuples of (kind, player, detail); cleared by step().
+        self.events = []
+
+    def create_player(self, pos_2d, team, role, number, name):
+        # Arguments are passed as (X, Z) pairs in field logic
+        p = PlayerState(self, (pos_2d[0], 1, pos_2d[1]), team, role, number, name)
+        self.players.append(p)
+        if team == 0: self.team_0_players.append(p)
+        else: self.team_1_players.append(p)
+        return p
+
+
+# --- Match Setup ---
+def create_match(controlled_team=0, seed=None, two_player=False):
+    match = MatchState(controlled_team, seed, two_player)
+    setup_teams(match)
+    return match
+
+def setup_teams(match):
+    barcelona = ["Ter Stegen", "Araujo", "Kounde", "Christensen", "Balde", "Pedri", "Gavi", "De Jong", "Raphinha", "Lewandowski"]
+
+    # Team 0: Real Madrid (Left Side)
+    # Indices: 0:GK, 1:LB, 2:CB, 3:CB, 4:RB, 5:LCM, 6:CAM, 7:RCM, 8:LW, 9:ST, 10:RW
+    match.create_player((-60, 0), 0, 'gk', 1, "Casilas")
+    match.create_player((-45, -20), 0, 'def', 3, "Roberto Carlos") # LB
+    match.create_player((-42, -7), 0, 'def', 4, "Ramos")     # CB
+    match.create_player((-42, 7), 0, 'def', 5, "Vandijk")    # CB
+    match.create_player((-45, 20), 0, 'def', 2, "Dani Alvies")     # RB
+    match.create_player((-25, -12), 0, 'mid', 8, "Kroos")      # LCM
+    match.create_player((-20, 0), 0, 'mid', 10, "Messi")      # CAM
+    match.create_player((-25, 12), 0, 'mid', 5, "Bellingham") # RCM
+    match.create_player((-10, -20), 0, 'att', 11, "Neymar Jr") # LW
+    match.create_player((-5, 0), 0, 'att', 7, "Ronaldo")      # ST
+    match.create_player((-10, 20), 0, 'att', 9, "Ali Jr")      # RW
+
+    # Team 1: Barcelona (Right Side)
+    match.create_player((60, 0), 1, 'gk', 1, barcelona[0])
+    match.create_player((45, -15), 1, 'def', 2, barcelona[1])
+    match.create_player((45, 15), 1, 'def', 3, barcelona[2])
+    match.create_player((40, -5), 1, 'def', 4, barcelona[3])
+    match.create_player((40, 5), 1, 'def', 5, barcelona[4])
+    match.create_player((20, -10), 1, 'mid', 8, barcelona[5])
+    match.create_player((20, 10), 1, 'mid', 6, barcelona[6])
+    match.create_player((15, 0), 1, 'mid', 21, barcelona[7])
+    match.create_player((5, -15), 1, 'att', 22, barcelona[8])
+    match.create_player((5, 15), 1, 'att', 11, "Dembele") # Extra att
+    match.create_player((2, 0), 1, 'att', 9, barcelona[9])
+
+    if match.controlled_team is not None:
+        match.active_player = match.team_0_players[9] # Start with Ronaldo
+
+    # Initialize trackers
+    match.closest_to_ball_0 = match.team_0_players[9]
+    match.closest_to_ball_1 = match.team_1_players[0]
+
+    reset_positions(match, 0)
+
+def reset_positions(match, team_index):
+    match.match_state = 'kickoff'
+    match.kickoff_team = team_index
+
+    # Reset Ball
+    match.ball.position = Vec3(0, 0.5, 0)
+    match.ball.velocity = Vec3(0, 0, 0)
+    match.ball.touches += 1
+
+    t0_players = match.team_0_players
+    t1_players = match.team_1_players
+
+    if team_index == 0:
+        # TEAM 0 KICK OFF: Striker at center, CAM close by for the pass
+        t0_players[9].position = Vec3(-0.5, PLAYER_Y, 0) # Ronaldo
+        t0_players[6].position = Vec3(-2, PLAYER_Y, 2)   # Messi (CAM)
+        kicker = t0_players[9]
+
+        # Rest of team 0 in own half
+        for i in (0, 1, 2, 3, 4, 5, 7, 8, 10):
+            base = t0_players[i].base_position
+            t0_players[i].position = Vec3(base.x, PLAYER_Y, base.z)
+
+        # TEAM 1 (Defending) - Safely in own half
+        for p in t1_players:
+            base = p.base_position
+            x = base.x
+            if x < 10: x = 10 + match.rng.uniform(0, 5)
+            p.position = Vec3(x, PLAYER_Y, base.z)
+
+    else:
+        # TEAM 1 KICK OFF
+        t1_players[9].position = Vec3(0.5, PLAYER_Y, 0)
+        t1_players[6].position = Vec3(2, PLAYER_Y, 2)
+        kicker = t1_players[9]
+
+        # Rest of team 1
+        t1_players[0].position = Vec3(60, PLAYER_Y, 0)
+        t1_players[1].position = Vec3(45, PLAYER_Y, -15)
+        t1_players[2].position = Vec3(45, PLAYER_Y, 15)
+        t1_players[3].position = Vec3(40, PLAYER_Y, -5)
+        t1_players[4].position = Vec3(40, PLAYER_Y, 5)
+        t1_players[5].position = Vec3(20, PLAYER_Y, -10)
+        t1_players[7].position = Vec3(15, PLAYER_Y, 0)
+        t1_players[8].position = Vec3(5, PLAYER_Y, -15)
+        t1_players[10].position = Vec3(2, PLAYER_Y, 0) # Another att
+
+        # TEAM 0 (Defending)
+        for p in t0_players:
+            base = p.base_position
+            x = base.x
+            if x > -10: x = -10 - match.rng.uniform(0, 5)
+            p.position = Vec3(x, PLAYER_Y, base.z)
+
+    match.kicker = kicker
+    match.kickoff_time = match.time
+    match.last_touch = None
+
+    match.arrays.velocities[:] = 0
+    match.arrays.target_velocities[:] = 0
+    invalidate_grid(match)
+    match.pitch_control.update(match.arrays, match.time) # Everyone just teleported
+
+    # Humans take the kickoff themselves, or start on whoever is nearest the ball
+    for team, slot in human_teams(match):
+        if kicker.team == team:
+            setattr(match, slot, kicker)
+        else:
+            switch_player(match, team)
+
+
+# --- Simulation Step ---
+def human_teams(match):
+    """(team, MatchState attribute holding the player they control) for every human."""
+    if match.controlled_team is None: return ()
+    if match.two_player:
+        # Always in team order, so both ends of a networked match do things in the same order
+        slots = {match.controlled_team: 'active_player', 1 - match.controlled_team: 'opponent_player'}
+        return ((0, slots[0]), (1, slots[1]))
+    return ((match.controlled_team, 'active_player'),)
+
+def step(match, dt, inputs=None, opponent_inputs=None):
+    """Advance the match by dt seconds.
+
+    `inputs` drives the active player and, in two player matches,
+    `opponent_inputs` drives the other team's opponent_player.
+    """
+    if inputs is None: inputs = NO_INPUT
+    if opponent_inputs is None: opponent_inputs = NO_INPUT
+    match.events.clear()
+    match.time += dt
+    match.ticks += 1
+    invalidate_grid(match)
+    if match.pitch_control.due(match.time):
+        with profiler.scope('sim.pitch_control'):
+            match.pitch_control.update(match.arrays, match.time)
+
+    for team, slot in human_teams(match):
+        if (inputs if slot == 'active_player' else opponent_inputs).switch:
+            switch_player(match, team)
+
+    with profiler.scope('sim.step_ball'):
+        step_ball(match, dt)
+        check_goal(match)
+    with profiler.scope('sim.update_tactics'):
+        update_tactics(match)
+        step_referee(match, dt)
+
+    # Physics / Ground clamp
+    match.arrays.positions[:, 1] = PLAYER_Y
+    with profiler.scope('sim.plan_players'): # Includes ai_logic
+        plan_players(match, inputs, opponent_inputs)
+    with profiler.scope('sim.move_players'):
+        steer_players(match)
+        integrate_players(match, dt)
+
+def invalidate_grid(match):
+    """Players have moved: the grid rebuilds from their positions when it is next queried."""
+    match.grid.mark_stale(match.players, match.arrays.positions)
+
+def plan_players(match, inputs, opponent_inputs=NO_INPUT):
+    """Decide where every player wants to go this tick (and who kicks)."""
+    a = match.arrays
+    ball = match.ball
+    humans = [(p, i) for p, i in ((match.active_player, inputs), (match.opponent_player, opponent_inputs)) if p is not None]
+    humans.sort(key=lambda human: human[0].team) # Team order, whichever side is local
+
+    ai = np.ones(a.count, dtype=np.bool_)
+    for human, _ in humans: ai[human.index] = False
+
+    if match.match_state == 'kickoff':
+        # KICKOFF STATE: Freeze AI
+        a.velocities[ai] = 0
+        a.target_velocities[ai] = 0
+        a.shooting[ai] = False
+        a.running[ai] = False
+        a.steering[:] = False
+        a.ai_mode[:] = AI_MODES.index('frozen') # Everyone rethinks when play starts
+        # An AI kicker plays it to a teammate once everyone has settled
+        kicker = match.kicker
+        if ai[kicker.index] and match.time - match.kickoff_time >= KICKOFF_DELAY:
+            kicker.kick_ball(mode='pass', target_entity=kicker.get_closest_teammate())
+    else:
+        # Tactical decisions run at AI_THINK_RATE, staggered by player so each
+        # tick only handles a slice of the team; in between, steer_players()
+        # keeps everyone heading for their last target. Players think straight
+        # away when their job changes (new presser, no longer user controlled,
+        # play restarting) and every tick while they're near the ball.
+        mode = np.where(a.role == ROLES.index('gk'), AI_MODES.index('keep'), AI_MODES.index('cover'))
+        for presser in (match.closest_to_ball_0, match.closest_to_ball_1):
+            if presser is not None and presser.role != 'gk': mode[presser.index] = AI_MODES.index('press')
+        mode[~ai] = AI_MODES.index('user')
+
+        ball_pos = np.array((ball.position.x, ball.position.y, ball.position.z))
+        d = a.positions - ball_pos
+        dist_to_ball = np.sqrt(d[:, 0] ** 2 + d[:, 2] ** 2)
+
+        due = thinking(ai, mode, a.ai_mode, dist_to_ball, match.ticks)
+        a.ai_mode[:] = mode
+        a.steering[:] = ai
+
+        cover = cover_spots(a.base_positions, ball_pos, dist_to_ball)
+
+        # SUPPORT: The team on the ball drifts its midfielders and attackers
+        # into the open space nearest their covering spot. The space only
+        # changes when pitch control does, so it's kept as an offset from the
+        # covering spot in between.
+        if match.last_touch is not None:
+            team = match.last_touch.team
+            pc = match.pitch_control
+            if pc.updated_at == match.time or team != match.support_team:
+                a.support_offsets[:] = 0
+                support = (a.team == team) & (a.role >= ROLES.index('mid'))
+                spots = cover[support][:, ::2]
+                a.support_offsets[support] = pc.find_space(team, spots, SUPPORT_RADIUS) - spots
+                match.support_team = team
+            cover[:, 0] += a.support_offsets[:, 0]
+            cover[:, 2] += a.support_offsets[:, 1]
+
+        a.targets[due] = cover[due]
+        a.speed_mult[due] = 0.8 # Coverers move slightly slower
+
+        # Keepers and each team's designated presser pick their own targets
+        for i in np.flatnonzero(due & (mode >= AI_MODES.index('press'))).tolist():
+            with profiler.scope('sim.ai_logic'):
+                match.players[i].ai_logic()
+
+    for human, human_inputs in humans:
+        human.move_user(human_inputs)
+
+# The array phases below take PlayerArrays-shaped arrays with players on the
+# last axis (before XYZ) and any axes in front, so vecsim.VecMatch runs the
+# same code over many matches at once.
+def thinking(ai, mode, last_mode, dist_to_ball, ticks):
+    """Which AI players make a tactical decision this tick.
+
+    Each gets a slot in the AI_THINK_RATE stagger, and thinks out of turn
+    when its mode changes or while it presses or keeps near the ball. ticks
+    is the match tick, one per row of the leading axes.
+    """
+    interval = max(1, round(TICK_RATE / AI_THINK_RATE))
+    slot = np.arange(mode.shape[-1]) % interval == np.asarray(ticks)[..., None] % interval
+    urgent = (mode >= AI_MODES.index('press')) & (dist_to_ball < AI_URGENT_DISTANCE)
+    return ai & (slot | (mode != last_mode) | urgent)
+
+def cover_spots(base_positions, ball_position, dist_to_ball):
+    """COVER: Slide from the base position towards the ball's side of the field.
+
+    (LERP 30% of the way, only 10% if the ball is VERY far)
+    """
+    share = np.where(dist_to_ball > 30, 0.1, 0.3)
+    return base_positions + (ball_position - base_positions) * share[..., None]
+
+def steer_players(match):
+    """Turn AI targets into target velocities and headings for all players at once."""
+    a = match.arrays
+    steer(a.steering, a.positions, a.targets, a.speed * a.speed_mult, a.accel,
+          a.target_velocities, a.lerp_rates, a.rotation_y)
+
+def steer(steering, positions, targets, speed, accel, target_velocities, lerp_rates, rotation_y):
+    """steer_players() on arrays: updates target_velocities, lerp_rates and rotation_y in place.
+
+    speed is each player's top speed times their speed_mult.
+    """
+    dx = targets[..., 0] - positions[..., 0]
+    dz = targets[..., 2] - positions[..., 2]
+    dist = np.sqrt(dx * dx + dz * dz)
+    go = steering & (dist > 0.5)
+    with np.errstate(divide='ignore', invalid='ignore'): # Only used where go
+        k = speed / dist
+
+    tv = target_velocities
+    tv[..., 0] = np.where(go, dx * k, np.where(steering, 0, tv[..., 0]))
+    tv[..., 1] = np.where(steering, 0, tv[..., 1])
+    tv[..., 2] = np.where(go, dz * k, np.where(steering, 0, tv[..., 2]))
+    lerp_rates[...] = np.where(steering, accel, lerp_rates)
+    # Look at target
+    rotation_y[go] = np.degrees(np.arctan2(dx[go], dz[go]))
+
+def rank_pass_targets(passer):
+    """Score every teammate of passer as a pass receiver, best first.
+
+    Returns a list of (player, score) for teammates (not the keeper) between
+    PASS_MIN_DISTANCE and PASS_MAX_DISTANCE away. All receivers are scored
+    together from a receiver x enemy distance matrix:
+    - forwardness: progress towards the enemy goal
+    - distance: how far the pass is from the ideal length
+    - openness: distance from the receiver to the nearest enemy
+    - lane: whether an enemy stands close enough to the pass segment to intercept
+    """
+    with profiler.scope('sim.pass_scoring'):
+        return _rank_pass_targets(passer)
+
+def _rank_pass_targets(passer):
+    match = passer.match
+    a = match.arrays
+    xz = a.positions[:, ::2]
+
+    mates = np.flatnonzero((a.team == passer.team) & (a.role != ROLES.index('gk')))
+    mates = mates[mates != passer.index]
+    enemies = xz[a.team != passer.team]
+    score, dist = pass_scores(xz[passer.index], xz[mates], enemies, 1 if passer.team == 0 else -1)
+    in_range = (dist >= PASS_MIN_DISTANCE) & (dist <= PASS_MAX_DISTANCE)
+    mates, score = mates[in_range], score[in_range]
+
+    order = np.argsort(-score, kind='stable')
+    return [(match.players[mates[i]], score[i].item()) for i in order]
+
+def pass_scores(origin, receivers, enemies, forward_dir_sign):
+    """rank_pass_targets()'s score for a pass from origin to each receiver, and its length.
+
+    Points are XZ: origin is (..., 2), receivers (..., receivers, 2) and
+    enemies (..., enemies, 2), with the same leading axes. Receivers out of
+    passing range are scored too; the caller drops them.
+    """
+    to_mate = receivers - origin[..., None, :]
+    dist = np.sqrt((to_mate ** 2).sum(axis=-1))
+    score = to_mate[..., 0] * forward_dir_sign * PASS_FORWARD_WEIGHT
+    score -= np.abs(dist - PASS_IDEAL_DISTANCE) * PASS_DISTANCE_WEIGHT
+
+    if enemies.shape[-2]:
+        # Openness: receivers x enemies distance matrix
+        gaps = receivers[..., :, None, :] - enemies[..., None, :, :]
+        nearest_enemy = np.sqrt((gaps ** 2).sum(axis=-1)).min(axis=-1)
+        score -= np.where(nearest_enemy < PASS_MARKED_DISTANCE, PASS_MARKED_PENALTY, 0)
+        score += nearest_enemy * PASS_OPENNESS_WEIGHT
+
+        # Lane: distance from each enemy to each pass segment, only counting
+        # enemies that project strictly between passer and receiver
+        rel = enemies[..., None, :, :] - origin[..., None, None, :]
+        with np.errstate(divide='ignore', invalid='ignore'): # A receiver on the passer's spot is out of range
+            t = (rel * to_mate[..., :, None, :]).sum(axis=-1) / (dist ** 2)[..., None]
+        off_lane = rel - t[..., None] * to_mate[..., :, None, :]
+        lane_dist = np.sqrt((off_lane ** 2).sum(axis=-1))
+        intercepted = ((lane_dist < PASS_LANE_WIDTH) & (t > 0) & (t < 1)).any(axis=-1)
+        score -= np.where(intercepted, PASS_LANE_PENALTY, 0)
+    return score, dist
+
+def integrate_players(match, dt):
+    """Move every player towards its target velocity in one batched pass."""
+    a = match.arrays
+
+    # Acceleration / friction: lerp each velocity towards its target
+    a.velocities += (a.target_velocities - a.velocities) * (dt * a.lerp_rates)[:, None]
+
+    # Separation: a move that ends within MIN_SEPARATION (XZ) of another
+    # player is refused and that player stops
+    with profiler.scope('sim.player_collision'):
+        speed = np.linalg.norm(a.velocities, axis=1)
+        moving = speed > 0.01
+        proposed = a.positions + a.velocities * dt
+        dx = proposed[:, 0, None] - a.positions[None, :, 0]
+        dz = proposed[:, 2, None] - a.positions[None, :, 2]
+        close = dx * dx + dz * dz < MIN_SEPARATION * MIN_SEPARATION
+        np.fill_diagonal(close, False)
+        blocked = moving & close.any(axis=1)
+        free = moving & ~blocked
+
+    a.positions[free] = proposed[free]
+    a.velocities[blocked] = 0 # Stop on collision
+    speed[blocked] = 0
+
+    # Animation phase: kicks play out for 0.3s, otherwise run or idle
+    shooting = a.shooting.copy()
+    a.anim_timer[shooting] += dt
+    a.shooting[shooting & (a.anim_timer >= 0.3)] = False
+
+    running = ~shooting & (speed > 0.5)
+    a.running[:] = running
+    a.run_cycle[running] += dt * speed[running] * 2 # Faster run = faster cycle
+    a.run_cycle[~shooting & ~running] = 0
+
+def store_previous(match):
+    # Remember where everything was before a tick so the renderer can
+    # interpolate between the last two ticks
+    ball = match.ball
+    ball.previous_position = Vec3(ball.position)
+    ref = match.referee
+    ref.previous_position = Vec3(ref.position)
+    ref.previous_rotation_y = ref.rotation_y
+    a = match.arrays
+    a.previous_positions[:] = a.positions
+    a.previous_rotation_y[:] = a.rotation_y
+
+def interpolated_position(state, alpha):
+    return lerp(state.previous_position, state.position, alpha)
+
+def interpolated_rotation_y(state, alpha):
+    return lerp_angle(state.previous_rotation_y, state.rotation_y, alpha)
+
+
+# --- Snapshots ---
+MATCH_STATES = ('kickoff', 'playing')
+
+# The parts of BallPrediction a future tick depends on. Its arrays are
+# replaced, never written to, so snapshots can share them.
+_PREDICTION_FIELDS = ('touches', 'start_time', 'times', 'points', '_intercepts_touches', '_intercepts_time',
+                      '_intercept_points', '_intercept_arrivals')
+_NO_ARRAY = np.zeros(0)
+
+
+class Snapshot:
+    """Everything a future tick depends on, captured into buffers allocated once.
+
+    capture() and restore() copy the player arrays as one block and the rest
+    field by field; the pitch control and ball prediction arrays and the
+    generator state are shared rather than copied, since the match only ever
+    replaces them. A snapshot can be restored into any match with the same
+    teams, any number of times. Humans are stored by team, so a two-player
+    snapshot restores the right way round at either end.
+
+    The spatial grid isn't included: step() marks it stale before anything
+    reads it (call invalidate_grid() first if something queries it in between).
+
+        snapshot = Snapshot(match)  # captures match as it is now
+        ...
+        snapshot.restore(match)     # and puts it back
+        snapshot.capture(match)     # reuse the buffers for a new capture
+    """
+    # Ball position, velocity and previous position; the same for the referee;
+    # then the referee's heading, previous heading and run cycle
+    _FLOATS = 21
+    _MATCH_FLOATS = ('time', 'kickoff_time')
+    # Ball touches, score, then the match fields below, then player indices
+    _MATCH_INTS = ('ticks', 'kickoff_team')
+    _PLAYERS = ('kicker', 'last_touch', 'closest_to_ball_0', 'closest_to_ball_1')
+
+    def __init__(self, match=None):
+        self.block = None
+        self.floats = np.zeros(self._FLOATS + len(self._MATCH_FLOATS))
+        self.ints = np.zeros(3 + len(self._MATCH_INTS) + 2 + len(self._PLAYERS) + 2, dtype=np.int64)
+        self.rng = None
+        self.pitch_control = None
+        self.prediction = None
+        if match is not None:
+            self.capture(match)
+
+    def capture(self, match):
+        a = match.arrays
+        if self.block is None or len(self.block) != len(a.block):
+            self.block = np.empty_like(a.block)
+        np.copyto(self.block, a.block)
+
+        ball = match.ball
+        ref = match.referee
+        p, v, q = ball.position, ball.velocity, ball.previous_position
+        rp, rv, rq = ref.position, ref.velocity, ref.previous_position
+        self.floats[:] = (p.x, p.y, p.z, v.x, v.y, v.z, q.x, q.y, q.z,
+                          rp.x, rp.y, rp.z, rv.x, rv.y, rv.z, rq.x, rq.y, rq.z,
+                          ref.rotation_y, ref.previous_rotation_y, ref.run_cycle,
+                          match.time, match.kickoff_time)
+
+        humans = [-1, -1]
+        for team, slot in human_teams(match):
+            player = getattr(match, slot)
+            if player is not None: humans[team] = player.index
+        support = match.support_team
+        self.ints[:] = (ball.touches, match.score[0], match.score[1], match.ticks, match.kickoff_team,
+                        MATCH_STATES.index(match.match_state), -1 if support is None else support,
+                        *[-1 if player is None else player.index for player in map(match.__getattribute__, self._PLAYERS)],
+                        *humans)
+
+        self.rng = match.rng.getstate()
+        pc = match.pitch_control
+        self.pitch_control = (pc.time_to_arrive, pc.control, pc.updated_at)
+        prediction = match.ball_prediction
+        self.prediction = tuple(getattr(prediction, name) for name in _PREDICTION_FIELDS)
+        return self
+
+    def restore(self, match):
+        np.copyto(match.arrays.block, self.block)
+
+        f = self.floats.tolist()
+        ball = match.ball
+        ball.position, ball.velocity, ball.previous_position = Vec3(*f[0:3]), Vec3(*f[3:6]), Vec3(*f[6:9])
+        ref = match.referee
+        ref.position, ref.velocity, ref.previous_position = Vec3(*f[9:12]), Vec3(*f[12:15]), Vec3(*f[15:18])
+        ref.rotation_y, ref.previous_rotation_y, ref.run_cycle = f[18:21]
+        match.time, match.kickoff_time = f[21:23]
+
+        touches, score_0, score_1, match.ticks, match.kickoff_team, state, support, *indices = self.ints.tolist()
+        ball.touches = touches
+        match.score = [score_0, score_1]
+        match.match_state = MATCH_STATES[state]
+        match.support_team = None if support < 0 else support
+        players = match.players
+        for name, index in zip(self._PLAYERS, indices):
+            setattr(match, name, None if index < 0 else players[index])
+        humans = indices[len(self._PLAYERS):]
+        for team, slot in human_teams(match):
+            setattr(match, slot, None if humans[team] < 0 else players[humans[team]])
+
+        match.rng.setstate(self.rng)
+        pc = match.pitch_control
+        pc.time_to_arrive, pc.control, pc.updated_at = self.pitch_control
+        prediction = match.ball_prediction
+        for name, value in zip(_PREDICTION_FIELDS, self.prediction):
+            setattr(prediction, name, value)
+        match.events.clear()
+
+    # --- Serialization ---
+    def to_bytes(self, compress=True):
+        """The snapshot as an .npz archive (no pickles), e.g. for a save game or the network."""
+        version, internal, gauss = self.rng
+        time_to_arrive, control, updated_at = self.pitch_control
+        touches, start_time, times, points, intercepts_touches, intercepts_time, intercept_points, intercept_arrivals = self.prediction
+        arrays = {
+            'block': self.block,
+            'floats': self.floats,
+            'ints': self.ints,
+            'rng': np.array(internal, dtype=np.uint32),
+            # Arrival times are float32 minimums plus REACTION_TIME, so only the
+            # float32 part needs storing, and control follows from them exactly
+            'arrival': (time_to_arrive - REACTION_TIME).astype(np.float32),
+            'prediction_times': times,
+            'prediction_points': points,
+            'intercept_points': _NO_ARRAY if intercept_points is None else intercept_points,
+            'intercept_arrivals': _NO_ARRAY if intercept_arrivals is None else intercept_arrivals,
+            # None is stored as nan (gauss) or -1 (touch counts)
+            'scalars': np.array([version, math.nan if gauss is None else gauss, updated_at, start_time, intercepts_time,
+                                 -1 if touches is None else touches, -1 if intercepts_touches is None else intercepts_touches,
+                                 intercept_points is not None]),
+        }
+        out = io.BytesIO()
+        (np.savez_compressed if compress else np.savez)(out, **arrays)
+        return out.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        with np.load(io.BytesIO(data), allow_pickle=False) as f:
+            arrays = {name: f[name] for name in f.files}
+        snapshot = cls()
+        snapshot.block = arrays['block']
+        snapshot.floats = arrays['floats']
+        snapshot.ints = arrays['ints']
+        version, gauss, updated_at, start_time, intercepts_time, touches, intercepts_touches, has_intercepts = arrays['scalars'].tolist()
+        snapshot.rng = (int(version), tuple(arrays['rng'].tolist()), None if math.isnan(gauss) else gauss)
+        time_to_arrive = arrays['arrival'].astype(np.float64)
+        time_to_arrive += REACTION_TIME
+        snapshot.pitch_control = (time_to_arrive, control_from(time_to_arrive), updated_at)
+        snapshot.prediction = (None if touches < 0 else int(touches), start_time,
+                               arrays['prediction_times'], arrays['prediction_points'],
+                               None if intercepts_touches < 0 else int(intercepts_touches), intercepts_time,
+                               arrays['intercept_points'] if has_intercepts else None,
+                               arrays['intercept_arrivals'] if has_intercepts else None)
+        return snapshot
+
+
+def save_state(match):
+    """A new Snapshot of match."""
+    return Snapshot(match)
+
+def load_state(match, snapshot):
+    """Put match back to a snapshot of it (or of a match with the same teams), grid included."""
+    snapshot.restore(match)
+    invalidate_grid(match)
+
+def state_checksum(match):
+    """Cheap fingerprint of where everything is, for spotting two copies of a match drifting apart."""
+    a = match.arrays
+    crc = zlib.crc32(a.positions.tobytes())
+    crc = zlib.crc32(a.velocities.tobytes(), crc)
+    ball = np.array(tuple(match.ball.position) + tuple(match.ball.velocity) + (match.ticks,) + tuple(match.score))
+    return zlib.crc32(ball.tobytes(), crc)
+
+
+class TickMeter:
+    """Measured ticks per wall-clock second, refreshed every `window` seconds."""
+    def __init__(self, window=0.5):
+        self.window = window
+        self.rate = 0.0
+        self._count = 0
+        self._start = time.perf_counter()
+
+    def add(self, ticks):
+        self._count += ticks
+        now = time.perf_counter()
+        elapsed = now - self._start
+        if elapsed >= self.window:
+            self.rate = self._count / elapsed
+            self._count = 0
+            self._start = now
+
+
+class FixedStepper:
+    """Runs `step()` at a fixed tick rate regardless of the frame rate.
+
+    Frame time is accumulated and consumed in whole ticks; `alpha` is how far
+    the leftover time reaches into the next tick, for render interpolation.
+
+    time_scale warps match time against wall-clock time (2 = twice as fast).
+    At math.inf (FLAT_OUT) each advance() simply ticks for frame_budget
+    seconds of wall-clock time, so the caller only gets to draw a frame
+    between bursts of simulation.
+    """
+    def __init__(self, match, tick_rate=TICK_RATE, max_ticks=MAX_TICKS_PER_FRAME):
+        self.match = match
+        self.tick_dt = 1 / tick_rate
+        self.max_ticks = max_ticks
+        self.accumulator = 0.0
+        self.ticks = 0
+        self.events = [] # Events from every tick run by the last advance()
+        self.recorder = None # e.g. a replay.ReplayWriter; gets record(match, inputs) after every tick
+        self.time_scale = 1.0
+        self.frame_budget = FLAT_OUT_FRAME_BUDGET
+        self.meter = TickMeter()
+
+    @property
+    def alpha(self):
+        return self.accumulator / self.tick_dt
+
+    @property
+    def ticks_per_second(self):
+        return self.meter.rate
+
+    def _tick(self, inputs):
+        """Run one tick and return True. Subclasses with a source that can run dry
+        (a replay file, a server's stream) return False once it has."""
+        store_previous(self.match)
+        step(self.match, self.tick_dt, inputs)
+        if self.recorder:
+            self.recorder.record(self.match, inputs)
+        return True
+
+    def _run_ticks(self, inputs, should_continue):
+        ran = 0
+        while should_continue(ran):
+            if not self._tick(inputs):
+                break
+            self.events.extend(self.match.events)
+            self.ticks += 1
+            self.meter.add(1)
+            ran += 1
+            # One-shot inputs only apply to the first tick of the frame
+            if inputs.switch:
+                inputs = Inputs(inputs.move_x, inputs.move_z, inputs.kick)
+        return ran
+
+    def advance(self, frame_dt, inputs=None):
+        """Run as many ticks as frame_dt covers. Returns the number of ticks run."""
+        if inputs is None: inputs = NO_INPUT
+        self.events.clear()
+
+        if self.time_scale == FLAT_OUT:
+            self.accumulator = 0.0
+            deadline = time.perf_counter() + self.frame_budget
+            return self._run_ticks(inputs, lambda ran: ran == 0 or time.perf_counter() < deadline)
+
+        self.accumulator += frame_dt * self.time_scale
+        due = int(self.accumulator / self.tick_dt)
+        # Warping raises the cap with it, otherwise 10x would just drop time
+        max_ticks = self.max_ticks * max(1, math.ceil(self.time_scale))
+        ran = self._run_ticks(inputs, lambda ran: ran < min(due, max_ticks))
+        if ran < due:
+            self.accumulator = 0.0 # Capped (or nothing left to run): drop the time rather than spiral
+        else:
+            self.accumulator -= ran * self.tick_dt
+        return ran
+
+    def run(self, seconds, inputs=None):
+        """Simulate `seconds` of match time without a window, at time_scale.
+
+        FLAT_OUT runs as fast as the machine allows; any other scale sleeps
+        to hold match time at time_scale x wall-clock time. Returns ticks run.
+        """
+        if inputs is None: inputs = NO_INPUT
+        self.events.clear()
+        ticks = round(seconds / self.tick_dt)
+        if self.time_scale == FLAT_OUT:
+            return self._run_ticks(inputs, lambda ran: ran < ticks)
+
+        start = time.perf_counter()
+        def paced(ran):
+            if ran >= ticks: return False
+            ahead = start + ran * self.tick_dt / self.time_scale - time.perf_counter()
+            if ahead > 0.001: time.sleep(ahead)
+            return True
+        return self._run_ticks(inputs, paced)
+
+
+def switch_player(match, team=None):
+    """Hand team's human (the active player's by default) the teammate nearest the ball."""
+    if team is None: team = match.controlled_team
+    slot = 'active_player' if team == match.controlled_team else 'opponent_player'
+    closest, _ = match.grid.nearest(match.ball.position, predicate=lambda p: p.team == team)
+    setattr(match, slot, closest)
+
+def update_tactics(match):
+    ball = match.ball
+
+    # Auto-switch to player with ball (controlled teams)
+    # If closest player is close enough to be considered "getting the ball"
+    for team, slot in human_teams(match):
+        closest = match.closest_to_ball_0 if team == 0 else match.closest_to_ball_1
+        if closest and closest is not getattr(match, slot):
+            if distance_xz(closest.position, ball.position) < 5.0: # Auto-switch threshold
+                setattr(match, slot, closest)
+
+    # Determine closest player to ball for each team (Tactical AI)
+    if not match.team_0_players or not match.team_1_players: return
+    a = match.arrays
+    dx = a.positions[:, 0] - ball.position.x
+    dz = a.positions[:, 2] - ball.position.z
+    dist = dx * dx + dz * dz
+    for team in (0, 1):
+        rows = np.flatnonzero(a.team == team)
+        closest = match.players[rows[dist[rows].argmin()]]
+        if team == 0: match.closest_to_ball_0 = closest
+        else: match.closest_to_ball_1 = closest
+
+def step_ball(match, dt):
+    ball = match.ball
+    ball_flight(ball.position, ball.velocity, dt)
+
+    with profiler.scope('sim.ball_collision'):
+        collide_ball(match, dt)
+
+def ball_flight(pos, vel, dt):
+    """Move a ball nobody touches by dt: gravity, friction, bounces. Updates pos and vel in place."""
+    # Physics
+    vel.y -= GRAVITY * dt # Gravity
+    pos.x += vel.x * dt
+    pos.y += vel.y * dt
+    pos.z += vel.z * dt
+
+    # Friction
+    if pos.y <= 0.5:
+        f = BALL_GROUND_FRICTION ** dt
+        vel.x *= f
+        vel.z *= f
+
+    # Ground Bounce
+    if pos.y < BALL_GROUND_Y:
+        pos.y = BALL_GROUND_Y
+        vel.y *= -0.6
+        if abs(vel.y) < 1: vel.y = 0
+
+    # Field Bounds (X is length, Z is width)
+    if pos.x > FIELD_WIDTH/2:
+        pos.x = FIELD_WIDTH/2
+        vel.x *= -0.8
+    if pos.x < -FIELD_WIDTH/2:
+        pos.x = -FIELD_WIDTH/2
+        vel.x *= -0.8
+
+    if pos.z > FIELD_DEPTH/2:
+        pos.z = FIELD_DEPTH/2
+        vel.z *= -0.8
+    if pos.z < -FIELD_DEPTH/2:
+        pos.z = -FIELD_DEPTH/2
+        vel.z *= -0.8
+
+def collide_ball(match, dt):
+    """Resolve the ball against every player it overlaps.
+
+    Players are vertical capsules (PLAYER_RADIUS around their centre line,
+    PLAYER_HEIGHT tall, feet on the ground). The ball is pushed out along the
+    contact normal and whatever part of its velocity, relative to the
+    player's, points into the player bounces back with BALL_RESTITUTION.
+    A player running into the ball therefore carries it along (dribbling),
+    and a ball that is already moving away is left alone.
+    """
+    ball = match.ball
+    pos = ball.position
+    a = match.arrays
+    players = a.positions
+
+    # Closest point on each player's centre line to the ball, for all players at once
+    ball_pos = np.array((pos.x, pos.y, pos.z))
+    feet = players[:, 1] - PLAYER_Y
+    axis_y = np.clip(ball_pos[1], feet + PLAYER_RADIUS, feet + PLAYER_HEIGHT - PLAYER_RADIUS)
+    offset = np.column_stack((ball_pos[0] - players[:, 0], ball_pos[1] - axis_y, ball_pos[2] - players[:, 2]))
+    dist2 = (offset ** 2).sum(axis=1)
+    reach = BALL_RADIUS + PLAYER_RADIUS
+    hits = np.flatnonzero(dist2 < reach * reach)
+    if not len(hits): return
+
+    vel = np.array((ball.velocity.x, ball.velocity.y, ball.velocity.z))
+    changed = False # Whether the ball's path is now different from the predicted one
+    for i in hits.tolist():
+        dist = math.sqrt(dist2[i])
+        if dist > 1e-6:
+            normal = offset[i] / dist
+        else:
+            # Dead centre: push it out the way the player is facing
+            r = math.radians(a.rotation_y[i])
+            normal = np.array((math.sin(r), 0.0, math.cos(r)))
+        ball_pos += normal * (reach - dist)
+        changed = changed or reach - dist > TOUCH_PUSH
+
+        approach = np.dot(vel - a.velocities[i], normal)
+        if approach < 0:
+            vel -= (1 + BALL_RESTITUTION) * approach * normal
+            changed = True
+        match.last_touch = match.players[i]
+
+    ball.position = Vec3(*ball_pos.tolist())
+    ball.velocity = Vec3(*vel.tolist())
+    # A ball just resting against a player keeps its prediction
+    if changed:
+        ball.touches += 1
+
+def check_goal(match):
+    """Score a ball that has reached the goal line inside the goal mouth."""
+    pos = match.ball.position
+    if abs(pos.x) < FIELD_WIDTH/2: return
+    if abs(pos.z) >= GOAL_WIDTH/2 or pos.y >= GOAL_HEIGHT: return
+
+    team = 0 if pos.x > 0 else 1 # Team 0 attacks +X
+    match.score[team] += 1
+    match.events.append(('goal', match.last_touch, team))
+    # The team that conceded kicks off
+    reset_positions(match, 1 - team)
+
+# --- Ball Prediction ---
+class BallPrediction:
+    """Where the ball will go if nobody touches it, and who can get to it first.
+
+    The path is integrated with the same rules as step_ball() (minus the
+    players) for PREDICTION_HORIZON seconds, keeping every PREDICTION_STRIDE-th
+    tick. It is rebuilt whenever a touch changes the ball's path, which in
+    an AI match is about one tick in 18 (nearly all of it dribbling), and a
+    ball rolling along the ground gets its path in closed form, so most
+    rebuilds are cheap. In between it stays exact. Interception points
+    for every player are worked out together, and kept until the path changes
+    or INTERCEPT_REAIM has passed.
+    """
+    def __init__(self):
+        self.touches = None # ball.touches the path was built for
+        self.start_time = 0.0
+        self.times = np.zeros(0) # Seconds after start_time
+        self.points = np.zeros((0, 3))
+        self._intercepts_touches = None # Path the interception points were picked on
+        self._intercepts_time = 0.0
+        self._intercept_points = None
+        self._intercept_arrivals = None # Match time the ball reaches each point
+
+    def path(self, match):
+        """(times, points) of the predicted path, rebuilding it if the ball was touched."""
+        ball = match.ball
+        if ball.touches != self.touches:
+            self._rebuild(ball, match.time)
+        return self.times, self.points
+
+    def _rebuild(self, ball, time):
+        points = rolling_path(ball.position, ball.velocity)
+        if points is None:
+            points = flight_path(ball.position, ball.velocity)
+
+        self.touches = ball.touches
+        self.start_time = time
+        self.points = points
+        self.times = np.arange(len(points)) * (PREDICTION_STRIDE * TICK_DT)
+
+    def intercepts(self, match):
+        """Earliest reachable point on the path for every player, and when the ball gets there.
+
+        A player can reach a point if, running flat out, they get within
+        INTERCEPT_REACH of it before the ball does and it is low enough to
+        play. Players who can't catch it within the horizon get the last point
+        of the path. Returns (points N x 3, times N) with times in seconds from now.
+        """
+        times, points = self.path(match)
+        if self._intercepts_touches == self.touches and match.time - self._intercepts_time < INTERCEPT_REAIM - 1e-9:
+            return self._intercept_points, np.maximum(self._intercept_arrivals - match.time, 0)
+
+        a = match.arrays
+        # Only the part of the path that's still ahead of the ball
+        ahead = times - (match.time - self.start_time)
+        first = min(int(np.searchsorted(ahead, -1e-9)), len(times) - 1)
+        ahead = np.maximum(ahead[first:], 0)
+        points = points[first:]
+
+        reachable = reachable_points(points, ahead, a.positions, a.speed) # players x samples
+
+        k = np.where(reachable.any(axis=1), reachable.argmax(axis=1), len(points) - 1)
+        self._intercept_points = points[k]
+        self._intercept_arrivals = match.time + ahead[k]
+        self._intercepts_touches = self.touches
+        self._intercepts_time = match.time
+        return self._intercept_points, ahead[k]
+
+    def intercept(self, player):
+        """Where player should run to meet the ball, as a Vec3."""
+        points, _ = self.intercepts(player.match)
+        return Vec3(*points[player.index].tolist())
+
+
+def flight_path(position, velocity):
+    """Every PREDICTION_STRIDE-th position of a ball left alone, tick by tick with ball_flight()."""
+    pos = Vec3(position)
+    vel = Vec3(velocity)
+    ticks = int(PREDICTION_HORIZON * TICK_RATE)
+    points = [tuple(pos)]
+    for tick in range(1, ticks + 1):
+        ball_flight(pos, vel, TICK_DT)
+        if tick % PREDICTION_STRIDE == 0:
+            points.append(tuple(pos))
+            # At rest: the rest of the path is this point
+            if vel.y == 0 and vel.x * vel.x + vel.z * vel.z < 0.01:
+                break
+    return np.array(points)
+
+def rolling_path(position, velocity):
+    """flight_path() for a ball rolling along the ground, in closed form.
+
+    Returns None if the ball is in the air, or would reach the edge of the
+    pitch (and bounce) within the path; flight_path() handles those.
+    """
+    points, length, rolling = rolling_paths(np.array([tuple(position)]), np.array([tuple(velocity)]))
+    return points[0, :length[0]] if rolling[0] else None
+
+def rolling_paths(positions, velocities):
+    """rolling_path() for N balls at once, as (points N x K x 3, lengths, rolling).
+
+    On the ground ball_flight() only moves the ball and scales its speed by
+    the same friction factor every tick, so each kept position is a
+    geometric series. A path that comes to rest early repeats its last point
+    up to K. Balls that aren't rolling have False in rolling.
+    """
+    # Grounded: the first tick's gravity lands it, and too gently to bounce
+    fall = velocities[:, 1] - GRAVITY * TICK_DT
+    rolling = ~((velocities[:, 1] > 0) | (positions[:, 1] + fall * TICK_DT >= BALL_GROUND_Y) | (-fall * 0.6 >= 1))
+
+    decay = BALL_GROUND_FRICTION ** TICK_DT
+    ticks = np.arange(0, int(PREDICTION_HORIZON * TICK_RATE) + 1, PREDICTION_STRIDE)
+    kept = decay ** ticks # Fraction of the speed left at each kept tick
+    # At rest: the path ends at the first kept point slower than flight_path()'s cut-off
+    speed2 = velocities[:, 0] * velocities[:, 0] + velocities[:, 2] * velocities[:, 2]
+    rest = speed2[:, None] * kept[1:] ** 2 < 0.01
+    length = np.where(rest.any(axis=1), rest.argmax(axis=1) + 2, len(kept))
+    travelled = (1 - kept) * (TICK_DT / (1 - decay)) # Seconds' worth of the starting velocity covered
+    travelled = travelled[np.minimum(np.arange(len(kept))[None, :], length[:, None] - 1)]
+
+    points = np.empty((len(positions), len(kept), 3))
+    points[:, :, 0] = positions[:, 0:1] + velocities[:, 0:1] * travelled
+    points[:, :, 1] = BALL_GROUND_Y
+    points[:, :, 2] = positions[:, 2:3] + velocities[:, 2:3] * travelled
+    points[:, 0, 1] = positions[:, 1]
+    # Rolling is a straight line, so if both ends are on the pitch so is everything between
+    ends = points[:, [0, -1]]
+    rolling &= ~((np.abs(ends[:, :, 0]) > FIELD_WIDTH/2) | (np.abs(ends[:, :, 2]) > FIELD_DEPTH/2)).any(axis=1)
+    return points, length, rolling
+
+def reachable_points(points, ahead, positions, speed):
+    """Which points of a path each player can get to in time to play the ball.
+
+    points (..., samples, 3) are reached by the ball ahead seconds from now.
+    The players' positions (..., 3) and speeds broadcast against the path's
+    leading axes, giving (..., samples).
+    """
+    dx = points[..., 0] - positions[..., 0:1]
+    dz = points[..., 2] - positions[..., 2:3]
+    run = np.maximum(np.sqrt(dx * dx + dz * dz) - INTERCEPT_REACH, 0) / speed[..., None]
+    return (run <= ahead) & (points[..., 1] <= PLAYER_HEIGHT + BALL_RADIUS)
+
+def step_referee(match, dt):
+    ref = match.referee
+    ball_pos = match.ball.position
+
+    # Follow the ball but keep reasonable distance: stay ~10 units away, not in the scrum
+    vec_to_me = ref.position - ball_pos
+    dist = vec_to_me.length()
+
+    target_pos = ball_pos
+
+    if dist < 8:
+        # Too close, back away
+        move_dir = vec_to_me.normalized()
+        if move_dir.length() < 0.1: move_dir = Vec3(0,0,1)
+        target_pos = ball_pos + move_dir * 10
+    elif dist > 15:
+        # Move closer
+        target_pos = ball_pos + vec_to_me.normalized() * 12
+
+    # Smooth movement
+    if distance_xz(ref.position, target_pos) > 1.0:
+        dir_to_target = (target_pos - ref.position).normalized()
+        ref.velocity = lerp(ref.velocity, dir_to_target * ref.speed, dt * 2)
+        ref.rotation_y = yaw_towards(ref.position, ball_pos, ref.rotation_y) # Look at ball
+        ref.run_cycle += dt * ref.velocity.length() * 2
+    else:
+        ref.velocity = Vec3(0,0,0)
+
+    ref.position = ref.position + ref.velocity * dt
+    ref.position.y = PLAYER_Y # Keep on ground
@@ -0,0 +1,57 @@
+"""Preloaded, pooled sound effects.
+
+A `SoundPool` loads its sample once and keeps a fixed number of voices
+around. Playing a sound takes an idle voice (or steals the one that has been
+playing longest) and only changes its pitch and volume, so nothing is looked
+up, loaded or allocated at the moment a player kicks the ball.
+
+Set ENABLED = False (or pass enabled=False) before creating pools to run
+without any audio, e.g. headless or in benchmarks.
+"""
+import random
+
+from ursina import Audio
+
+ENABLED = True
+VOICES = 6 # Kicks rarely overlap more than this; beyond it the oldest voice is reused
+
+
+class SoundPool:
+    def __init__(self, clip, voices=VOICES, enabled=None):
+        self.enabled = ENABLED if enabled is None else enabled
+        self.voices = []
+        self.started = [] # Play counter value when each voice last started, for stealing
+        self.plays = 0
+        self.random = random.Random() # Pitch variation must not touch the match's RNG
+
+        if not self.enabled:
+            return
+        for _ in range(voices):
+            voice = Audio(clip, autoplay=False)
+            if not voice.clip: # Missing asset: Audio has already warned, stay silent
+                self.enabled = False
+                self.voices.clear()
+                return
+            self.voices.append(voice)
+            self.started.append(-1)
+
+    def _take_voice(self):
+        for i, voice in enumerate(self.voices):
+            if not voice.playing:
+                return i
+        # All busy: steal the one that started first
+        return min(range(len(self.voices)), key=self.started.__getitem__)
+
+    def play(self, pitch=1.0, volume=1.0, variation=0.0):
+        if not self.enabled:
+            return
+        i = self._take_voice()
+        voice = self.voices[i]
+        if variation:
+            pitch *= self.random.uniform(1 - variation, 1 + variation)
+        voice.clip.stop()
+        voice.pitch = pitch
+        voice.volume = volume
+        voice.play()
+        self.started[i] = self.plays
+        self.plays += 1
@@ -0,0 +1,136 @@
+"""Uniform grid over the pitch for proximity queries between players.
+
+The match marks the grid stale once per tick, and it is rebuilt from the
+players' positions by the first query after that, so ticks where nobody asks
+cost nothing. Items are bucketed by the cell their XZ position falls in;
+queries then only look at the cells that overlap the search area and measure
+exact distances against the positions recorded at rebuild time. Players only
+move in the batched integration at the end of a tick, so those positions
+hold for every query made while the players decide what to do.
+"""
+import math
+
+import numpy as np
+
+CELL_SIZE = 4.0
+
+
+class SpatialHash:
+    def __init__(self, width, depth, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        # Pad the pitch by one cell so players (and the ball) near the lines still land in the grid
+        self.min_x = -width / 2 - cell_size
+        self.min_z = -depth / 2 - cell_size
+        self.cols = int(math.ceil((width + 2 * cell_size) / cell_size))
+        self.rows = int(math.ceil((depth + 2 * cell_size) / cell_size))
+        self.cells = [[] for _ in range(self.cols * self.rows)]
+        self.occupied = [] # Indices of non-empty cells, so rebuild only clears those
+        self.items = []
+        self.xs = []
+        self.zs = []
+        self.pending = None # (items, positions) to rebuild from before the next query
+
+    def cell_coords(self, x, z):
+        col = int((x - self.min_x) // self.cell_size)
+        row = int((z - self.min_z) // self.cell_size)
+        # Anything off the padded grid goes into the edge cells
+        return min(max(col, 0), self.cols - 1), min(max(row, 0), self.rows - 1)
+
+    def mark_stale(self, items, positions):
+        """Rebuild from items and positions at the next query instead of now.
+
+        positions is only read then, so it should be an array that is kept
+        up to date in place, such as PlayerArrays.positions.
+        """
+        self.pending = (items, positions)
+
+    def _refresh(self):
+        if self.pending is not None:
+            self.rebuild(*self.pending)
+
+    def rebuild(self, items, positions=None):
+        """Re-bucket items. positions (N x 3) defaults to each item's .position."""
+        self.pending = None
+        for i in self.occupied:
+            self.cells[i].clear()
+        self.occupied.clear()
+        self.items = list(items)
+        if not self.items:
+            self.xs = self.zs = []
+            return
+        if positions is None:
+            positions = [tuple(item.position) for item in self.items]
+        positions = np.asarray(positions, dtype=np.float64)
+        xs = positions[:, 0]
+        zs = positions[:, 2]
+
+        cols = np.clip(((xs - self.min_x) // self.cell_size).astype(np.int64), 0, self.cols - 1)
+        rows = np.clip(((zs - self.min_z) // self.cell_size).astype(np.int64), 0, self.rows - 1)
+        self.xs = xs.tolist()
+        self.zs = zs.tolist()
+        cells = self.cells
+        for n, i in enumerate((rows * self.cols + cols).tolist()):
+            if not cells[i]: self.occupied.append(i)
+            cells[i].append(n)
+
+    def _cells_in_range(self, x, z, radius):
+        col_0, row_0 = self.cell_coords(x - radius, z - radius)
+        col_1, row_1 = self.cell_coords(x + radius, z + radius)
+        for row in range(row_0, row_1 + 1):
+            base = row * self.cols
+            for col in range(col_0, col_1 + 1):
+                yield self.cells[base + col]
+
+    def query_radius(self, position, radius, exclude=None, predicate=None):
+        """All items within radius (XZ) of position, unordered."""
+        self._refresh()
+        x, z = position[0], position[2]
+        r2 = radius * radius
+        found = []
+        for cell in self._cells_in_range(x, z, radius):
+            for n in cell:
+                item = self.items[n]
+                if item is exclude: continue
+                if predicate and not predicate(item): continue
+                dx = self.xs[n] - x
+                dz = self.zs[n] - z
+                if dx * dx + dz * dz < r2:
+                    found.append(item)
+        return found
+
+    def nearest(self, position, exclude=None, predicate=None, max_radius=math.inf):
+        """Closest item to position (XZ) and its distance, or (None, inf).
+
+        Searches outward ring by ring and stops once no unvisited cell can
+        hold anything closer than the best match so far.
+        """
+        self._refresh()
+        x, z = position[0], position[2]
+        col_c, row_c = self.cell_coords(x, z)
+        best = None
+        best_dist = math.inf
+        max_ring = max(self.cols, self.rows)
+
+        for ring in range(max_ring + 1):
+            # Any item in this ring is at least (ring - 1) cells away
+            ring_min_dist = (ring - 1) * self.cell_size
+            if ring_min_dist > best_dist or ring_min_dist > max_radius:
+                break
+            for row in range(row_c - ring, row_c + ring + 1):
+                if row < 0 or row >= self.rows: continue
+                on_edge_row = row == row_c - ring or row == row_c + ring
+                step = 1 if on_edge_row else 2 * ring
+                for col in range(col_c - ring, col_c + ring + 1, step or 1):
+                    if col < 0 or col >= self.cols: continue
+                    for n in self.cells[row * self.cols + col]:
+                        item = self.items[n]
+                        if item is exclude: continue
+                        if predicate and not predicate(item): continue
+                        dx = self.xs[n] - x
+                        dz = self.zs[n] - z
+                        d = math.sqrt(dx * dx + dz * dz)
+                        if d < best_dist and d <= max_radius:
+                            best = item
+                            best_dist = d
+
+        return best, best_dist
@@ -0,0 +1,15 @@
+import env
+import simulation
+
+
+def test_vectorized_env_matches_match_env():
+    # Seed 5 scores three goals in its 20 s episodes, and the last steps start new ones
+    assert env.check(4, 620, seconds=20, seed=5) is None
+
+
+def test_vectorized_env_follows_tuning_changes(monkeypatch):
+    monkeypatch.setattr(simulation, 'GRAVITY', 20)
+    monkeypatch.setattr(simulation, 'SHOOT_DISTANCE', 45)
+    monkeypatch.setattr(simulation, 'PASS_LANE_PENALTY', 0)
+    monkeypatch.setattr(simulation, 'AI_THINK_RATE', 20)
+    assert env.check(2, 400, seconds=10, seed=5) is None
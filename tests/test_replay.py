@@ -0,0 +1,48 @@
+import numpy as np
+
+import replay
+import simulation
+from simulation import TICK_DT
+
+GOAL_SEED = 6 # AI vs AI, first goal at tick 3124: mid-block, and the kickoff moves players over 64 units
+
+
+def record(path, seed, ticks, keyframe_interval=replay.KEYFRAME_INTERVAL):
+    """Record an AI-vs-AI match; returns (ball, player) positions after every tick."""
+    match = simulation.create_match(controlled_team=None, seed=seed)
+    writer = replay.ReplayWriter(path, match, keyframe_interval)
+    balls, positions = [], []
+    for _ in range(ticks):
+        simulation.step(match, TICK_DT)
+        writer.record(match)
+        balls.append(tuple(match.ball.position))
+        positions.append(match.arrays.positions.copy())
+    writer.close()
+    return np.array(balls), np.array(positions), match
+
+
+def test_round_trip_through_a_goal(tmp_path):
+    path = str(tmp_path / 'goal.rfc')
+    balls, positions, match = record(path, GOAL_SEED, 3300)
+    assert sum(match.score) > 0
+
+    reader = replay.ReplayReader(path)
+    assert len(reader) == 3300
+    error = max(max(np.abs(reader.frame(t).ball - balls[t]).max(), np.abs(reader.frame(t).positions - positions[t]).max())
+                for t in range(len(reader)))
+    assert error < 1 / replay.DELTA_SCALE
+
+
+def test_unclosed_recording_keeps_its_blocks(tmp_path):
+    path = str(tmp_path / 'open.rfc')
+    match = simulation.create_match(controlled_team=None, seed=GOAL_SEED)
+    writer = replay.ReplayWriter(path, match)
+    for _ in range(1000):
+        simulation.step(match, TICK_DT)
+        writer.record(match)
+    writer.file.flush() # Crashed before close()
+
+    reader = replay.ReplayReader(path)
+    assert len(reader) == writer.ticks - writer.block['length']
+    assert list(reader.starts) == writer.starts
+    writer.close()
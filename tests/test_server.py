@@ -0,0 +1,39 @@
+import numpy as np
+
+import replay
+import server
+from server import HostedMatch, RemoteStepper, STREAM_INTERVAL
+
+GOAL_SEED = 6 # AI vs AI, first goal at tick 3124, and the kickoff moves players over 64 units
+
+
+class Connection:
+    """Hands RemoteStepper the packets a shard sent, with no sockets."""
+    match_id = 0
+
+    def __init__(self):
+        self.packets = []
+
+    def receive(self):
+        packets, self.packets = self.packets, []
+        return packets
+
+
+def test_watcher_follows_a_goal():
+    hosted = HostedMatch(0, GOAL_SEED, None)
+    hosted.viewers['watcher'] = viewer = server.Viewer('watcher', plays=False)
+    connection = Connection()
+    stepper = RemoteStepper(hosted.match, connection)
+
+    error = 0.0
+    while hosted.match.ticks < 3300:
+        hosted.tick()
+        if (hosted.match.ticks - 1) % STREAM_INTERVAL: continue
+        connection.packets = [packet for _, packet in hosted.frames()]
+        stepper.receive()
+        viewer.keyframe = max(viewer.keyframe, max(stepper.keyframes, default=-1)) # As its input packets ack
+        _, frame, _ = stepper.frames[-1]
+        error = max(error, np.abs(frame.positions - hosted.match.arrays.positions).max(),
+                    np.abs(frame.ball - tuple(hosted.match.ball.position)).max())
+    assert sum(hosted.match.score) > 0
+    assert error < 1 / replay.DELTA_SCALE
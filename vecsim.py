@@ -0,0 +1,820 @@
+"""Many matches simulated in lockstep, one NumPy pass per phase.
+
+`VecMatch` holds N matches in which team 0 is played through the human
+controls (by an agent, see env.py) and everyone else by the AI. Each
+PlayerArrays field is stacked along a leading match axis and the ball is a
+pair of N x 3 arrays. Every phase of `simulation.step()` then runs once for
+all N matches: ball flight and contact, goals, tactics, cover, pressing and
+goalkeeping, the controlled player's inputs, steering and integration.
+
+Where simulation.py already works on arrays it exposes the phase as a
+function with players on the last axis, and VecMatch calls that same
+function with the match axis in front: the AI's thinking slots, cover spots,
+steering, pass scores, rolling ball paths and who can reach them. The rest
+follows `simulation.step()` operation for operation and reads simulation's
+constants when it runs, so a tuning change reaches both. A row therefore
+plays out exactly like a MatchState created with the same seed and given the
+same inputs; `python env.py --check` compares them, and tests/test_env.py
+runs that check. Anything only the renderer looks at is left out: the
+referee, animation state, and every event except goals.
+
+Some of the match's helpers change shape here:
+- Pitch control: each row keeps where its players were heading at the last
+  refresh. From that it works out only the few cells the AI asks about, with
+  the same float32 arithmetic as `PitchControl.update()`. These are the
+  carrier's dribble check and the support runners' windows.
+- Ball prediction: interception points are kept as the players' positions
+  when they were last picked, and a player's point is worked out from those
+  when it is asked for.
+- Separation: each row keeps the pairs of players near enough to bump into
+  each other soon, and only those are measured every tick.
+
+The rare per-match work stays in Python: kick noise and the kickoff after a
+goal run on the row's own MatchState, and an airborne ball's path is worked
+out for one ball at a time.
+"""
+import functools
+import math
+
+import numpy as np
+
+import pitch_control
+import simulation
+from pitch_control import PitchControl, control_from
+
+KICKS = (None, 'shoot', 'pass', 'cross') # Kick codes taken by VecMatch.step()
+
+GK = simulation.ROLES.index('gk')
+NEIGHBOUR_SLACK = 2.0 # How much further than MIN_SEPARATION apart neighbour lists reach
+FROZEN, USER, COVER, PRESS, KEEP = (simulation.AI_MODES.index(mode)
+                                    for mode in ('frozen', 'user', 'cover', 'press', 'keep'))
+
+
+def _normalized(v):
+    """Vec3.normalized() for every row of v (N x 3)."""
+    length = np.sqrt(v[:, 0] * v[:, 0] + v[:, 1] * v[:, 1] + v[:, 2] * v[:, 2])
+    out = np.zeros_like(v)
+    moved = length != 0
+    out[moved] = v[moved] / length[moved, None]
+    return out
+
+def _yaw(dx, dz, default):
+    # yaw_towards() row by row: math.atan2 and np.arctan2 can differ in the last bit
+    return [d if x == 0 and z == 0 else math.degrees(math.atan2(x, z))
+            for x, z, d in zip(dx.tolist(), dz.tolist(), default.tolist())]
+
+@functools.lru_cache(maxsize=1024)
+def _vertical_flight(y, vy, gravity, ground_y, dt, ticks):
+    """Height, vertical speed and whether friction applied (y <= 0.5) after each tick of ball_flight(), from y and vy.
+
+    The constants it uses are arguments, so the cache never hands back a
+    profile worked out with different ones.
+    """
+    heights, speeds, low = [y], [vy], [False]
+    for _ in range(ticks):
+        vy -= gravity * dt
+        y += vy * dt
+        low.append(y <= 0.5)
+        if y < ground_y:
+            y = ground_y
+            vy *= -0.6
+            if abs(vy) < 1: vy = 0
+        heights.append(y)
+        speeds.append(vy)
+        if y == ground_y and vy == 0:
+            break # Settled: every later tick lands it straight back here
+    rest = ticks + 1 - len(heights)
+    return np.array(heights + [y] * rest), np.array(speeds + [vy] * rest), np.array(low + [True] * rest)
+
+def _horizontal_flight(x, vx, factor, edge):
+    """Position and speed along one axis after each tick, given each tick's friction factor."""
+    positions = np.empty(len(factor))
+    speeds = np.empty(len(factor))
+    start = 0
+    while True:
+        # Running products and sums are evaluated in order, so these are ball_flight()'s roundings
+        v = np.cumprod(np.concatenate(((vx,), factor[start + 1:])))
+        p = np.cumsum(np.concatenate(((x,), v[:-1] * simulation.TICK_DT)))
+        positions[start:] = p
+        speeds[start:] = v
+        wall = np.flatnonzero(np.abs(p[1:]) > edge)
+        if not len(wall):
+            return positions, speeds
+        # Bounce off the edge of the pitch and carry on from there
+        start += wall[0] + 1
+        positions[start] = edge if positions[start] > edge else -edge
+        speeds[start] *= -0.8
+        x, vx = positions[start], speeds[start]
+
+def _flight_path(position, velocity):
+    """simulation.flight_path() for one (x, y, z) position and velocity.
+
+    The height doesn't depend on the horizontal motion, so each vertical
+    profile is worked out once (kicks repeat them) and the two horizontal
+    axes follow from it with NumPy.
+    """
+    ticks = int(simulation.PREDICTION_HORIZON * simulation.TICK_RATE)
+    heights, vertical, low = _vertical_flight(position[1], velocity[1], simulation.GRAVITY, simulation.BALL_GROUND_Y,
+                                              simulation.TICK_DT, ticks)
+    factor = np.where(low, simulation.BALL_GROUND_FRICTION ** simulation.TICK_DT, 1.0)
+    x, vx = _horizontal_flight(position[0], velocity[0], factor, simulation.FIELD_WIDTH/2)
+    z, vz = _horizontal_flight(position[2], velocity[2], factor, simulation.FIELD_DEPTH/2)
+    kept = slice(None, None, simulation.PREDICTION_STRIDE)
+    vx, vz = vx[kept], vz[kept]
+    # At rest: the path ends at the first kept point (after the start) that's stopped
+    rest = np.flatnonzero((vertical[kept][1:] == 0) & (vx[1:] * vx[1:] + vz[1:] * vz[1:] < 0.01))
+    end = rest[0] + 2 if len(rest) else None
+    return np.column_stack((x[kept], heights[kept], z[kept]))[:end]
+
+
+class VecMatch:
+    """N matches with team 0 under human controls, stepped together.
+
+    Per-player state is (N, players, ...) and per-match state has length N.
+    Load a new match into row i with reset(i, seed), then call step() with
+    every row's inputs. Goals scored by each team in the last step are in
+    `goals` (N x 2).
+    """
+    # PlayerArrays fields the simulation reads; animation state is left out
+    PLAYER_FIELDS = ('positions', 'velocities', 'targets', 'support_offsets', 'ai_mode', 'speed_mult', 'steering',
+                     'target_velocities', 'lerp_rates', 'rotation_y')
+
+    def __init__(self, n):
+        template = simulation.create_match(controlled_team=0, seed=0)
+        a = template.arrays
+        self.n = n
+        self.n_players = p = a.count
+
+        # The same for every match
+        self.team = a.team.copy()
+        self.role = a.role.copy()
+        self.speed = a.speed.copy()
+        self.accel = a.accel.copy()
+        self.friction = a.friction.copy()
+        self.base_positions = a.base_positions.copy()
+        self.team_rows = [np.flatnonzero(self.team == team) for team in (0, 1)]
+        self.outfield_rows = [np.flatnonzero((self.team == team) & (self.role != GK)) for team in (0, 1)]
+        mid = simulation.ROLES.index('mid')
+        self.support_rows = [np.flatnonzero((self.team == team) & (self.role >= mid)) for team in (0, 1)]
+        self.pitch = PitchControl(simulation.FIELD_WIDTH, simulation.FIELD_DEPTH) # Cell layout only
+        self._inverse_speed = (1 / self.speed).astype(np.float32)
+        # Each team's players grouped by speed, for _control()
+        self._speed_groups = [[rows[self.speed[rows] == speed] for speed in np.unique(self.speed[rows])]
+                              for rows in self.team_rows]
+
+        for name in self.PLAYER_FIELDS:
+            field = getattr(a, name)
+            setattr(self, name, np.zeros((n,) + field.shape, dtype=field.dtype))
+
+        self.ball_position = np.zeros((n, 3))
+        self.ball_velocity = np.zeros((n, 3))
+        self.touches = np.zeros(n, dtype=np.int64)
+
+        self.time = np.zeros(n)
+        self.ticks = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros((n, 2), dtype=np.int64)
+        self.goals = np.zeros((n, 2), dtype=np.int64) # Scored in the last step
+        self.kickoff = np.zeros(n, dtype=np.bool_) # match_state == 'kickoff'
+        self.kickoff_time = np.zeros(n)
+        # Player indices (-1 for None)
+        self.kicker = np.zeros(n, dtype=np.int64)
+        self.last_touch = np.full(n, -1, dtype=np.int64)
+        self.active = np.zeros(n, dtype=np.int64)
+        self.closest = np.zeros((n, 2), dtype=np.int64) # closest_to_ball_0 and _1
+        self.support_team = np.full(n, -1, dtype=np.int64)
+
+        # Pitch control: XZ each player is heading for after REACTION_TIME, as of the last refresh
+        self.control_start = np.zeros((n, p, 2))
+        self.control_updated_at = np.zeros(n)
+
+        # Ball prediction, padded to the longest path by repeating its last point
+        horizon = int(simulation.PREDICTION_HORIZON * simulation.TICK_RATE)
+        stride = simulation.PREDICTION_STRIDE
+        self.path_times = np.arange(horizon // stride + 1) * (stride * simulation.TICK_DT)
+        self.path_touches = np.full(n, -1, dtype=np.int64)
+        self.path_start = np.zeros(n)
+        self.path_points = np.zeros((n, len(self.path_times), 3))
+        self.path_length = np.ones(n, dtype=np.int64)
+        # Interception points: the path and time they were picked on, and where the players were
+        self.intercepts_touches = np.full(n, -1, dtype=np.int64)
+        self.intercepts_time = np.zeros(n)
+        self.intercept_positions = np.zeros((n, p, 3))
+
+        # Separation: pairs of players that were within MIN_SEPARATION + NEIGHBOUR_SLACK, as (row, player, other),
+        # and how much of the slack each row's players could have used up since
+        self.neighbours = np.zeros((3, 0), dtype=np.int64)
+        self.neighbour_slack = np.zeros(n) # Under 0: find them again
+
+        # Each row's MatchState: its generator, and the kickoff after a goal
+        self.matches = [None] * n
+
+    def reset(self, i, seed):
+        """Start a new match with this seed in row i."""
+        match = simulation.create_match(controlled_team=0, seed=seed)
+        self.matches[i] = match
+        a = match.arrays
+        for name in self.PLAYER_FIELDS:
+            getattr(self, name)[i] = getattr(a, name)
+        self.ball_position[i] = tuple(match.ball.position)
+        self.ball_velocity[i] = tuple(match.ball.velocity)
+        self.touches[i] = match.ball.touches
+        self.time[i] = match.time
+        self.ticks[i] = match.ticks
+        self.score[i] = match.score
+        self.goals[i] = 0
+        self.kickoff[i] = match.match_state == 'kickoff'
+        self.kickoff_time[i] = match.kickoff_time
+        self.kicker[i] = match.kicker.index
+        self.last_touch[i] = -1 if match.last_touch is None else match.last_touch.index
+        self.active[i] = match.active_player.index
+        self.closest[i] = (match.closest_to_ball_0.index, match.closest_to_ball_1.index)
+        self.support_team[i] = -1 if match.support_team is None else match.support_team
+        # A new match has just refreshed its pitch control and hasn't predicted anything
+        self.control_start[i] = (a.positions + a.velocities * pitch_control.REACTION_TIME)[:, ::2]
+        self.control_updated_at[i] = match.pitch_control.updated_at
+        self.path_touches[i] = -1
+        self.intercepts_touches[i] = -1
+        self.neighbour_slack[i] = -1
+
+    # --- Simulation Step ---
+    def step(self, move_x, move_z, kick):
+        """Advance every match by one tick.
+
+        move_x and move_z (-1, 0 or 1) and kick (an index into KICKS) hold
+        each row's inputs for its controlled player.
+        """
+        self.goals[:] = 0
+        self.time += simulation.TICK_DT
+        self.ticks += 1
+        due = self.time - self.control_updated_at >= pitch_control.UPDATE_PERIOD - 1e-9
+        if due.any():
+            self._refresh_control(np.flatnonzero(due))
+
+        self._step_ball()
+        self._check_goals()
+        self._update_tactics()
+
+        self.positions[:, :, 1] = simulation.PLAYER_Y
+        self._plan_players(np.asarray(move_x, dtype=np.float64), np.asarray(move_z, dtype=np.float64), np.asarray(kick))
+        self._steer_players()
+        self._integrate_players()
+
+    def _step_ball(self):
+        """ball_flight() and collide_ball() for every row."""
+        pos = self.ball_position
+        vel = self.ball_velocity
+        vel[:, 1] -= simulation.GRAVITY * simulation.TICK_DT
+        pos += vel * simulation.TICK_DT
+
+        ground = pos[:, 1] <= 0.5
+        vel[ground, 0] *= simulation.BALL_GROUND_FRICTION ** simulation.TICK_DT
+        vel[ground, 2] *= simulation.BALL_GROUND_FRICTION ** simulation.TICK_DT
+
+        bounce = pos[:, 1] < simulation.BALL_GROUND_Y
+        pos[bounce, 1] = simulation.BALL_GROUND_Y
+        vel[bounce, 1] *= -0.6
+        vel[bounce & (np.abs(vel[:, 1]) < 1), 1] = 0
+
+        for axis, edge in ((0, simulation.FIELD_WIDTH/2), (2, simulation.FIELD_DEPTH/2)):
+            over = pos[:, axis] > edge
+            pos[over, axis] = edge
+            vel[over, axis] *= -0.8
+            under = pos[:, axis] < -edge
+            pos[under, axis] = -edge
+            vel[under, axis] *= -0.8
+
+        # Capsule contact, as collide_ball()
+        players = self.positions
+        feet = players[:, :, 1] - simulation.PLAYER_Y
+        radius = simulation.PLAYER_RADIUS
+        axis_y = np.minimum(np.maximum(pos[:, 1:2], feet + radius), feet + simulation.PLAYER_HEIGHT - radius)
+        offset = (pos[:, 0:1] - players[:, :, 0], pos[:, 1:2] - axis_y, pos[:, 2:3] - players[:, :, 2])
+        dist2 = offset[0] * offset[0] + offset[1] * offset[1] + offset[2] * offset[2]
+        reach = simulation.BALL_RADIUS + simulation.PLAYER_RADIUS
+        hits = dist2 < reach * reach
+        rows = np.flatnonzero(hits.any(axis=1))
+        if not len(rows): return
+
+        # Players are resolved in index order, each against the ball as the last one left it
+        hits = hits[rows]
+        ball_pos = pos[rows]
+        ball_vel = vel[rows]
+        changed = np.zeros(len(rows), dtype=np.bool_)
+        while True:
+            left = np.flatnonzero(hits.any(axis=1))
+            if not len(left): break
+            r = rows[left]
+            i = hits[left].argmax(axis=1)
+            hits[left, i] = False
+
+            dist = np.sqrt(dist2[r, i])
+            normal = np.empty((len(left), 3))
+            off_centre = dist > 1e-6
+            normal[off_centre] = np.column_stack([d[r, i] for d in offset])[off_centre] / dist[off_centre, None]
+            for k in np.flatnonzero(~off_centre).tolist():
+                # Dead centre: push it out the way the player is facing
+                yaw = math.radians(self.rotation_y[r[k], i[k]])
+                normal[k] = (math.sin(yaw), 0.0, math.cos(yaw))
+            ball_pos[left] += normal * (reach - dist)[:, None]
+            changed[left] |= reach - dist > simulation.TOUCH_PUSH
+
+            # Batched matmul gives exactly np.dot's result for each row
+            approach = ((ball_vel[left] - self.velocities[r, i])[:, None, :] @ normal[:, :, None])[:, 0, 0]
+            into = approach < 0
+            ball_vel[left[into]] -= ((1 + simulation.BALL_RESTITUTION) * approach[into])[:, None] * normal[into]
+            changed[left] |= into
+            self.last_touch[r] = i
+
+        pos[rows] = ball_pos
+        vel[rows] = ball_vel
+        self.touches[rows[changed]] += 1
+
+    def _check_goals(self):
+        pos = self.ball_position
+        scored = ((np.abs(pos[:, 0]) >= simulation.FIELD_WIDTH/2) & (np.abs(pos[:, 2]) < simulation.GOAL_WIDTH/2)
+                  & (pos[:, 1] < simulation.GOAL_HEIGHT))
+        for r in np.flatnonzero(scored).tolist():
+            team = 0 if pos[r, 0] > 0 else 1 # Team 0 attacks +X
+            self.score[r, team] += 1
+            self.goals[r, team] += 1
+            self._kick_off(r, 1 - team) # The team that conceded kicks off
+
+    def _kick_off(self, r, team):
+        """reset_positions() for row r, run on its MatchState."""
+        match = self.matches[r]
+        match.time = self.time[r].item()
+        match.ball.touches = self.touches[r].item()
+        simulation.reset_positions(match, team)
+
+        a = match.arrays
+        self.positions[r] = a.positions
+        self.velocities[r] = a.velocities
+        self.target_velocities[r] = a.target_velocities
+        self.ball_position[r] = tuple(match.ball.position)
+        self.ball_velocity[r] = tuple(match.ball.velocity)
+        self.touches[r] = match.ball.touches
+        self.kickoff[r] = True
+        self.kickoff_time[r] = match.kickoff_time
+        self.kicker[r] = match.kicker.index
+        self.last_touch[r] = -1
+        self.active[r] = match.active_player.index
+        self.neighbour_slack[r] = -1
+        self._refresh_control(np.array([r]))
+
+    def _update_tactics(self):
+        pos = self.ball_position
+        everyone = np.arange(self.n)
+
+        # Auto-switch to the team 0 player nearest the ball, as picked last tick
+        closest = self.closest[:, 0]
+        near = self.positions[everyone, closest]
+        dx = near[:, 0] - pos[:, 0]
+        dz = near[:, 2] - pos[:, 2]
+        switch = (closest != self.active) & (np.sqrt(dx * dx + dz * dz) < 5.0)
+        self.active[switch] = closest[switch]
+
+        dx = self.positions[:, :, 0] - pos[:, 0:1]
+        dz = self.positions[:, :, 2] - pos[:, 2:3]
+        dist = dx * dx + dz * dz
+        for team, rows in enumerate(self.team_rows):
+            self.closest[:, team] = rows[dist[:, rows].argmin(axis=1)]
+
+    # --- Planning ---
+    def _plan_players(self, move_x, move_z, kick):
+        n = self.n
+        everyone = np.arange(n)
+        ai = np.ones((n, self.n_players), dtype=np.bool_)
+        ai[everyone, self.active] = False
+
+        kickoff = self.kickoff.copy()
+        if kickoff.any():
+            # KICKOFF STATE: Freeze AI
+            frozen = ai & kickoff[:, None]
+            self.velocities[frozen] = 0
+            self.target_velocities[frozen] = 0
+            self.steering[kickoff] = False
+            self.ai_mode[kickoff] = FROZEN
+            # An AI kicker plays it to a teammate once everyone has settled
+            settled = self.time - self.kickoff_time >= simulation.KICKOFF_DELAY
+            rows = np.flatnonzero(kickoff & ai[everyone, self.kicker] & settled)
+            if len(rows):
+                kicker = self.kicker[rows]
+                self._kick(rows, kicker, 'pass', self._nearest_teammate(rows, kicker))
+
+        rows = np.flatnonzero(~kickoff)
+        if len(rows):
+            self._plan_ai(rows, ai[rows])
+
+        self._move_user(move_x, move_z, kick)
+
+    def _plan_ai(self, rows, ai):
+        """The 'playing' half of plan_players() for these rows."""
+        q = len(rows)
+        mode = np.where(self.role == GK, KEEP, COVER)[None, :].repeat(q, axis=0)
+        for team in (0, 1):
+            presser = self.closest[rows, team]
+            pressing = self.role[presser] != GK
+            mode[np.flatnonzero(pressing), presser[pressing]] = PRESS
+        mode[~ai] = USER
+
+        positions = self.positions[rows]
+        ball_pos = self.ball_position[rows]
+        d = positions - ball_pos[:, None, :]
+        dist_to_ball = np.sqrt(d[:, :, 0] ** 2 + d[:, :, 2] ** 2)
+
+        due = simulation.thinking(ai, mode, self.ai_mode[rows], dist_to_ball, self.ticks[rows])
+        self.ai_mode[rows] = mode
+        self.steering[rows] = ai
+
+        # COVER, and the SUPPORT runs of the team on the ball
+        base = self.base_positions
+        touched = self.last_touch[rows] >= 0
+        team = self.team[self.last_touch[rows]]
+        fresh = touched & ((self.control_updated_at[rows] == self.time[rows]) | (team != self.support_team[rows]))
+        for t in (0, 1):
+            k = np.flatnonzero(fresh & (team == t))
+            if not len(k): continue
+            r = rows[k]
+            support = self.support_rows[t]
+            cover = simulation.cover_spots(base[support], ball_pos[k][:, None, :], dist_to_ball[k][:, support])
+            spots = cover[:, :, ::2]
+            self.support_offsets[r] = 0
+            self.support_offsets[r[:, None], support] = self._find_space(r, t, spots, simulation.SUPPORT_RADIUS) - spots
+            self.support_team[r] = t
+
+        # Only the players thinking this tick need their spot
+        k, i = np.nonzero(due)
+        cover = simulation.cover_spots(base[i], ball_pos[k], dist_to_ball[k, i])
+        offset = np.flatnonzero(touched[k])
+        offsets = self.support_offsets[rows[k[offset]], i[offset]]
+        cover[offset, 0] += offsets[:, 0]
+        cover[offset, 2] += offsets[:, 1]
+        self.targets[rows[k], i] = cover
+        self.speed_mult[rows[k], i] = 0.8 # Coverers move slightly slower
+
+        # Keepers and pressers think in index order: a kick changes the ball for whoever comes next
+        think = due & (mode >= PRESS)
+        while True:
+            left = np.flatnonzero(think.any(axis=1))
+            if not len(left): break
+            i = think[left].argmax(axis=1)
+            think[left, i] = False
+            self._ai_logic(rows[left], i)
+
+    def _ai_logic(self, rows, players):
+        """PlayerState.ai_logic() for one keeper or presser in each of these rows."""
+        pos = self.positions[rows, players]
+        ball = self.ball_position[rows]
+        dx = pos[:, 0] - ball[:, 0]
+        dz = pos[:, 2] - ball[:, 2]
+        dist_to_ball = np.sqrt(dx * dx + dz * dz)
+        team = self.team[players]
+        keeper = self.role[players] == GK
+
+        # Keepers: SAVE MODE inside the box in front of their goal, otherwise GUARD MODE
+        goal_x = np.where(team == 0, -simulation.FIELD_WIDTH/2, simulation.FIELD_WIDTH/2)
+        box_depth_x = 18
+        box_width_z = 20
+        in_box = (np.abs(ball[:, 2]) < box_width_z / 2) & np.where(team == 0, ball[:, 0] < goal_x + box_depth_x,
+                                                                    ball[:, 0] > goal_x - box_depth_x)
+        guard = keeper & ~in_box
+        chase = ~guard # Pressers, and keepers saving
+
+        target = np.empty((len(rows), 3))
+        if chase.any():
+            target[chase] = self._intercept(rows[chase], players[chase])
+        if guard.any():
+            g = np.flatnonzero(guard)
+            gx = goal_x[g]
+            direction = _normalized(np.column_stack((ball[g, 0] - gx, ball[g, 1] - 0.0, ball[g, 2] - 0.0)))
+            guard_dist = 4
+            x = gx + direction[:, 0] * guard_dist
+            target[g, 0] = np.where(team[g] == 0, np.clip(x, gx, gx + 6), np.clip(x, gx - 6, gx))
+            target[g, 1] = 0.0 + direction[:, 1] * guard_dist
+            target[g, 2] = np.clip(0.0 + direction[:, 2] * guard_dist, -6, 6)
+        self.targets[rows, players] = target
+        self.speed_mult[rows, players] = np.where(keeper, 1.1, 1.0)
+
+        # GK Clearing Logic: If close to ball, kick it away!
+        clear = keeper & in_box & (dist_to_ball < 1.5)
+        if clear.any():
+            self._kick(rows[clear], players[clear], 'clear')
+        # POSSESSION: a presser on the ball decides what to do
+        decide = ~keeper & (dist_to_ball < 1.0)
+        if decide.any():
+            self._decide_action(rows[decide], players[decide])
+
+    def _decide_action(self, rows, players):
+        """PlayerState.ai_decide_action() for these rows."""
+        pos = self.positions[rows, players]
+        team = self.team[players]
+        enemy_goal_x = np.where(team == 0, simulation.FIELD_WIDTH/2, -simulation.FIELD_WIDTH/2)
+
+        # 1. SHOOT if close enough
+        shoot = np.abs(pos[:, 0] - enemy_goal_x) < simulation.SHOOT_DISTANCE
+        if shoot.any():
+            self._kick(rows[shoot], players[shoot], 'shoot')
+        rows, players, pos, team = rows[~shoot], players[~shoot], pos[~shoot], team[~shoot]
+        if not len(rows): return
+
+        # Blocked if the other team would get to the spot ahead first
+        forward_dir_sign = np.where(team == 0, 1, -1)
+        ahead_x = pos[:, 0] + forward_dir_sign * simulation.DRIBBLE_LOOKAHEAD
+        control = self._control_at(rows, ahead_x, pos[:, 2])
+        blocked_ahead = np.where(team == 0, control, 1 - control) < simulation.DRIBBLE_MIN_CONTROL
+
+        # Swarmed by two or more enemies within 5
+        others = self.positions[rows]
+        dx = others[:, :, 0] - pos[:, 0:1]
+        dz = others[:, :, 2] - pos[:, 2:3]
+        enemy = self.team[None, :] != team[:, None]
+        is_swarmed = ((dx * dx + dz * dz < 5 * 5) & enemy).sum(axis=1) >= 2
+
+        # 2. PASS if blocked or swarmed (otherwise keep dribbling)
+        passing = blocked_ahead | is_swarmed
+        rows, players, pos = rows[passing], players[passing], pos[passing]
+        if not len(rows): return
+        receivers = self._best_pass_targets(rows, players)
+        found = receivers >= 0
+        rows, players, pos, receivers = rows[found], players[found], pos[found], receivers[found]
+        if not len(rows): return
+        target = self.positions[rows, receivers]
+        self.rotation_y[rows, players] = _yaw(target[:, 0] - pos[:, 0], target[:, 2] - pos[:, 2],
+                                              self.rotation_y[rows, players])
+        self._kick(rows, players, 'pass', receivers)
+
+    def _best_pass_targets(self, rows, players):
+        """rank_pass_targets()'s top receiver for each passer, or -1 if there is none."""
+        best = np.full(len(rows), -1, dtype=np.int64)
+        team = self.team[players]
+        for t in (0, 1):
+            k = np.flatnonzero(team == t)
+            if not len(k): continue
+            xz = self.positions[rows[k]][:, :, ::2]
+            origin = xz[np.arange(len(k)), players[k]]
+            mates = self.outfield_rows[t] # The passer's own column is out of range
+            score, dist = simulation.pass_scores(origin, xz[:, mates], xz[:, self.team_rows[1 - t]], 1 if t == 0 else -1)
+            candidate = ((mates[None, :] != players[k, None]) & (dist >= simulation.PASS_MIN_DISTANCE)
+                         & (dist <= simulation.PASS_MAX_DISTANCE))
+            score[~candidate] = -math.inf
+            found = candidate.any(axis=1)
+            best[k[found]] = mates[score[found].argmax(axis=1)]
+        return best
+
+    def _nearest_teammate(self, rows, players):
+        """get_closest_teammate() for each row's player."""
+        pos = self.positions[rows]
+        me = pos[np.arange(len(rows)), players]
+        dx = pos[:, :, 0] - me[:, 0:1]
+        dz = pos[:, :, 2] - me[:, 2:3]
+        dist = np.sqrt(dx * dx + dz * dz)
+        dist[(self.team[None, :] != self.team[players][:, None]) | (np.arange(self.n_players) == players[:, None])] = math.inf
+        return dist.argmin(axis=1)
+
+    def _kick(self, rows, players, mode, receivers=None):
+        """kick_ball() by one player in each of these rows (pass and cross need receivers)."""
+        # If ball is already moving fast away, don't kick
+        v = self.ball_velocity[rows]
+        ok = ~(np.sqrt(v[:, 0] * v[:, 0] + v[:, 1] * v[:, 1] + v[:, 2] * v[:, 2]) > 10)
+        rows, players = rows[ok], players[ok]
+        if not len(rows): return
+        pos = self.positions[rows, players]
+
+        if mode in ('shoot', 'clear'):
+            enemy_goal_x = np.where(self.team[players] == 0, simulation.FIELD_WIDTH/2, -simulation.FIELD_WIDTH/2)
+            direction = _normalized(np.column_stack((enemy_goal_x - pos[:, 0], 0.0 - pos[:, 1], 0.0 - pos[:, 2])))
+            spread, power, lift = (0.1, 35, 6) if mode == 'shoot' else (0.5, 40, 10) # Accuracy noise / chaotic clear
+            direction[:, 2] += [self.matches[r].rng.uniform(-spread, spread) for r in rows.tolist()]
+            direction = _normalized(direction)
+        else:
+            direction = _normalized(self.positions[rows, receivers[ok]] - pos)
+            power, lift = (25, 0) if mode == 'pass' else (30, 12)
+
+        # Unlock Kickoff State
+        if mode == 'pass':
+            self.kickoff[rows] = False
+
+        self.ball_velocity[rows] = direction * power
+        self.ball_velocity[rows, 1] = lift
+        self.touches[rows] += 1
+        self.last_touch[rows] = players
+
+    def _move_user(self, move_x, move_z, kick):
+        """PlayerState.move_user() for every row's controlled player."""
+        active = self.active
+        kickoff = self.kickoff
+
+        # KICKOFF STATE: Lock movement, only allow shooting or passing
+        k = np.flatnonzero(kickoff)
+        self.velocities[k, active[k]] = 0
+        self.target_velocities[k, active[k]] = 0
+
+        moving = ~kickoff & ((move_x != 0) | (move_z != 0))
+        length = np.sqrt(move_x * move_x + 0.0 + move_z * move_z)
+        m = np.flatnonzero(moving)
+        p = active[m]
+        input_x = move_x[m] / length[m]
+        input_z = move_z[m] / length[m]
+        target_velocity = np.zeros((len(m), 3))
+        target_velocity[:, 0] = input_x * self.speed[p]
+        target_velocity[:, 2] = input_z * self.speed[p]
+        # Look where it's going
+        pos = self.positions[m, p]
+        self.rotation_y[m, p] = _yaw((pos[:, 0] + input_x) - pos[:, 0], (pos[:, 2] + input_z) - pos[:, 2],
+                                     self.rotation_y[m, p])
+
+        # Acceleration / Friction
+        playing = np.flatnonzero(~kickoff)
+        self.target_velocities[playing, active[playing]] = 0
+        self.target_velocities[m, p] = target_velocity
+        self.lerp_rates[playing, active[playing]] = np.where(moving[playing], self.accel[active[playing]],
+                                                             self.friction[active[playing]])
+
+        # Kick Inputs
+        kicking = (kick > 0) & (~kickoff | (kick == KICKS.index('shoot')) | (kick == KICKS.index('pass')))
+        for code in (1, 2, 3):
+            rows = np.flatnonzero(kicking & (kick == code))
+            if not len(rows): continue
+            mode = KICKS[code]
+            receivers = self._nearest_teammate(rows, active[rows]) if mode != 'shoot' else None
+            self._kick(rows, active[rows], mode, receivers)
+
+    # --- Movement ---
+    def _steer_players(self):
+        simulation.steer(self.steering, self.positions, self.targets, self.speed * self.speed_mult, self.accel,
+                         self.target_velocities, self.lerp_rates, self.rotation_y)
+
+    def _integrate_players(self):
+        """integrate_players() for every row, less the animation."""
+        dt = simulation.TICK_DT
+        self.velocities += (self.target_velocities - self.velocities) * (dt * self.lerp_rates)[:, :, None]
+
+        # Separation: a move that ends within MIN_SEPARATION (XZ) of another player is refused
+        v = self.velocities
+        speed = np.sqrt(v[:, :, 0] * v[:, :, 0] + v[:, :, 1] * v[:, :, 1] + v[:, :, 2] * v[:, :, 2])
+        moving = speed > 0.01
+        proposed = self.positions + self.velocities * dt
+        blocked = moving & self._crowded(proposed, 2 * dt * speed.max(axis=1))
+        free = moving & ~blocked
+
+        np.copyto(self.positions, proposed, where=free[:, :, None])
+        self.velocities[blocked] = 0 # Stop on collision
+
+    def _crowded(self, proposed, closing):
+        """Whether each proposed position is within MIN_SEPARATION (XZ) of another player's current one.
+
+        Only each row's neighbours are measured. closing bounds how much
+        nearer any two players in a row get this tick (their moves since
+        the neighbours were found are already taken off the slack).
+        """
+        self.neighbour_slack -= closing
+        stale = np.flatnonzero(self.neighbour_slack < 1e-6)
+        if len(stale):
+            self._find_neighbours(stale)
+            self.neighbour_slack[stale] -= closing[stale]
+
+        row, i, j = self.neighbours
+        dx = proposed[row, i, 0] - self.positions[row, j, 0]
+        dz = proposed[row, i, 2] - self.positions[row, j, 2]
+        crowded = np.zeros((self.n, self.n_players), dtype=np.bool_)
+        close = dx * dx + dz * dz < simulation.MIN_SEPARATION * simulation.MIN_SEPARATION
+        crowded[row[close], i[close]] = True
+        return crowded
+
+    def _find_neighbours(self, rows):
+        """Replace these rows' neighbour lists with the pairs of players now within reach of each other."""
+        pos = self.positions[rows]
+        dx = pos[:, :, None, 0] - pos[:, None, :, 0]
+        dz = pos[:, :, None, 2] - pos[:, None, :, 2]
+        reach = simulation.MIN_SEPARATION + NEIGHBOUR_SLACK
+        near = dx * dx + dz * dz < reach * reach
+        everyone = np.arange(self.n_players)
+        near[:, everyone, everyone] = False
+        k, i, j = np.nonzero(near)
+
+        replaced = np.zeros(self.n, dtype=np.bool_)
+        replaced[rows] = True
+        kept = self.neighbours[:, ~replaced[self.neighbours[0]]]
+        self.neighbours = np.concatenate((kept, np.stack((rows[k], i, j))), axis=1)
+        self.neighbour_slack[rows] = NEIGHBOUR_SLACK
+
+    # --- Pitch Control ---
+    def _refresh_control(self, rows):
+        """PitchControl.update() for these rows, keeping only what the lookups need."""
+        start = self.positions[rows] + self.velocities[rows] * pitch_control.REACTION_TIME
+        self.control_start[rows] = start[:, :, ::2]
+        self.control_updated_at[rows] = self.time[rows]
+
+    def _control(self, rows, cell_rows, cell_cols):
+        """Team 0's control of some cells, as update() would have stored it.
+
+        cell_rows and cell_cols are (window rows, queries) and (window cols,
+        queries), one query per entry of rows; returns (rows, cols, queries).
+        Queries go last so that NumPy's inner loops run over all of them.
+
+        Rounding a square root and scaling by a positive number both keep
+        order, so among players of one speed the nearest is the fastest to a
+        cell: the times are only worked out for each group's nearest.
+        """
+        start = np.ascontiguousarray(self.control_start[rows].transpose(2, 1, 0)) # XZ x players x queries
+        # Differences in float64 (as update()), stored straight to float32
+        dx = np.empty((len(start[0]),) + cell_cols.shape, dtype=np.float32)
+        dz = np.empty((len(start[1]),) + cell_rows.shape, dtype=np.float32)
+        np.subtract(self.pitch.xs[cell_cols][None, :, :], start[0][:, None, :], out=dx, casting='same_kind')
+        np.subtract(self.pitch.zs[cell_rows][None, :, :], start[1][:, None, :], out=dz, casting='same_kind')
+        dx *= dx
+        dz *= dz
+        time_to_arrive = np.empty((2,) + dz.shape[1:2] + dx.shape[1:])
+        fastest, nearest, distance = np.empty((3,) + time_to_arrive.shape[1:], dtype=np.float32)
+        for team, groups in enumerate(self._speed_groups):
+            for group, players in enumerate(groups):
+                np.add(dz[players[0]][:, None, :], dx[players[0]][None, :, :], out=nearest)
+                for p in players[1:].tolist():
+                    np.add(dz[p][:, None, :], dx[p][None, :, :], out=distance)
+                    np.minimum(nearest, distance, out=nearest)
+                np.sqrt(nearest, out=nearest)
+                nearest *= self._inverse_speed[players[0]]
+                if group == 0:
+                    fastest, nearest = nearest, fastest
+                else:
+                    np.minimum(fastest, nearest, out=fastest)
+            time_to_arrive[team] = fastest
+        time_to_arrive += pitch_control.REACTION_TIME
+        return control_from(time_to_arrive)
+
+    def _control_at(self, rows, x, z):
+        """control_at() for team 0, one point per row."""
+        pitch = self.pitch
+        col = np.clip(((x + pitch.width / 2) // pitch.cell_width).astype(np.int64), 0, pitch.cols - 1)
+        row = np.clip(((z + pitch.depth / 2) // pitch.cell_depth).astype(np.int64), 0, pitch.rows - 1)
+        return self._control(rows, row[None, :], col[None, :])[0, 0]
+
+    def _find_space(self, rows, team, points, radius, distance_weight=0.02):
+        """PitchControl.find_space() for several (x, z) points per row: rows x points x 2."""
+        pitch = self.pitch
+        count = points.shape[1]
+        points = points.reshape(-1, 2)
+
+        # A square window of cells around each point, as window x points
+        reach_x = int(math.ceil(radius / pitch.cell_width))
+        reach_z = int(math.ceil(radius / pitch.cell_depth))
+        centre_col = ((points[:, 0] + pitch.width / 2) // pitch.cell_width).astype(np.int64)
+        centre_row = ((points[:, 1] + pitch.depth / 2) // pitch.cell_depth).astype(np.int64)
+        cols = np.clip(centre_col[None, :] + np.arange(-reach_x, reach_x + 1)[:, None], 0, pitch.cols - 1)
+        cell_rows = np.clip(centre_row[None, :] + np.arange(-reach_z, reach_z + 1)[:, None], 0, pitch.rows - 1)
+
+        control = self._control(np.repeat(rows, count), cell_rows, cols)
+        if team == 1: control = 1 - control
+        cx = pitch.xs[cols]
+        cz = pitch.zs[cell_rows]
+        dist = np.sqrt((cz - points[:, 1])[:, None, :] ** 2 + (cx - points[:, 0])[None, :, :] ** 2)
+        score = control - dist * distance_weight
+        score[dist > radius] = -math.inf
+
+        best = score.reshape(-1, len(points)).argmax(axis=0)
+        best_row, best_col = np.divmod(best, cols.shape[0])
+        n = np.arange(len(points))
+        return np.column_stack((cx[best_col, n], cz[best_row, n])).reshape(len(rows), count, 2)
+
+    # --- Ball Prediction ---
+    def _intercept(self, rows, players):
+        """BallPrediction.intercept() for one player in each of these rows, as N x 3."""
+        self._predict(rows)
+        stale = ((self.intercepts_touches[rows] != self.path_touches[rows])
+                 | ~(self.time[rows] - self.intercepts_time[rows] < simulation.INTERCEPT_REAIM - 1e-9))
+        r = rows[stale]
+        self.intercept_positions[r] = self.positions[r]
+        self.intercepts_time[r] = self.time[r]
+        self.intercepts_touches[r] = self.path_touches[r]
+
+        # Only the part of the path that's still ahead of the ball (from when the points were picked)
+        length = self.path_length[rows]
+        ahead = self.path_times[None, :] - (self.intercepts_time[rows] - self.path_start[rows])[:, None]
+        first = np.minimum((ahead < -1e-9).sum(axis=1), length - 1)
+        ahead = np.maximum(ahead, 0)
+
+        points = self.path_points[rows]
+        reachable = simulation.reachable_points(points, ahead, self.intercept_positions[rows, players], self.speed[players])
+        reachable &= np.arange(len(self.path_times))[None, :] >= first[:, None]
+        k = np.where(reachable.any(axis=1), reachable.argmax(axis=1), length - 1)
+        return points[np.arange(len(rows)), k]
+
+    def _predict(self, rows):
+        """Rebuild the predicted path of every row whose ball was touched since."""
+        rows = rows[self.path_touches[rows] != self.touches[rows]]
+        if not len(rows): return
+        pos = self.ball_position[rows]
+        vel = self.ball_velocity[rows]
+        points, length, rolling = simulation.rolling_paths(pos, vel)
+
+        # Anything else flies tick by tick
+        for k in np.flatnonzero(~rolling).tolist():
+            path = _flight_path(pos[k].tolist(), vel[k].tolist())
+            length[k] = len(path)
+            points[k, :len(path)] = path
+            points[k, len(path):] = path[-1]
+
+        self.path_points[rows] = points
+        self.path_length[rows] = length
+        self.path_touches[rows] = self.touches[rows]
+        self.path_start[rows] = self.time[rows]